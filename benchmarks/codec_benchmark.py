@@ -0,0 +1,102 @@
+"""
+Encode/decode throughput and compression ratio of the ME frame codecs on captured frames.
+
+    python3 codec_benchmark.py --frames_dir ../carla_scripts/output/Alfred/main/<clip>
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../")
+import argparse
+import time
+import numpy as np
+from carla_scripts.Dataset.codecs import get_codec, decode_frame, available_codecs, DepthMillimeterCodec
+from carla_scripts.Dataset.clip_container import ClipReader, CLIP_EXTENSION
+
+IMAGE_CODECS = ['raw', 'zlib', 'png', 'zstd', 'lz4']
+DEPTH_CODECS = ['raw', 'zlib', 'zstd', 'lz4', 'float16', 'float16+zlib', 'float16+zstd', 'float16+lz4',
+                'depth_mm_u16', 'depth_mm_u16+png', 'depth_mm_u16+zstd', 'depth_mm_u16+lz4']
+
+
+def load_frames(frames_dir, max_frames):
+    frames = []
+    for root, _, files in os.walk(frames_dir):
+        for file_name in sorted(files):
+            if len(frames) >= max_frames:
+                return frames
+            path = os.path.join(root, file_name)
+            if file_name.endswith('.npz'):
+                with np.load(path) as data:
+                    frames.append(decode_frame(data))
+            elif file_name.endswith(CLIP_EXTENSION):
+                reader = ClipReader(path)
+                for grab_index, view in reader.keys()[:max_frames - len(frames)]:
+                    frames.append(decode_frame(reader.read(grab_index, view)))
+    return frames
+
+
+def benchmark_codec(spec, arrays, repeat):
+    chain = get_codec(spec)
+    raw_bytes = sum(a.nbytes for a in arrays)
+    encoded_bytes = 0
+    max_error = 0.0
+    encode_time = decode_time = 0.0
+    for _ in range(repeat):
+        encoded_bytes = 0
+        for array in arrays:
+            start = time.perf_counter()
+            encoded = chain.encode(array)
+            encode_time += time.perf_counter() - start
+            encoded_bytes += np.asarray(encoded).nbytes
+            start = time.perf_counter()
+            decoded = chain.decode(encoded, array.shape, array.dtype)
+            decode_time += time.perf_counter() - start
+            if not chain.lossless:
+                # Saturation beyond the mm codec range is by design, not an error.
+                valid = array < DepthMillimeterCodec.max_depth if DepthMillimeterCodec.name in spec else Ellipsis
+                max_error = max(max_error, float(np.abs(decoded[valid].astype(np.float64) - array[valid]).max()))
+    mb = raw_bytes * repeat / 1e6
+    return mb / encode_time, mb / decode_time, raw_bytes / float(encoded_bytes), max_error
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument(
+        '--frames_dir',
+        required=True,
+        help='Directory (searched recursively) of captured npz or clip files')
+    argparser.add_argument(
+        '--max_frames',
+        default=50,
+        type=int,
+        help='Number of frames to benchmark on (default: 50)')
+    argparser.add_argument(
+        '--repeat',
+        default=3,
+        type=int,
+        help='Times every codec runs over the frames (default: 3)')
+    args = argparser.parse_args()
+
+    frames = load_frames(args.frames_dir, args.max_frames)
+    if not frames:
+        print('No frames found in %s' % args.frames_dir)
+        return
+    available = set(available_codecs())
+    print('%d frames loaded from %s' % (len(frames), args.frames_dir))
+    print('%-10s %-20s %12s %12s %8s %12s' % ('key', 'codec', 'enc MB/s', 'dec MB/s', 'ratio', 'max error'))
+    for key, specs in (('image', IMAGE_CODECS), ('sim_depth', DEPTH_CODECS)):
+        arrays = [np.ascontiguousarray(frame[key]) for frame in frames if key in frame]
+        if not arrays:
+            continue
+        for spec in specs:
+            if not available.issuperset(spec.split('+')):
+                print('%-10s %-20s %12s' % (key, spec, 'unavailable'))
+                continue
+            try:
+                enc, dec, ratio, error = benchmark_codec(spec, arrays, args.repeat)
+            except TypeError:
+                continue
+            print('%-10s %-20s %12.1f %12.1f %8.2f %12.6f' % (key, spec, enc, dec, ratio, error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Per-frame timings of the ME camera conversions, before (legacy inline code) and after (ImageConverter).
+
+    python3 conversion_benchmark.py --sizes 1440x620 2880x1240
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../")
+import argparse
+import time
+import numpy as np
+import cv2
+from carla_scripts.Cameras.conversion import ImageConverter
+
+
+class RawImage(object):
+    def __init__(self, width, height, raw_data):
+        self.width = width
+        self.height = height
+        self.raw_data = raw_data
+
+
+def legacy_to_bgra_array(image, scale):
+    array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
+    array = np.reshape(array, (image.height, image.width, 4))
+    return cv2.resize(array, (0, 0), fx=float(1 / scale), fy=float(1 / scale)).astype(np.uint8)
+
+
+def legacy_gray(image, scale):
+    return np.flip(cv2.cvtColor(legacy_to_bgra_array(image, scale=scale), cv2.COLOR_BGRA2GRAY), 0)
+
+
+def legacy_depth(image, scale):
+    array = legacy_to_bgra_array(image, scale)
+    array = array.astype(np.float32)
+    depth = np.dot(array[:, :, :3], [65536.0, 256.0, 1.0])
+    depth /= 16777.215
+    depth = cv2.resize(depth, (0, 0), fx=float(1 / scale), fy=float(1 / scale),
+                       interpolation=cv2.INTER_NEAREST).astype(np.float32)
+    return np.flip(depth, 0)
+
+
+def reference_depth(image, scale):
+    """Exact float64 decode of the full resolution buffer, then nearest neighbour decimation."""
+    array = np.frombuffer(image.raw_data, dtype=np.uint8).reshape((image.height, image.width, 4))
+    depth = np.dot(array[:, :, :3].astype(np.float64), [65536.0, 256.0, 1.0]) / 16777.215
+    depth = cv2.resize(depth, (0, 0), fx=float(1 / scale), fy=float(1 / scale), interpolation=cv2.INTER_NEAREST)
+    return np.flip(depth, 0)
+
+
+def time_per_frame(func, images, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for image in images:
+            func(image)
+    return (time.perf_counter() - start) * 1000.0 / (repeat * len(images))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument(
+        '--sizes',
+        nargs='+',
+        default=['1440x620', '2880x1240'],
+        help='Sensor resolutions WIDTHxHEIGHT (default: 1440x620 2880x1240)')
+    argparser.add_argument(
+        '--scale',
+        default=2.0,
+        type=float,
+        help='Supersampling factor of the ME sensors (default: 2.0)')
+    argparser.add_argument(
+        '--repeat',
+        default=20,
+        type=int,
+        help='Number of passes over the frames (default: 20)')
+    args = argparser.parse_args()
+
+    rng = np.random.RandomState(0)
+    print('%-12s %-6s %12s %12s %8s  %s' % ('size', 'kind', 'before ms', 'after ms', 'speedup', 'check'))
+    for size in args.sizes:
+        width, height = [int(x) for x in size.split('x')]
+        images = [RawImage(width, height, rng.randint(0, 256, (height, width, 4), dtype=np.uint8).tobytes())
+                  for _ in range(4)]
+        converter = ImageConverter(args.scale)
+
+        same = all(np.array_equal(legacy_gray(image, args.scale), converter.to_gray(image)) for image in images)
+        before = time_per_frame(lambda image: legacy_gray(image, args.scale), images, args.repeat)
+        after = time_per_frame(converter.to_gray, images, args.repeat)
+        print('%-12s %-6s %12.2f %12.2f %7.1fx  %s' % (size, 'gray', before, after, before / after,
+                                                       'identical' if same else 'DIFFERENT'))
+
+        error = max(float(np.abs(converter.to_depth(image) - reference_depth(image, args.scale)).max())
+                    for image in images)
+        before = time_per_frame(lambda image: legacy_depth(image, args.scale), images, args.repeat)
+        after = time_per_frame(converter.to_depth, images, args.repeat)
+        legacy_shape = legacy_depth(images[0], args.scale).shape
+        print('%-12s %-6s %12.2f %12.2f %7.1fx  max error vs exact decode %.2e m (legacy output shape %s, now %s)' %
+              (size, 'depth', before, after, before / after, error, legacy_shape, converter.to_depth(images[0]).shape))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+End to end throughput of Simulator and MECameraManager against the in-process fake CARLA server
+(fake_carla.py), no server or GPU needed. For every car setup in carla_scripts/Cameras/setup it reports
+simulator frames per second, ME bytes written per second, the latency from world.tick() to the end of the
+ME sensor callbacks and the peak RSS. Every car setup runs in a process of its own.
+
+    python3 end_to_end_benchmark.py --frames 300
+
+Options after -- go to the simulator, e.g. tick-locked capture into clip containers:
+
+    python3 end_to_end_benchmark.py --cars Bella -- --capture_every 1 --output_format clip
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../")
+import argparse
+import glob
+import json
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import numpy as np
+
+CARLA_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'carla_scripts')
+
+
+def get_car_names():
+    paths = glob.glob(os.path.join(CARLA_SCRIPTS_DIR, 'Cameras', 'setup', '*.json'))
+    return sorted(os.path.splitext(os.path.basename(path))[0] for path in paths)
+
+
+def get_dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def run_car(args, simulator_args):
+    """Runs one car setup in this process, returns its results."""
+    import fake_carla
+    fake_carla.install(tick_time=args.server_ms / 1000.0, dispatch_threads=args.dispatch_threads)
+    # Car setups are looked up relative to carla_scripts, as when running run.py from there.
+    os.chdir(CARLA_SCRIPTS_DIR)
+    from carla_scripts.simulator import Simulator
+    from carla_scripts.Utils import HeadlessHUD
+    from carla_scripts.Utils.arguments import get_argparser
+
+    output_dir = tempfile.mkdtemp(prefix='e2e_%s_' % args.run_car)
+    argparser = get_argparser('End to end benchmark')
+    argparser.set_defaults(headless=True)
+    sim_args = argparser.parse_args(['--car_name', args.run_car, '--map_id', str(args.map_id),
+                                     '--output_dir', output_dir] + simulator_args)
+    sim_args.width, sim_args.height = [int(x) for x in sim_args.res.split('x')]
+    client = fake_carla.Client(sim_args.host, sim_args.port)
+    simulator = None
+    try:
+        simulator = Simulator(client, HeadlessHUD(sim_args.width, sim_args.height), sim_args)
+        for _ in range(args.warmup):
+            simulator.tick(None)
+        simulator.me_sensor_manager.frame_writer.drain()
+        world = simulator.world
+        world.callback_latencies()
+        world.dispatcher.latencies.clear()
+        written_before = get_dir_size(output_dir)
+        frames = 0
+        start = time.perf_counter()
+        while frames < args.frames:
+            if simulator.tick(None) is not None:
+                frames += 1
+        tick_seconds = time.perf_counter() - start
+        latencies = np.array(world.callback_latencies('sensor.camera.')) * 1000.0
+        writer_stats = simulator.me_sensor_manager.frame_writer.get_stats()
+        simulator.destroy()
+        simulator.destroy_spawn()
+        simulator.close_me_sensor()
+        total_seconds = time.perf_counter() - start
+        simulator.profiler.export()
+        simulator = None
+        written = get_dir_size(output_dir) - written_before
+    finally:
+        if simulator is not None:
+            simulator.destroy()
+            simulator.destroy_spawn()
+            simulator.close_me_sensor()
+        if not args.keep_output:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    return {
+        'car': args.run_car,
+        'frames': frames,
+        'fps': frames / tick_seconds,
+        'written_mb_s': written / total_seconds / 1e6,
+        'written_mb': written / 1e6,
+        'callbacks': len(latencies),
+        'callback_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'callback_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        # ru_maxrss is in kilobytes on Linux.
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        'dropped': writer_stats.get('dropped', 0),
+        'output_dir': output_dir if args.keep_output else None,
+    }
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument(
+        '--cars',
+        nargs='+',
+        default=None,
+        help='Car setups to run (default: every json in Cameras/setup)')
+    argparser.add_argument(
+        '--frames',
+        default=200,
+        type=int,
+        help='Measured simulator ticks per car (default: 200)')
+    argparser.add_argument(
+        '--warmup',
+        default=20,
+        type=int,
+        help='Ticks before measuring (default: 20)')
+    argparser.add_argument(
+        '--map_id',
+        default=6,
+        type=int,
+        help='Map, sets the NPC counts (default: 6, 30 vehicles and 40 walkers)')
+    argparser.add_argument(
+        '--server_ms',
+        default=0.0,
+        type=float,
+        help='Simulated server time of one tick (default: 0.0)')
+    argparser.add_argument(
+        '--dispatch_threads',
+        default=4,
+        type=int,
+        help='Threads running the sensor callbacks (default: 4)')
+    argparser.add_argument(
+        '--keep_output',
+        action='store_true',
+        help='Keep the written clips and print where they are')
+    argparser.add_argument(
+        '--run_car',
+        default=None,
+        help=argparse.SUPPRESS)
+    args, simulator_args = argparser.parse_known_args()
+    if simulator_args and simulator_args[0] == '--':
+        simulator_args = simulator_args[1:]
+
+    if args.run_car:
+        print(json.dumps(run_car(args, simulator_args)))
+        return
+
+    own_args = ['--frames', str(args.frames), '--warmup', str(args.warmup), '--map_id', str(args.map_id),
+                '--server_ms', str(args.server_ms), '--dispatch_threads', str(args.dispatch_threads)]
+    if args.keep_output:
+        own_args.append('--keep_output')
+    print('%-8s %8s %10s %10s %14s %14s %9s %8s' % ('car', 'frames', 'frames/s', 'MB/s', 'callback p50',
+                                                   'callback p99', 'RSS MB', 'dropped'))
+    for car in args.cars or get_car_names():
+        command = [sys.executable, os.path.abspath(__file__), '--run_car', car] + own_args + ['--'] + simulator_args
+        process = subprocess.run(command, stdout=subprocess.PIPE)
+        lines = process.stdout.decode('utf-8').strip().splitlines()
+        if process.returncode != 0 or not lines:
+            print('%-8s failed with exit code %d' % (car, process.returncode))
+            continue
+        result = json.loads(lines[-1])
+        print('%-8s %8d %10.1f %10.1f %11.1f ms %11.1f ms %9.0f %8d' % (
+            car, result['frames'], result['fps'], result['written_mb_s'], result['callback_p50_ms'],
+            result['callback_p99_ms'], result['peak_rss_mb'], result['dropped']))
+        if result['output_dir']:
+            print('         output in %s' % result['output_dir'])
+
+
+if __name__ == '__main__':
+    main()
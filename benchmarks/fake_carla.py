@@ -0,0 +1,1266 @@
+"""
+In-process stand-in for the parts of the CARLA Python API the simulator uses, to exercise Simulator and
+MECameraManager without a server or GPU. Install it before anything imports carla:
+
+    import fake_carla
+    fake_carla.install(tick_time=0.0)
+    from carla_scripts.simulator import Simulator
+
+One fake server per (host, port) holds the current World. world.tick() moves autopilot vehicles and
+walkers, then hands the sensor data of the frame (synthetic BGRA images and depth, GNSS, IMU, radar and
+lidar) to the listen callbacks on dispatcher threads, as the CARLA client does. Image buffers are
+generated once per size and reused, so the fake adds next to no work to the measured pipeline.
+"""
+import sys
+import math
+import time
+import random
+import fnmatch
+import logging
+import threading
+import queue
+import numpy as np
+
+# ==============================================================================
+# -- Settings ------------------------------------------------------------------
+# ==============================================================================
+
+
+class FakeSettings(object):
+    def __init__(self):
+        # Simulated server time of one world.tick(), seconds.
+        self.tick_time = 0.0
+        # Threads running the listen callbacks, every sensor always uses the same one.
+        self.dispatch_threads = 4
+        # Distinct synthetic frames cycled through per image size.
+        self.frame_variants = 4
+        self.vehicle_speed = 8.0
+        self.radar_detections = 1500
+        self.lidar_points = 20000
+        self.seed = 0
+
+
+SETTINGS = FakeSettings()
+
+
+def install(**settings):
+    """Makes `import carla` return this module. Keyword arguments override FakeSettings."""
+    for name, value in settings.items():
+        if not hasattr(SETTINGS, name):
+            raise ValueError('Unknown fake carla setting %r' % name)
+        setattr(SETTINGS, name, value)
+    random.seed(SETTINGS.seed)
+    module = sys.modules[__name__]
+    sys.modules['carla'] = module
+    return module
+
+
+# ==============================================================================
+# -- Geometry ------------------------------------------------------------------
+# ==============================================================================
+
+
+class Vector3D(object):
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __add__(self, other):
+        return self.__class__(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return self.__class__(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __mul__(self, k):
+        return self.__class__(self.x * k, self.y * k, self.z * k)
+
+    def __eq__(self, other):
+        return isinstance(other, Vector3D) and (self.x, self.y, self.z) == (other.x, other.y, other.z)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(x=%g, y=%g, z=%g)' % (self.__class__.__name__, self.x, self.y, self.z)
+
+    def length(self):
+        return math.sqrt(self.x ** 2 + self.y ** 2 + self.z ** 2)
+
+
+class Location(Vector3D):
+    def distance(self, other):
+        return (self - other).length()
+
+
+class Vector2D(object):
+    def __init__(self, x=0.0, y=0.0):
+        self.x = float(x)
+        self.y = float(y)
+
+
+class Rotation(object):
+    def __init__(self, pitch=0.0, yaw=0.0, roll=0.0):
+        self.pitch = float(pitch)
+        self.yaw = float(yaw)
+        self.roll = float(roll)
+
+    def get_forward_vector(self):
+        pitch, yaw = math.radians(self.pitch), math.radians(self.yaw)
+        return Vector3D(math.cos(pitch) * math.cos(yaw), math.cos(pitch) * math.sin(yaw), math.sin(pitch))
+
+    def __repr__(self):
+        return 'Rotation(pitch=%g, yaw=%g, roll=%g)' % (self.pitch, self.yaw, self.roll)
+
+
+class Transform(object):
+    def __init__(self, location=None, rotation=None):
+        self.location = location if location is not None else Location()
+        self.rotation = rotation if rotation is not None else Rotation()
+
+    def transform(self, location):
+        """`location` relative to this transform in world coordinates, yaw only."""
+        yaw = math.radians(self.rotation.yaw)
+        c, s = math.cos(yaw), math.sin(yaw)
+        return Location(self.location.x + c * location.x - s * location.y,
+                        self.location.y + s * location.x + c * location.y,
+                        self.location.z + location.z)
+
+    def compose(self, relative):
+        return Transform(self.transform(relative.location),
+                         Rotation(self.rotation.pitch + relative.rotation.pitch,
+                                  self.rotation.yaw + relative.rotation.yaw,
+                                  self.rotation.roll + relative.rotation.roll))
+
+    def get_forward_vector(self):
+        return self.rotation.get_forward_vector()
+
+    def __repr__(self):
+        return 'Transform(%r, %r)' % (self.location, self.rotation)
+
+
+def copy_transform(transform):
+    l, r = transform.location, transform.rotation
+    return Transform(Location(l.x, l.y, l.z), Rotation(r.pitch, r.yaw, r.roll))
+
+
+class BoundingBox(object):
+    def __init__(self, location=None, extent=None):
+        self.location = location if location is not None else Location()
+        self.extent = extent if extent is not None else Vector3D()
+
+
+class Color(object):
+    def __init__(self, r=0, g=0, b=0, a=255):
+        self.r, self.g, self.b, self.a = r, g, b, a
+
+
+class VehicleControl(object):
+    def __init__(self, throttle=0.0, steer=0.0, brake=0.0, hand_brake=False, reverse=False,
+                 manual_gear_shift=False, gear=0):
+        self.throttle = throttle
+        self.steer = steer
+        self.brake = brake
+        self.hand_brake = hand_brake
+        self.reverse = reverse
+        self.manual_gear_shift = manual_gear_shift
+        self.gear = gear
+
+
+class WalkerControl(object):
+    def __init__(self, direction=None, speed=0.0, jump=False):
+        self.direction = direction if direction is not None else Vector3D(1.0, 0.0, 0.0)
+        self.speed = speed
+        self.jump = jump
+
+
+class AttachmentType(object):
+    Rigid = 0
+    SpringArm = 1
+
+
+class TrafficLightState(object):
+    Red = 0
+    Yellow = 1
+    Green = 2
+    Off = 3
+    Unknown = 4
+
+
+class WeatherParameters(object):
+    def __init__(self, cloudiness=0.0, precipitation=0.0, precipitation_deposits=0.0, wind_intensity=0.0,
+                 sun_azimuth_angle=0.0, sun_altitude_angle=0.0):
+        self.cloudiness = cloudiness
+        self.precipitation = precipitation
+        self.precipitation_deposits = precipitation_deposits
+        self.wind_intensity = wind_intensity
+        self.sun_azimuth_angle = sun_azimuth_angle
+        self.sun_altitude_angle = sun_altitude_angle
+
+
+# The presets of CARLA 0.9.8, find_weather_presets() lists the capitalized attributes.
+for _name, _clouds, _rain, _puddles, _altitude in [
+        ('ClearNoon', 15, 0, 0, 75), ('CloudyNoon', 80, 0, 0, 75), ('WetNoon', 20, 0, 50, 75),
+        ('WetCloudyNoon', 80, 0, 50, 75), ('SoftRainNoon', 70, 30, 50, 75), ('MidRainyNoon', 80, 60, 60, 75),
+        ('HardRainNoon', 90, 100, 90, 75), ('ClearSunset', 15, 0, 0, 15), ('CloudySunset', 80, 0, 0, 15),
+        ('WetSunset', 20, 0, 50, 15), ('WetCloudySunset', 80, 0, 50, 15), ('SoftRainSunset', 70, 15, 50, 15),
+        ('MidRainSunset', 80, 30, 50, 15), ('HardRainSunset', 80, 60, 100, 15)]:
+    setattr(WeatherParameters, _name, WeatherParameters(_clouds, _rain, _puddles, 0.0, 0.0, _altitude))
+
+
+class Timestamp(object):
+    def __init__(self, frame, elapsed_seconds, delta_seconds, platform_timestamp):
+        self.frame = frame
+        self.frame_count = frame
+        self.elapsed_seconds = elapsed_seconds
+        self.delta_seconds = delta_seconds
+        self.platform_timestamp = platform_timestamp
+
+
+# ==============================================================================
+# -- Blueprints ----------------------------------------------------------------
+# ==============================================================================
+
+
+class ActorAttribute(object):
+    def __init__(self, attribute_id, value, recommended_values=(), is_modifiable=True):
+        self.id = attribute_id
+        self.value = str(value)
+        self.recommended_values = list(recommended_values)
+        self.is_modifiable = is_modifiable
+
+    def as_str(self):
+        return self.value
+
+    def as_int(self):
+        return int(self.value)
+
+    def as_float(self):
+        return float(self.value)
+
+    def as_bool(self):
+        return self.value.lower() == 'true'
+
+    def __str__(self):
+        return self.value
+
+    def __int__(self):
+        return self.as_int()
+
+    def __float__(self):
+        return self.as_float()
+
+    def __eq__(self, other):
+        return self.value == str(other)
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+class ActorBlueprint(object):
+    def __init__(self, blueprint_id, attributes=None, tags=()):
+        self.id = blueprint_id
+        self.tags = list(tags) or blueprint_id.split('.')
+        self._attributes = dict((name, attribute if isinstance(attribute, ActorAttribute)
+                                 else ActorAttribute(name, attribute))
+                                for name, attribute in (attributes or {}).items())
+
+    def copy(self):
+        attributes = dict((name, ActorAttribute(name, a.value, a.recommended_values, a.is_modifiable))
+                          for name, a in self._attributes.items())
+        return ActorBlueprint(self.id, attributes, self.tags)
+
+    def has_tag(self, tag):
+        return tag in self.tags
+
+    def match_tags(self, wildcard):
+        return any(fnmatch.fnmatch(tag, wildcard) for tag in self.tags)
+
+    def has_attribute(self, attribute_id):
+        return attribute_id in self._attributes
+
+    def get_attribute(self, attribute_id):
+        if attribute_id not in self._attributes:
+            raise IndexError('Blueprint %s has no attribute %s' % (self.id, attribute_id))
+        return self._attributes[attribute_id]
+
+    def set_attribute(self, attribute_id, value):
+        attribute = self.get_attribute(attribute_id)
+        if not attribute.is_modifiable:
+            raise RuntimeError('Attribute %s of %s is not modifiable' % (attribute_id, self.id))
+        attribute.value = str(value)
+
+    def get_attributes(self):
+        return dict((name, attribute.value) for name, attribute in self._attributes.items())
+
+    def __iter__(self):
+        return iter(self._attributes.values())
+
+    def __len__(self):
+        return len(self._attributes)
+
+    def __repr__(self):
+        return 'ActorBlueprint(id=%s)' % self.id
+
+
+class BlueprintLibrary(object):
+    def __init__(self, blueprints):
+        self._blueprints = list(blueprints)
+
+    def find(self, blueprint_id):
+        for blueprint in self._blueprints:
+            if blueprint.id == blueprint_id:
+                return blueprint.copy()
+        raise IndexError('Blueprint %s not found' % blueprint_id)
+
+    def filter(self, wildcard):
+        return BlueprintLibrary([x for x in self._blueprints if fnmatch.fnmatch(x.id, wildcard) or x.match_tags(wildcard)])
+
+    def __iter__(self):
+        return iter(self._blueprints)
+
+    def __len__(self):
+        return len(self._blueprints)
+
+    def __getitem__(self, index):
+        return self._blueprints[index]
+
+
+COLORS = ['255,255,255', '0,0,0', '200,20,20', '20,20,200', '120,120,120']
+VEHICLES = [('audi.a2', 4), ('audi.tt', 4), ('audi.etron', 4), ('bmw.grandtourer', 4), ('tesla.model3', 4),
+            ('toyota.prius', 4), ('nissan.micra', 4), ('mini.cooperst', 4), ('lincoln.mkz2017', 4),
+            ('dodge_charger.police', 4), ('seat.leon', 4), ('carlamotors.carlacola', 4),
+            ('tesla.cybertruck', 4), ('volkswagen.t2', 4), ('yamaha.yzf', 2), ('bh.crossbike', 2)]
+CAMERA_ATTRIBUTES = {'image_size_x': '800', 'image_size_y': '600', 'fov': '90', 'sensor_tick': '0.0'}
+
+
+def make_blueprints():
+    blueprints = []
+    for name, wheels in VEHICLES:
+        attributes = {'number_of_wheels': ActorAttribute('number_of_wheels', wheels, is_modifiable=False),
+                      'role_name': 'autopilot', 'sticky_control': 'true',
+                      'color': ActorAttribute('color', COLORS[0], COLORS)}
+        if wheels == 2:
+            attributes['driver_id'] = ActorAttribute('driver_id', '0', ['0', '1', '2'])
+        blueprints.append(ActorBlueprint('vehicle.' + name, attributes))
+    for i in range(1, 15):
+        blueprints.append(ActorBlueprint('walker.pedestrian.%04d' % i, {
+            'role_name': 'walker', 'is_invincible': 'true',
+            'speed': ActorAttribute('speed', '1.4', ['0.0', '1.4', '2.2'])}))
+    blueprints.append(ActorBlueprint('controller.ai.walker', {'role_name': 'controller'}))
+    blueprints.append(ActorBlueprint('sensor.camera.rgb', dict(CAMERA_ATTRIBUTES, gamma='2.2', role_name='front')))
+    blueprints.append(ActorBlueprint('sensor.camera.depth', dict(CAMERA_ATTRIBUTES, role_name='front')))
+    blueprints.append(ActorBlueprint('sensor.camera.semantic_segmentation', dict(CAMERA_ATTRIBUTES, role_name='front')))
+    for name in ('collision', 'lane_invasion', 'obstacle'):
+        blueprints.append(ActorBlueprint('sensor.other.' + name, {'role_name': 'front'}))
+    blueprints.append(ActorBlueprint('sensor.other.gnss', {'role_name': 'front', 'sensor_tick': '0.0'}))
+    blueprints.append(ActorBlueprint('sensor.other.imu', {'role_name': 'front', 'sensor_tick': '0.0'}))
+    blueprints.append(ActorBlueprint('sensor.other.radar', {
+        'horizontal_fov': '30', 'vertical_fov': '10', 'range': '100', 'points_per_second': '1500',
+        'sensor_tick': '0.0', 'role_name': 'front'}))
+    blueprints.append(ActorBlueprint('sensor.lidar.ray_cast', {
+        'channels': '32', 'range': '10', 'points_per_second': '56000', 'rotation_frequency': '10',
+        'upper_fov': '10', 'lower_fov': '-30', 'sensor_tick': '0.0', 'role_name': 'front'}))
+    return blueprints
+
+
+# ==============================================================================
+# -- Sensor data ---------------------------------------------------------------
+# ==============================================================================
+
+
+class SensorData(object):
+    def __init__(self, frame, timestamp, transform):
+        self.frame = frame
+        self.frame_number = frame
+        self.timestamp = timestamp
+        self.transform = transform
+
+
+class Image(SensorData):
+    def __init__(self, frame, timestamp, transform, width, height, fov, raw_data):
+        super(Image, self).__init__(frame, timestamp, transform)
+        self.width = width
+        self.height = height
+        self.fov = fov
+        self.raw_data = raw_data
+
+    def convert(self, color_converter):
+        pass
+
+    def save_to_disk(self, path, color_converter=None):
+        pass
+
+    def __len__(self):
+        return self.width * self.height
+
+
+class ColorConverter(object):
+    Raw = 0
+    Depth = 1
+    LogarithmicDepth = 2
+    CityScapesPalette = 3
+
+
+class GnssMeasurement(SensorData):
+    def __init__(self, frame, timestamp, transform, latitude, longitude, altitude):
+        super(GnssMeasurement, self).__init__(frame, timestamp, transform)
+        self.latitude = latitude
+        self.longitude = longitude
+        self.altitude = altitude
+
+
+class IMUMeasurement(SensorData):
+    def __init__(self, frame, timestamp, transform, accelerometer, gyroscope, compass):
+        super(IMUMeasurement, self).__init__(frame, timestamp, transform)
+        self.accelerometer = accelerometer
+        self.gyroscope = gyroscope
+        self.compass = compass
+
+
+class RadarDetection(object):
+    def __init__(self, velocity, azimuth, altitude, depth):
+        self.velocity = velocity
+        self.azimuth = azimuth
+        self.altitude = altitude
+        self.depth = depth
+
+
+class RadarMeasurement(SensorData):
+    """raw_data holds (velocity, azimuth, altitude, depth) float32 per detection."""
+    def __init__(self, frame, timestamp, transform, raw_data):
+        super(RadarMeasurement, self).__init__(frame, timestamp, transform)
+        self.raw_data = raw_data
+
+    def get_detection_count(self):
+        return len(self.raw_data) // 16
+
+    def __len__(self):
+        return self.get_detection_count()
+
+    def __iter__(self):
+        for velocity, azimuth, altitude, depth in np.frombuffer(self.raw_data, dtype=np.float32).reshape(-1, 4).tolist():
+            yield RadarDetection(velocity, azimuth, altitude, depth)
+
+
+class LidarMeasurement(SensorData):
+    """raw_data holds (x, y, z) float32 per point, channel by channel as in CARLA 0.9.8."""
+    def __init__(self, frame, timestamp, transform, raw_data, channels, horizontal_angle):
+        super(LidarMeasurement, self).__init__(frame, timestamp, transform)
+        self.raw_data = raw_data
+        self.channels = channels
+        self.horizontal_angle = horizontal_angle
+
+    def get_point_count(self, channel):
+        points = len(self) // self.channels
+        return points + (1 if channel < len(self) % self.channels else 0)
+
+    def __len__(self):
+        return len(self.raw_data) // 12
+
+    def __iter__(self):
+        for x, y, z in np.frombuffer(self.raw_data, dtype=np.float32).reshape(-1, 3).tolist():
+            yield Location(x, y, z)
+
+
+class SyntheticFrames(object):
+    """A few synthetic raw buffers per (kind, width, height), built on first use and cycled through."""
+    def __init__(self):
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind, width, height, frame):
+        key = (kind, width, height)
+        frames = self._frames.get(key)
+        if frames is None:
+            with self._lock:
+                frames = self._frames.get(key)
+                if frames is None:
+                    frames = self._frames[key] = [self.make(kind, width, height, i)
+                                                  for i in range(SETTINGS.frame_variants)]
+        return frames[frame % len(frames)]
+
+    @staticmethod
+    def make(kind, width, height, variant):
+        rng = np.random.RandomState(variant)
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+        if kind == 'depth':
+            # Sky far away at the top, the road getting closer towards the bottom, CARLA encoded.
+            meters = 1000.0 - (y / max(height - 1, 1)) * 995.0 + rng.uniform(0, 2, (height, width))
+            normalized = (meters / 1000.0 * 16777215.0).astype(np.uint32)
+            bgra = np.empty((height, width, 4), dtype=np.uint8)
+            bgra[:, :, 0] = normalized >> 16
+            bgra[:, :, 1] = (normalized >> 8) & 255
+            bgra[:, :, 2] = normalized & 255
+            bgra[:, :, 3] = 255
+            return bgra.tobytes()
+        shade = 96 + 64 * np.sin((x + 17 * variant) / 37.0) * np.cos(y / 23.0) + 48 * (y / max(height - 1, 1))
+        base = np.clip(shade + rng.normal(0, 6, (height, width)), 0, 255).astype(np.uint8)
+        bgra = np.empty((height, width, 4), dtype=np.uint8)
+        bgra[:, :, 0] = base
+        bgra[:, :, 1] = np.clip(base.astype(np.int16) + 8, 0, 255)
+        bgra[:, :, 2] = np.clip(base.astype(np.int16) - 8, 0, 255)
+        bgra[:, :, 3] = 255
+        return bgra.tobytes()
+
+
+_synthetic_frames = SyntheticFrames()
+
+
+# ==============================================================================
+# -- Actors --------------------------------------------------------------------
+# ==============================================================================
+
+
+class Actor(object):
+    def __init__(self, world, actor_id, blueprint, transform, parent=None):
+        self._world = world
+        self.id = actor_id
+        self.type_id = blueprint.id
+        self.attributes = blueprint.get_attributes()
+        self.semantic_tags = []
+        self.parent = parent
+        self.is_alive = True
+        self.bounding_box = BoundingBox(Location(), Vector3D(2.3, 1.0, 0.8))
+        self._transform = copy_transform(transform)
+        self._velocity = Vector3D()
+        self._angular_velocity = Vector3D()
+
+    def get_world(self):
+        return self._world
+
+    def get_transform(self):
+        if self.parent is not None:
+            return self.parent.get_transform().compose(self._transform)
+        return copy_transform(self._transform)
+
+    def get_location(self):
+        return self.get_transform().location
+
+    def get_velocity(self):
+        if self.parent is not None:
+            return self.parent.get_velocity()
+        return Vector3D(self._velocity.x, self._velocity.y, self._velocity.z)
+
+    def get_angular_velocity(self):
+        return Vector3D(self._angular_velocity.x, self._angular_velocity.y, self._angular_velocity.z)
+
+    def get_acceleration(self):
+        return Vector3D()
+
+    def set_transform(self, transform):
+        self._transform = copy_transform(transform)
+
+    def set_location(self, location):
+        self._transform.location = Location(location.x, location.y, location.z)
+
+    def set_velocity(self, velocity):
+        self._velocity = Vector3D(velocity.x, velocity.y, velocity.z)
+
+    def set_angular_velocity(self, velocity):
+        self._angular_velocity = Vector3D(velocity.x, velocity.y, velocity.z)
+
+    set_target_velocity = set_velocity
+    set_target_angular_velocity = set_angular_velocity
+
+    def set_simulate_physics(self, enabled=True):
+        pass
+
+    def add_impulse(self, impulse):
+        pass
+
+    def destroy(self):
+        return self._world._destroy(self.id)
+
+    def __repr__(self):
+        return 'Actor(id=%d, type=%s)' % (self.id, self.type_id)
+
+
+class Vehicle(Actor):
+    def __init__(self, *args, **kwargs):
+        super(Vehicle, self).__init__(*args, **kwargs)
+        self.autopilot = False
+        self._control = VehicleControl()
+
+    def set_autopilot(self, enabled=True, tm_port=8000):
+        self.autopilot = enabled
+
+    def apply_control(self, control):
+        self._control = control
+
+    def get_control(self):
+        return self._control
+
+    def is_at_traffic_light(self):
+        return False
+
+    def get_traffic_light(self):
+        return None
+
+    def get_traffic_light_state(self):
+        return TrafficLightState.Green
+
+    def get_speed_limit(self):
+        return 50.0
+
+
+class Walker(Actor):
+    def __init__(self, *args, **kwargs):
+        super(Walker, self).__init__(*args, **kwargs)
+        self.bounding_box = BoundingBox(Location(), Vector3D(0.3, 0.3, 0.9))
+        self._control = WalkerControl()
+
+    def apply_control(self, control):
+        self._control = control
+
+    def get_control(self):
+        return self._control
+
+
+class WalkerAIController(Actor):
+    def __init__(self, *args, **kwargs):
+        super(WalkerAIController, self).__init__(*args, **kwargs)
+        self.started = False
+        self.target = None
+        self.max_speed = 1.4
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def go_to_location(self, location):
+        self.target = location
+
+    def set_max_speed(self, speed=1.4):
+        self.max_speed = speed
+
+
+class TrafficLight(Actor):
+    def __init__(self, *args, **kwargs):
+        super(TrafficLight, self).__init__(*args, **kwargs)
+        self.state = TrafficLightState.Red
+
+    def set_state(self, state):
+        self.state = state
+
+    def get_state(self):
+        return self.state
+
+    def freeze(self, freeze):
+        pass
+
+
+class Sensor(Actor):
+    def __init__(self, *args, **kwargs):
+        super(Sensor, self).__init__(*args, **kwargs)
+        self.is_listening = False
+        self._callback = None
+        self._last_emitted = None
+        self.sensor_tick = float(self.attributes.get('sensor_tick', 0.0))
+
+    def listen(self, callback):
+        self._callback = callback
+        self.is_listening = True
+
+    def stop(self):
+        self.is_listening = False
+        self._callback = None
+
+    def measure(self, timestamp):
+        """Sensor data of the frame, None when the sensor does not fire on it."""
+        if self._last_emitted is not None and \
+                timestamp.elapsed_seconds - self._last_emitted < self.sensor_tick - 1e-6:
+            return None
+        self._last_emitted = timestamp.elapsed_seconds
+        transform = self.get_transform()
+        frame, seconds = timestamp.frame, timestamp.elapsed_seconds
+        kind = self.type_id
+        if kind.startswith('sensor.camera.'):
+            width, height = int(float(self.attributes['image_size_x'])), int(float(self.attributes['image_size_y']))
+            raw_data = _synthetic_frames.get('depth' if kind == 'sensor.camera.depth' else 'rgb', width, height, frame)
+            return Image(frame, seconds, transform, width, height, float(self.attributes['fov']), raw_data)
+        if kind == 'sensor.other.gnss':
+            l = transform.location
+            return GnssMeasurement(frame, seconds, transform, 49.0 + l.y * 1e-5, 8.0 + l.x * 1e-5, l.z)
+        if kind == 'sensor.other.imu':
+            return IMUMeasurement(frame, seconds, transform, Vector3D(0.0, 0.0, 9.81), Vector3D(),
+                                  math.radians(transform.rotation.yaw) % (2 * math.pi))
+        if kind == 'sensor.other.radar':
+            return RadarMeasurement(frame, seconds, transform, self.make_radar(frame))
+        if kind == 'sensor.lidar.ray_cast':
+            channels = int(self.attributes['channels'])
+            return LidarMeasurement(frame, seconds, transform, self.make_lidar(frame, channels), channels,
+                                    math.radians((frame * 36.0) % 360.0))
+        # Collision, lane invasion and obstacle sensors only report events, the fake has none.
+        return None
+
+    def make_radar(self, frame):
+        rng = np.random.RandomState(frame)
+        n = SETTINGS.radar_detections
+        h_fov = math.radians(float(self.attributes['horizontal_fov'])) / 2.0
+        v_fov = math.radians(float(self.attributes['vertical_fov'])) / 2.0
+        detections = np.empty((n, 4), dtype=np.float32)
+        detections[:, 0] = rng.uniform(-10.0, 10.0, n)
+        detections[:, 1] = rng.uniform(-h_fov, h_fov, n)
+        detections[:, 2] = rng.uniform(-v_fov, v_fov, n)
+        detections[:, 3] = rng.uniform(1.0, float(self.attributes['range']), n)
+        return detections.tobytes()
+
+    def make_lidar(self, frame, channels):
+        rng = np.random.RandomState(frame)
+        n = SETTINGS.lidar_points - SETTINGS.lidar_points % channels
+        upper, lower = float(self.attributes['upper_fov']), float(self.attributes['lower_fov'])
+        altitude = np.radians(np.repeat(np.linspace(upper, lower, channels), n // channels))
+        azimuth = np.tile(np.linspace(0.0, 2 * np.pi, n // channels, endpoint=False), channels)
+        distance = rng.uniform(2.0, float(self.attributes['range']), n)
+        points = np.empty((n, 3), dtype=np.float32)
+        points[:, 0] = distance * np.cos(altitude) * np.cos(azimuth)
+        points[:, 1] = distance * np.cos(altitude) * np.sin(azimuth)
+        points[:, 2] = distance * np.sin(altitude)
+        return points.tobytes()
+
+
+def get_actor_class(type_id):
+    if type_id.startswith('vehicle.'):
+        return Vehicle
+    if type_id.startswith('walker.'):
+        return Walker
+    if type_id == 'controller.ai.walker':
+        return WalkerAIController
+    if type_id == 'traffic.traffic_light':
+        return TrafficLight
+    if type_id.startswith('sensor.'):
+        return Sensor
+    return Actor
+
+
+class ActorList(list):
+    def filter(self, wildcard):
+        return ActorList(x for x in self if fnmatch.fnmatch(x.type_id, wildcard))
+
+    def find(self, actor_id):
+        for actor in self:
+            if actor.id == actor_id:
+                return actor
+        return None
+
+
+class ActorSnapshot(object):
+    __slots__ = ('id', '_transform', '_velocity')
+
+    def __init__(self, actor_id, transform, velocity):
+        self.id = actor_id
+        self._transform = transform
+        self._velocity = velocity
+
+    def get_transform(self):
+        return self._transform
+
+    def get_velocity(self):
+        return self._velocity
+
+    def get_angular_velocity(self):
+        return Vector3D()
+
+    def get_acceleration(self):
+        return Vector3D()
+
+
+class WorldSnapshot(object):
+    def __init__(self, world_id, timestamp, actors):
+        self.id = world_id
+        self.frame = timestamp.frame
+        self.timestamp = timestamp
+        self._actors = actors
+
+    def find(self, actor_id):
+        for actor in self._actors:
+            if actor.id == actor_id:
+                return actor
+        return None
+
+    def has_actor(self, actor_id):
+        return self.find(actor_id) is not None
+
+    def __iter__(self):
+        return iter(self._actors)
+
+    def __len__(self):
+        return len(self._actors)
+
+
+# ==============================================================================
+# -- Map and world -------------------------------------------------------------
+# ==============================================================================
+
+
+class Map(object):
+    """Named 'Town01' as in CARLA 0.9.8. A flat grid town: rows of spawn points every 40 m heading +x, traffic lights at the crossings."""
+    def __init__(self, name, rows=12, columns=25, spacing=40.0):
+        self.name = name
+        self.rows = rows
+        self.columns = columns
+        self.spacing = spacing
+
+    def get_spawn_points(self):
+        return [Transform(Location(c * self.spacing, r * self.spacing, 0.5), Rotation(yaw=0.0))
+                for r in range(self.rows) for c in range(self.columns)]
+
+    def get_size(self):
+        return self.columns * self.spacing, self.rows * self.spacing
+
+    def to_opendrive(self):
+        return ''
+
+
+class WorldSettings(object):
+    def __init__(self, synchronous_mode=False, no_rendering_mode=False, fixed_delta_seconds=None):
+        self.synchronous_mode = synchronous_mode
+        self.no_rendering_mode = no_rendering_mode
+        self.fixed_delta_seconds = fixed_delta_seconds
+
+
+class DebugHelper(object):
+    def __init__(self):
+        self.draw_calls = 0
+
+    def _draw(self, *args, **kwargs):
+        self.draw_calls += 1
+
+    draw_point = draw_line = draw_arrow = draw_box = draw_string = _draw
+
+
+class Dispatcher(object):
+    """Runs listen and on_tick callbacks on worker threads, each sensor on the same thread in frame order."""
+    def __init__(self, num_threads):
+        self._queues = [queue.Queue() for _ in range(max(1, num_threads))]
+        self._threads = []
+        self.latencies = {}
+        self._latencies_lock = threading.Lock()
+        for q in self._queues:
+            thread = threading.Thread(target=self._work, args=(q,))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, type_id, callback, data, emitted):
+        self._queues[key % len(self._queues)].put((type_id, callback, data, emitted))
+
+    def _work(self, q):
+        while True:
+            type_id, callback, data, emitted = q.get()
+            try:
+                callback(data)
+            except Exception:
+                logging.exception('Fake carla callback of %s failed', type_id)
+            finally:
+                latency = time.perf_counter() - emitted
+                with self._latencies_lock:
+                    self.latencies.setdefault(type_id, []).append(latency)
+                q.task_done()
+
+    def join(self):
+        for q in self._queues:
+            q.join()
+
+
+class World(object):
+    _next_id = 1
+
+    def __init__(self, map_name):
+        self.id = World._next_id
+        World._next_id += 1
+        self.map = Map(map_name.rsplit('/', 1)[-1])
+        self.debug = DebugHelper()
+        self._settings = WorldSettings()
+        self._weather = WeatherParameters.ClearNoon
+        self._library = BlueprintLibrary(make_blueprints())
+        self._actors = {}
+        self._next_actor_id = self.id * 100000
+        self._frame = 0
+        self._elapsed = 0.0
+        self._tick_callbacks = {}
+        self._lock = threading.RLock()
+        self.dispatcher = Dispatcher(SETTINGS.dispatch_threads)
+        self.spectator = self._add(ActorBlueprint('spectator'), Transform())
+        for r in range(0, self.map.rows, 2):
+            for c in range(0, self.map.columns, 2):
+                location = Location(c * self.map.spacing + 20.0, r * self.map.spacing + 6.0, 0.0)
+                self._add(ActorBlueprint('traffic.traffic_light'), Transform(location))
+
+    # -- Actors ---------------------------------------------------------------
+
+    def _add(self, blueprint, transform, parent=None):
+        with self._lock:
+            self._next_actor_id += 1
+            actor = get_actor_class(blueprint.id)(self, self._next_actor_id, blueprint, transform, parent)
+            self._actors[actor.id] = actor
+            return actor
+
+    def _destroy(self, actor_id):
+        with self._lock:
+            actor = self._actors.pop(actor_id, None)
+        if actor is None:
+            return False
+        actor.is_alive = False
+        if isinstance(actor, Sensor):
+            actor.stop()
+        return True
+
+    def _spawn(self, blueprint, transform, parent=None):
+        """Returns (actor, error)."""
+        if isinstance(parent, int):
+            parent = self._actors.get(parent)
+            if parent is None:
+                return None, 'Spawn failed because the parent actor does not exist'
+        if parent is None and blueprint.id.startswith(('vehicle.', 'walker.')):
+            location = transform.location
+            with self._lock:
+                for actor in self._actors.values():
+                    if actor.type_id.startswith(('vehicle.', 'walker.')) and \
+                            actor.get_location().distance(location) < 2.0:
+                        return None, 'Spawn failed because of collision at spawn position'
+        return self._add(blueprint, transform, parent), ''
+
+    def spawn_actor(self, blueprint, transform, attach_to=None, attachment_type=AttachmentType.Rigid):
+        actor, error = self._spawn(blueprint, transform, attach_to)
+        if actor is None:
+            raise RuntimeError(error)
+        return actor
+
+    def try_spawn_actor(self, blueprint, transform, attach_to=None, attachment_type=AttachmentType.Rigid):
+        return self._spawn(blueprint, transform, attach_to)[0]
+
+    def get_actor(self, actor_id):
+        return self._actors.get(actor_id)
+
+    def get_actors(self, actor_ids=None):
+        with self._lock:
+            if actor_ids is None:
+                return ActorList(self._actors.values())
+            return ActorList(self._actors[x] for x in actor_ids if x in self._actors)
+
+    def get_spectator(self):
+        return self.spectator
+
+    # -- World ----------------------------------------------------------------
+
+    def get_map(self):
+        return self.map
+
+    def get_blueprint_library(self):
+        return self._library
+
+    def get_settings(self):
+        s = self._settings
+        return WorldSettings(s.synchronous_mode, s.no_rendering_mode, s.fixed_delta_seconds)
+
+    def apply_settings(self, settings):
+        self._settings = WorldSettings(settings.synchronous_mode, settings.no_rendering_mode,
+                                       settings.fixed_delta_seconds)
+        return self._frame
+
+    def get_weather(self):
+        return self._weather
+
+    def set_weather(self, weather):
+        self._weather = weather
+
+    def set_pedestrians_cross_factor(self, percentage):
+        pass
+
+    def get_random_location_from_navigation(self):
+        width, height = self.map.get_size()
+        return Location(random.uniform(0.0, width), random.uniform(0.0, height), 0.3)
+
+    def on_tick(self, callback):
+        callback_id = len(self._tick_callbacks) + 1
+        self._tick_callbacks[callback_id] = callback
+        return callback_id
+
+    def remove_on_tick(self, callback_id):
+        self._tick_callbacks.pop(callback_id, None)
+
+    def get_snapshot(self):
+        with self._lock:
+            timestamp = Timestamp(self._frame, self._elapsed, self._settings.fixed_delta_seconds or 0.05, time.time())
+            actors = [ActorSnapshot(actor.id, actor.get_transform(), actor.get_velocity())
+                      for actor in self._actors.values()]
+        return WorldSnapshot(self.id, timestamp, actors)
+
+    def wait_for_tick(self, seconds=10.0):
+        self.tick()
+        return self.get_snapshot()
+
+    def tick(self, seconds=10.0):
+        with self._lock:
+            dt = self._settings.fixed_delta_seconds or 0.05
+            self._frame += 1
+            self._elapsed += dt
+            self._step(dt)
+            timestamp = Timestamp(self._frame, self._elapsed, dt, time.time())
+            events = [(sensor, sensor.measure(timestamp)) for sensor in self._actors.values()
+                      if isinstance(sensor, Sensor) and sensor.is_listening]
+        if SETTINGS.tick_time:
+            time.sleep(SETTINGS.tick_time)
+        emitted = time.perf_counter()
+        for sensor, data in events:
+            if data is not None and sensor._callback is not None:
+                self.dispatcher.submit(sensor.id, sensor.type_id, sensor._callback, data, emitted)
+        for callback in list(self._tick_callbacks.values()):
+            self.dispatcher.submit(0, 'on_tick', callback, timestamp, emitted)
+        return self._frame
+
+    def _step(self, dt):
+        speed = SETTINGS.vehicle_speed
+        controllers = {}
+        for actor in self._actors.values():
+            if isinstance(actor, WalkerAIController) and actor.started and actor.parent is not None:
+                controllers[actor.parent.id] = actor
+        for actor in self._actors.values():
+            if actor.parent is not None:
+                continue
+            if isinstance(actor, Vehicle) and actor.autopilot:
+                actor._velocity = actor._transform.get_forward_vector() * speed
+            elif isinstance(actor, Walker) and actor.id in controllers:
+                controller = controllers[actor.id]
+                if controller.target is None:
+                    continue
+                offset = controller.target - actor._transform.location
+                distance = offset.length()
+                if distance < 1.0:
+                    controller.target = self.get_random_location_from_navigation()
+                    continue
+                actor._velocity = offset * (controller.max_speed / distance)
+            if actor._velocity.x or actor._velocity.y or actor._velocity.z:
+                l = actor._transform.location
+                actor._transform.location = Location(l.x + actor._velocity.x * dt, l.y + actor._velocity.y * dt,
+                                                     l.z + actor._velocity.z * dt)
+
+    def callback_latencies(self, type_prefix=''):
+        """Seconds from the end of each tick to the end of the listen callbacks of its sensor data."""
+        self.dispatcher.join()
+        with self.dispatcher._latencies_lock:
+            return [x for type_id, latencies in self.dispatcher.latencies.items()
+                    if type_id.startswith(type_prefix) for x in latencies]
+
+
+# ==============================================================================
+# -- Client and commands -------------------------------------------------------
+# ==============================================================================
+
+
+FutureActor = 0
+
+
+class Response(object):
+    def __init__(self, actor_id=0, error=''):
+        self.actor_id = actor_id
+        self.error = error
+
+    def has_error(self):
+        return bool(self.error)
+
+
+def get_actor_id(actor, future_id=None):
+    if actor is FutureActor and future_id is not None:
+        return future_id
+    return actor.id if isinstance(actor, Actor) else actor
+
+
+class Command(object):
+    def __init__(self, actor=None):
+        self.actor = actor
+        self._then = []
+
+    def then(self, command):
+        self._then.append(command)
+        return self
+
+    def run(self, world, future_id=None):
+        """Returns a Response, commands chained with then() run on the actor created or touched."""
+        actor_id = get_actor_id(self.actor, future_id)
+        actor = world.get_actor(actor_id)
+        if actor is None:
+            return Response(actor_id, 'Actor %s not found' % actor_id)
+        error = self.apply(world, actor)
+        return Response(actor_id, error or '')
+
+    def apply(self, world, actor):
+        pass
+
+    def run_chain(self, world, future_id=None):
+        response = self.run(world, future_id)
+        if not response.error:
+            for command in self._then:
+                chained = command.run_chain(world, response.actor_id)
+                if chained.error:
+                    return Response(response.actor_id, chained.error)
+        return response
+
+
+class SpawnActor(Command):
+    def __init__(self, blueprint, transform, parent=None, attachment_type=AttachmentType.Rigid):
+        super(SpawnActor, self).__init__()
+        self.blueprint = blueprint
+        self.transform = transform
+        self.parent = parent
+
+    def run(self, world, future_id=None):
+        parent = get_actor_id(self.parent, future_id) if self.parent is not None else None
+        actor, error = world._spawn(self.blueprint, self.transform, parent)
+        return Response(actor.id if actor is not None else 0, error)
+
+
+class DestroyActor(Command):
+    def apply(self, world, actor):
+        world._destroy(actor.id)
+
+
+class SetAutopilot(Command):
+    def __init__(self, actor, enabled, tm_port=8000):
+        super(SetAutopilot, self).__init__(actor)
+        self.enabled = enabled
+
+    def apply(self, world, actor):
+        if not isinstance(actor, Vehicle):
+            return 'Actor %d is not a vehicle' % actor.id
+        actor.set_autopilot(self.enabled)
+
+
+class ApplyTransform(Command):
+    def __init__(self, actor, transform):
+        super(ApplyTransform, self).__init__(actor)
+        self.transform = transform
+
+    def apply(self, world, actor):
+        actor.set_transform(self.transform)
+
+
+class ApplyVelocity(Command):
+    def __init__(self, actor, velocity):
+        super(ApplyVelocity, self).__init__(actor)
+        self.velocity = velocity
+
+    def apply(self, world, actor):
+        actor.set_velocity(self.velocity)
+
+
+class ApplyAngularVelocity(ApplyVelocity):
+    def apply(self, world, actor):
+        actor.set_angular_velocity(self.velocity)
+
+
+class ApplyVehicleControl(Command):
+    def __init__(self, actor, control):
+        super(ApplyVehicleControl, self).__init__(actor)
+        self.control = control
+
+    def apply(self, world, actor):
+        actor.apply_control(self.control)
+
+
+class command(object):
+    """carla.command"""
+    FutureActor = FutureActor
+    Response = Response
+    SpawnActor = SpawnActor
+    DestroyActor = DestroyActor
+    SetAutopilot = SetAutopilot
+    ApplyTransform = ApplyTransform
+    ApplyVelocity = ApplyVelocity
+    ApplyTargetVelocity = ApplyVelocity
+    ApplyAngularVelocity = ApplyAngularVelocity
+    ApplyTargetAngularVelocity = ApplyAngularVelocity
+    ApplyVehicleControl = ApplyVehicleControl
+
+
+class TrafficManager(object):
+    def __init__(self, port=8000):
+        self.port = port
+
+    def get_port(self):
+        return self.port
+
+    def set_synchronous_mode(self, mode=True):
+        pass
+
+    def set_global_distance_to_leading_vehicle(self, distance):
+        pass
+
+    def global_percentage_speed_difference(self, percentage):
+        pass
+
+    def ignore_lights_percentage(self, actor, percentage):
+        pass
+
+
+MAPS = ['/Game/Carla/Maps/Town%02d' % i for i in (1, 2, 3, 4, 5, 6, 7)]
+
+
+class FakeServer(object):
+    def __init__(self):
+        self.world = World(MAPS[0])
+        self.traffic_manager = TrafficManager()
+        self.recording = None
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+class Client(object):
+    def __init__(self, host='127.0.0.1', port=2000, worker_threads=0):
+        self.host = host
+        self.port = port
+        with _servers_lock:
+            if (host, port) not in _servers:
+                _servers[(host, port)] = FakeServer()
+            self._server = _servers[(host, port)]
+
+    def set_timeout(self, seconds):
+        pass
+
+    def get_client_version(self):
+        return '0.9.8-fake'
+
+    def get_server_version(self):
+        return '0.9.8-fake'
+
+    def get_available_maps(self):
+        return list(MAPS)
+
+    def get_world(self):
+        return self._server.world
+
+    def load_world(self, map_name):
+        name = [x for x in MAPS if x.rsplit('/', 1)[-1] == map_name.rsplit('/', 1)[-1]]
+        if not name:
+            raise RuntimeError('map not found: %s' % map_name)
+        self._server.world = World(name[0])
+        return self._server.world
+
+    def reload_world(self):
+        return self.load_world(self._server.world.map.name)
+
+    def get_trafficmanager(self, port=8000):
+        return self._server.traffic_manager
+
+    def apply_batch(self, commands):
+        self.apply_batch_sync(commands)
+
+    def apply_batch_sync(self, commands, do_tick=False):
+        world = self._server.world
+        responses = [c.run_chain(world) for c in commands]
+        if do_tick:
+            world.tick()
+        return responses
+
+    def start_recorder(self, filename):
+        self._server.recording = filename
+        return filename
+
+    def stop_recorder(self):
+        self._server.recording = None
@@ -0,0 +1,29 @@
+"""
+Runs carla_scripts/run_headless.py, with its own command line, against the in-process fake CARLA server
+(fake_carla.py) instead of a real one, e.g. to try the orchestrator end to end without any server:
+
+    python3 fake_headless.py --car_name Alfred --clip_interval 5 --max_clips 2 --output_dir /tmp/fake_run
+
+Run it from carla_scripts, as run_headless.py, so the car setups are found.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../")
+import runpy
+import fake_carla
+
+RUN_HEADLESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'carla_scripts', 'run_headless.py')
+
+
+def main():
+    fake_carla.install()
+    # No server process to look for or launch, the fake server lives in this process.
+    from carla_scripts import Utils
+    Utils.get_carla_client = lambda host, port, **kwargs: fake_carla.Client(host, port)
+    sys.argv = [RUN_HEADLESS] + sys.argv[1:]
+    runpy.run_path(RUN_HEADLESS, run_name='__main__')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-sweep cost of the radar callback, before (a Python loop building carla.Transform/Rotation objects and
+drawing every detection) and after (one NumPy decode of raw_data, Cartesian points in one pass, drawing
+decimated or off). Runs on the in-process fake CARLA (fake_carla.py).
+
+    python3 radar_benchmark.py --detections 500 1500 5000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../")
+import argparse
+import math
+import time
+import numpy as np
+import fake_carla
+
+carla = fake_carla.install()
+from carla_scripts.Sensors.radar_sensor import radar_to_array, radar_to_points, velocity_colors
+
+
+def legacy_callback(radar_data, debug, velocity_range=7.5):
+    current_rot = radar_data.transform.rotation
+    for detect in radar_data:
+        azi = math.degrees(detect.azimuth)
+        alt = math.degrees(detect.altitude)
+        fw_vec = carla.Vector3D(x=detect.depth - 0.25)
+        carla.Transform(
+            carla.Location(),
+            carla.Rotation(
+                pitch=current_rot.pitch + alt,
+                yaw=current_rot.yaw + azi,
+                roll=current_rot.roll)).transform(fw_vec)
+
+        def clamp(min_v, max_v, value):
+            return max(min_v, min(value, max_v))
+
+        norm_velocity = detect.velocity / velocity_range
+        r = int(clamp(0.0, 1.0, 1.0 - norm_velocity) * 255.0)
+        g = int(clamp(0.0, 1.0, 1.0 - abs(norm_velocity)) * 255.0)
+        b = int(abs(clamp(- 1.0, 0.0, - 1.0 - norm_velocity)) * 255.0)
+        debug.draw_point(radar_data.transform.location + fw_vec, size=0.075, life_time=0.06,
+                         persistent_lines=False, color=carla.Color(r, g, b))
+
+
+def vectorized_callback(radar_data):
+    detections = radar_to_array(radar_data)
+    rotation = radar_data.transform.rotation
+    radar_to_points(detections, rotation.pitch, rotation.yaw)
+    velocity_colors(detections[:, 0], 7.5)
+    return detections
+
+
+def time_per_sweep(func, sweeps, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sweep in sweeps:
+            func(sweep)
+    return (time.perf_counter() - start) * 1000.0 / (repeat * len(sweeps))
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument(
+        '--detections',
+        nargs='+',
+        default=[500, 1500, 5000],
+        type=int,
+        help='Detections per sweep (default: 500 1500 5000)')
+    argparser.add_argument(
+        '--repeat',
+        default=5,
+        type=int,
+        help='Number of passes over the sweeps (default: 5)')
+    args = argparser.parse_args()
+
+    world = carla.Client().get_world()
+    ego = world.spawn_actor(world.get_blueprint_library().find('vehicle.audi.tt'), carla.Transform())
+    sensor = world.spawn_actor(world.get_blueprint_library().find('sensor.other.radar'),
+                               carla.Transform(carla.Location(x=2.8, z=1.0), carla.Rotation(pitch=5)), attach_to=ego)
+    print('%-11s %12s %12s %8s' % ('detections', 'before ms', 'after ms', 'speedup'))
+    for count in args.detections:
+        fake_carla.SETTINGS.radar_detections = count
+        sweeps = [fake_carla.RadarMeasurement(frame, 0.0, sensor.get_transform(), sensor.make_radar(frame))
+                  for frame in range(4)]
+        before = time_per_sweep(lambda sweep: legacy_callback(sweep, world.debug), sweeps, args.repeat)
+        after = time_per_sweep(vectorized_callback, sweeps, args.repeat)
+        print('%-11d %12.2f %12.3f %7.0fx' % (count, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
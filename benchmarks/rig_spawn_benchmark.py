@@ -0,0 +1,146 @@
+"""
+Latency of spawning an ME camera rig of 5 to 10 cameras on the ego, sensor by sensor with world.spawn_actor
+(before) and in one apply_batch_sync (after, spawn_actors).
+
+Against a running server:
+
+    python3 rig_spawn_benchmark.py --sizes 5 7 10
+
+Without a server, with a simulated round trip and server side cost per spawned actor:
+
+    python3 rig_spawn_benchmark.py --synthetic --rpc_latency_ms 1.0 --spawn_ms 2.0
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../")
+import argparse
+import time
+from types import SimpleNamespace
+
+
+class SyntheticServer(object):
+    """Client, world and carla.command stand-in: every call is a round trip, every spawn costs server time."""
+    def __init__(self, rpc_latency, spawn_time):
+        self.rpc_latency = rpc_latency
+        self.spawn_time = spawn_time
+        self.next_id = 1
+        self.id = 0
+
+    def new_actor(self):
+        self.next_id += 1
+        return SimpleNamespace(id=self.next_id, destroy=lambda: time.sleep(self.rpc_latency))
+
+    def spawn_actor(self, blueprint, transform, attach_to=None):
+        time.sleep(self.rpc_latency + self.spawn_time)
+        return self.new_actor()
+
+    def apply_batch_sync(self, batch, do_tick=False):
+        time.sleep(self.rpc_latency + self.spawn_time * len(batch))
+        return [SimpleNamespace(error='', actor_id=self.new_actor().id) for _ in batch]
+
+    def apply_batch(self, batch):
+        time.sleep(self.rpc_latency)
+
+    def get_actors(self, actor_ids):
+        time.sleep(self.rpc_latency)
+        return [SimpleNamespace(id=actor_id) for actor_id in actor_ids]
+
+
+def sequential_spawn(world, blueprint, transform, parent, size):
+    return [world.spawn_actor(blueprint, transform, attach_to=parent) for _ in range(size)]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='IP of the host server (default: 127.0.0.1)')
+    argparser.add_argument(
+        '-p', '--port',
+        default=2000,
+        type=int,
+        help='TCP port to listen to (default: 2000)')
+    argparser.add_argument(
+        '--sizes',
+        nargs='+',
+        default=[5, 6, 7, 8, 9, 10],
+        type=int,
+        help='Rig sizes in cameras (default: 5 to 10)')
+    argparser.add_argument(
+        '--repeat',
+        default=5,
+        type=int,
+        help='Spawns of every rig size (default: 5)')
+    argparser.add_argument(
+        '--res',
+        default='1440x620',
+        help='Camera resolution (default: 1440x620)')
+    argparser.add_argument(
+        '--synthetic',
+        action='store_true',
+        help='Benchmark against a simulated server instead of a running one')
+    argparser.add_argument(
+        '--rpc_latency_ms',
+        default=1.0,
+        type=float,
+        help='Simulated round trip (default: 1.0)')
+    argparser.add_argument(
+        '--spawn_ms',
+        default=2.0,
+        type=float,
+        help='Simulated server side cost of one spawn (default: 2.0)')
+    args = argparser.parse_args()
+
+    if args.synthetic:
+        import types
+        server = SyntheticServer(args.rpc_latency_ms / 1000.0, args.spawn_ms / 1000.0)
+        carla = types.ModuleType('carla')
+        carla.command = SimpleNamespace(SpawnActor=lambda *a: a, DestroyActor=lambda *a: a)
+        sys.modules['carla'] = carla
+        client = world = server
+        ego = server.new_actor()
+        blueprint = transform = None
+        name = 'synthetic, %.1f ms round trip, %.1f ms per spawn' % (args.rpc_latency_ms, args.spawn_ms)
+    else:
+        import carla
+        client = carla.Client(args.host, args.port)
+        client.set_timeout(20.0)
+        world = client.get_world()
+        library = world.get_blueprint_library()
+        ego = world.spawn_actor(library.filter('vehicle.audi.*')[0], world.get_map().get_spawn_points()[0])
+        blueprint = library.find('sensor.camera.rgb')
+        width, height = args.res.split('x')
+        blueprint.set_attribute('image_size_x', width)
+        blueprint.set_attribute('image_size_y', height)
+        transform = carla.Transform(carla.Location(x=1.6, z=1.7))
+        name = '%s:%d, %s cameras' % (args.host, args.port, args.res)
+    from carla_scripts.Utils.sim_utils import spawn_actors
+
+    def destroy(actors):
+        client.apply_batch([carla.command.DestroyActor(actor.id) for actor in actors if actor is not None])
+
+    try:
+        print(name)
+        print('%-8s %14s %14s %9s' % ('cameras', 'one by one ms', 'batch ms', 'speedup'))
+        for size in args.sizes:
+            sequential_ms = batch_ms = 0.0
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                actors = sequential_spawn(world, blueprint, transform, ego, size)
+                sequential_ms += (time.perf_counter() - start) * 1000.0
+                destroy(actors)
+                start = time.perf_counter()
+                actors = spawn_actors(client, world, [(blueprint, transform, ego)] * size)
+                batch_ms += (time.perf_counter() - start) * 1000.0
+                destroy(actors)
+            sequential_ms /= args.repeat
+            batch_ms /= args.repeat
+            print('%-8d %14.1f %14.1f %8.1fx' % (size, sequential_ms, batch_ms, sequential_ms / batch_ms))
+    finally:
+        if not args.synthetic:
+            ego.destroy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Per-tick cost of finding the traffic lights within 20 m of the ego, before (listing every traffic light
+and asking each one for its location) and after (TrafficLightIndex radius query).
+
+Against a running server, on the spawn points of a large town:
+
+    python3 traffic_light_benchmark.py --town Town03
+
+Without a server, with traffic lights scattered over a town sized area and a simulated RPC latency:
+
+    python3 traffic_light_benchmark.py --synthetic 150 --rpc_latency_ms 0.2
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../")
+import argparse
+import random
+import time
+import numpy as np
+from carla_scripts.Utils.traffic_light_index import TrafficLightIndex
+
+RADIUS = 20
+
+
+class Location(object):
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+    def distance(self, other):
+        return np.sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2 + (self.z - other.z) ** 2)
+
+
+class SyntheticTrafficLight(object):
+    rpc_latency = 0.0
+
+    def __init__(self, actor_id, location):
+        self.id = actor_id
+        self._location = location
+
+    def get_location(self):
+        time.sleep(self.rpc_latency)
+        return self._location
+
+
+class SyntheticActorList(list):
+    def filter(self, pattern):
+        time.sleep(SyntheticTrafficLight.rpc_latency)
+        return self
+
+
+class SyntheticWorld(object):
+    def __init__(self, num_lights, extent):
+        self.lights = SyntheticActorList(
+            SyntheticTrafficLight(i, Location(random.uniform(-extent, extent), random.uniform(-extent, extent), 0.0))
+            for i in range(num_lights))
+
+    def get_actors(self):
+        return self.lights
+
+
+def legacy_query(world, location):
+    traffic_lights = world.get_actors().filter('traffic.traffic_light')
+    return [tl for tl in traffic_lights if tl.get_location().distance(location) < RADIUS]
+
+
+def time_per_tick(func, locations):
+    start = time.perf_counter()
+    for location in locations:
+        func(location)
+    return (time.perf_counter() - start) / len(locations) * 1000.0
+
+
+def carla_world(args):
+    import carla
+    client = carla.Client(args.host, args.port)
+    client.set_timeout(20.0)
+    world = client.load_world(args.town)
+    locations = [t.location for t in world.get_map().get_spawn_points()]
+    return world, locations
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='IP of the host server (default: 127.0.0.1)')
+    argparser.add_argument(
+        '-p', '--port',
+        default=2000,
+        type=int,
+        help='TCP port to listen to (default: 2000)')
+    argparser.add_argument(
+        '--town',
+        default='Town03',
+        help='Map to benchmark on (default: Town03)')
+    argparser.add_argument(
+        '--synthetic',
+        default=0,
+        type=int,
+        help='Benchmark on this many synthetic traffic lights instead of a server (default: 0, use the server)')
+    argparser.add_argument(
+        '--extent',
+        default=250.0,
+        type=float,
+        help='Half size in meters of the synthetic town (default: 250)')
+    argparser.add_argument(
+        '--rpc_latency_ms',
+        default=0.2,
+        type=float,
+        help='Simulated latency of one RPC for synthetic traffic lights (default: 0.2)')
+    argparser.add_argument(
+        '--ticks',
+        default=200,
+        type=int,
+        help='Number of ego positions queried (default: 200)')
+    args = argparser.parse_args()
+
+    if args.synthetic:
+        SyntheticTrafficLight.rpc_latency = args.rpc_latency_ms / 1000.0
+        world = SyntheticWorld(args.synthetic, args.extent)
+        locations = [tl.get_location() for tl in world.lights]
+        SyntheticTrafficLight.rpc_latency = 0.0
+        index = TrafficLightIndex(world)
+        index.build()
+        SyntheticTrafficLight.rpc_latency = args.rpc_latency_ms / 1000.0
+        name = 'synthetic, %d lights, %.2f ms per RPC' % (args.synthetic, args.rpc_latency_ms)
+    else:
+        world, locations = carla_world(args)
+        start = time.perf_counter()
+        index = TrafficLightIndex(world)
+        index.build()
+        print('Index built in %.1f ms' % ((time.perf_counter() - start) * 1000.0))
+        name = '%s, %d lights' % (args.town, len(index))
+    locations = [random.choice(locations) for _ in range(args.ticks)]
+
+    for location in locations[:10]:
+        position = (location.x, location.y, location.z)
+        # Actor ids, the server returns new wrappers of the same actors on every call.
+        assert set(tl.id for tl in legacy_query(world, location)) == set(tl.id for tl in index.query(position, RADIUS))
+
+    legacy_ms = time_per_tick(lambda l: legacy_query(world, l), locations)
+    index_ms = time_per_tick(lambda l: index.query((l.x, l.y, l.z), RADIUS), locations)
+    print('%s' % name)
+    print('%-10s %12s' % ('', 'ms / tick'))
+    print('%-10s %12.3f' % ('legacy', legacy_ms))
+    print('%-10s %12.3f' % ('index', index_ms))
+    print('Speedup: %.1fx' % (legacy_ms / index_ms))
+
+
+if __name__ == '__main__':
+    main()
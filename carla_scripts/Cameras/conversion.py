@@ -0,0 +1,91 @@
+import threading
+import numpy as np
+import cv2
+
+# ==============================================================================
+# -- Raw buffer conversion -----------------------------------------------------
+# ==============================================================================
+
+# CARLA depth is R + G * 256 + B * 256 * 256 normalized by 256 ** 3 - 1 and scaled to 1000 m.
+DEPTH_SCALE = np.float32(1000.0 / 16777215.0)
+
+
+def raw_to_bgra(image):
+    """Zero-copy HxWx4 view of a CARLA raw image."""
+    return np.frombuffer(image.raw_data, dtype=np.uint8).reshape((image.height, image.width, 4))
+
+
+def to_bgra_array(image, scale):
+    """Convert a CARLA raw image to a BGRA numpy array."""
+    return cv2.resize(raw_to_bgra(image), (0, 0), fx=float(1 / scale), fy=float(1 / scale))
+
+
+def depth_to_array(image, scale=None):
+    """
+    Convert an image containing CARLA encoded depth-map to a 2D float32 array of depths in meters,
+    downsampled by `scale` with nearest neighbour.
+    """
+    return ImageConverter(scale or 1).to_depth(image, flip=False)
+
+
+class ImageConverter(object):
+    """
+    Converts the raw buffers of one sensor, reusing its intermediate buffers across frames.
+    Returned arrays are freshly allocated and owned by the caller, so they can be queued for writing.
+    """
+    def __init__(self, scale):
+        self.scale = scale
+        self.inv_scale = float(1 / scale)
+        self.int_scale = int(scale) if float(scale).is_integer() else None
+        self._lock = threading.Lock()
+        self._shape = None
+        self._bgra = None
+        self._gray = None
+        self._depth_bgra = None
+        self._depth_int = None
+
+    def _allocate(self, image):
+        shape = (image.height, image.width)
+        if shape == self._shape:
+            return
+        self._shape = shape
+        out_w = int(round(image.width * self.inv_scale))
+        out_h = int(round(image.height * self.inv_scale))
+        self._bgra = np.empty((out_h, out_w, 4), dtype=np.uint8)
+        self._gray = np.empty((out_h, out_w), dtype=np.uint8)
+        depth_shape = (out_h, out_w) if self.int_scale else shape
+        self._depth_bgra = np.empty(depth_shape + (4,), dtype=np.uint8)
+        self._depth_int = np.empty(depth_shape, dtype=np.uint32)
+
+    def to_gray(self, image, flip=True):
+        """Downscaled grayscale image, identical to resizing the BGRA image and converting it to gray."""
+        with self._lock:
+            self._allocate(image)
+            cv2.resize(raw_to_bgra(image), (0, 0), dst=self._bgra, fx=self.inv_scale, fy=self.inv_scale)
+            cv2.cvtColor(self._bgra, cv2.COLOR_BGRA2GRAY, dst=self._gray)
+            return cv2.flip(self._gray, 0) if flip else self._gray.copy()
+
+    def to_depth(self, image, flip=True):
+        """
+        Downscaled float32 depth in meters. Encoded pixels are never interpolated: the raw buffer is
+        decimated (nearest neighbour) before decoding, and the 24 bit value is decoded in integers.
+        """
+        with self._lock:
+            self._allocate(image)
+            bgra = raw_to_bgra(image)
+            if self.int_scale:
+                # Same pixels cv2.INTER_NEAREST picks for an integer downscale.
+                out_h, out_w = self._depth_int.shape
+                bgra = bgra[:out_h * self.int_scale:self.int_scale, :out_w * self.int_scale:self.int_scale]
+                if flip:
+                    bgra = bgra[::-1]
+            np.copyto(self._depth_bgra, bgra)
+            # Read as big endian, B G R A becomes B << 24 | G << 16 | R << 8 | A.
+            packed = self._depth_bgra.view('>u4')[:, :, 0]
+            np.right_shift(packed, 8, out=self._depth_int)
+            depth = np.multiply(self._depth_int, DEPTH_SCALE, dtype=np.float32)
+        if not self.int_scale:
+            depth = cv2.resize(depth, (0, 0), fx=self.inv_scale, fy=self.inv_scale, interpolation=cv2.INTER_NEAREST)
+            if flip:
+                depth = cv2.flip(depth, 0)
+        return depth
@@ -0,0 +1,128 @@
+import collections
+import threading
+import time
+
+# ==============================================================================
+# -- FrameAssembler ------------------------------------------------------------
+# ==============================================================================
+
+
+class FrameBundle(object):
+    def __init__(self, frame, views, missing):
+        self.frame = frame
+        self.views = views
+        self.missing = missing
+
+    @property
+    def complete(self):
+        return not self.missing
+
+    @property
+    def missing_views(self):
+        return sorted(set(view_name for view_name, _ in self.missing))
+
+
+class _PendingFrame(object):
+    def __init__(self, num_expected):
+        self.lock = threading.Lock()
+        self.created = time.monotonic()
+        self.num_expected = num_expected
+        self.parts = {}
+        self.views = {}
+        self.closed = False
+
+    def add(self, view_name, part, data):
+        """Returns None for late data, otherwise whether the frame is now complete."""
+        with self.lock:
+            if self.closed:
+                return None
+            if (view_name, part) not in self.parts:
+                self.parts[(view_name, part)] = True
+                self.views.setdefault(view_name, {}).update(data)
+            return len(self.parts) == self.num_expected
+
+
+class FrameAssembler(object):
+    """
+    Gathers the (view, part) buffers of a sector by grab index and hands out one bundle per tick.
+    Frames are kept in per-frame slots with their own lock, so callbacks of different sensors never
+    contend unless they belong to the same tick. Frames not completed within `timeout` seconds are
+    emitted as partial bundles.
+    """
+    def __init__(self, expected_parts, on_bundle, timeout=2.0, max_emitted_history=1024):
+        self.expected_parts = frozenset(expected_parts)
+        self.on_bundle = on_bundle
+        self.timeout = timeout
+        self._pending = {}
+        self._emitted = set()
+        self._emitted_order = collections.deque()
+        self._max_emitted_history = max_emitted_history
+        self._last_sweep = time.monotonic()
+        self.complete_count = 0
+        self.partial_count = 0
+        self.late_count = 0
+        self.closed = False
+
+    def add(self, frame, view_name, part, data):
+        if self.closed:
+            self.late_count += 1
+            return
+        slot = self._pending.get(frame)
+        if slot is None:
+            if frame in self._emitted:
+                self.late_count += 1
+                return
+            slot = self._pending.setdefault(frame, _PendingFrame(len(self.expected_parts)))
+        is_complete = slot.add(view_name, part, data)
+        if is_complete is None:
+            self.late_count += 1
+        elif is_complete:
+            self._emit(frame)
+        self._expire()
+
+    def _emit(self, frame):
+        slot = self._pending.get(frame)
+        on_bundle = self.on_bundle
+        if slot is None or on_bundle is None:
+            return
+        with slot.lock:
+            if slot.closed:
+                return
+            slot.closed = True
+        self._emitted.add(frame)
+        self._emitted_order.append(frame)
+        if len(self._emitted_order) > self._max_emitted_history:
+            try:
+                self._emitted.discard(self._emitted_order.popleft())
+            except IndexError:
+                pass
+        self._pending.pop(frame, None)
+        missing = sorted(self.expected_parts.difference(slot.parts))
+        if missing:
+            self.partial_count += 1
+        else:
+            self.complete_count += 1
+        on_bundle(FrameBundle(frame, slot.views, missing))
+
+    def _expire(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.timeout / 4.0:
+            return
+        self._last_sweep = now
+        for frame in list(self._pending):
+            slot = self._pending.get(frame)
+            if slot is not None and now - slot.created > self.timeout:
+                self._emit(frame)
+
+    def flush(self):
+        """Emits every pending frame, complete or not."""
+        for frame in sorted(self._pending):
+            self._emit(frame)
+
+    def close(self):
+        """Flushes the pending frames, data added afterwards (e.g. callbacks of destroyed sensors) is dropped."""
+        self.closed = True
+        self.flush()
+        # A callback that got past the closed check while flushing must not emit into a newer clip.
+        self.on_bundle = None
+        self._pending.clear()
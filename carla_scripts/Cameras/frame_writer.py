@@ -0,0 +1,134 @@
+import logging
+import threading
+import queue
+import numpy as np
+
+# ==============================================================================
+# -- FrameWriter ---------------------------------------------------------------
+# ==============================================================================
+
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BACKPRESSURE_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+
+def save_npz(file_path, data):
+    np.savez(file_path, **data)
+
+
+class FrameWriter(object):
+    """
+    Bounded queue drained by a pool of worker threads that own serialization and file I/O,
+    so sensor callbacks only pay for an enqueue.
+    """
+    def __init__(self, num_workers=2, max_queue_size=64, policy=BLOCK, save_func=save_npz, on_drop=None):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError('Unknown backpressure policy %r, expected one of %s' %
+                             (policy, ', '.join(BACKPRESSURE_POLICIES)))
+        self.num_workers = max(1, num_workers)
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.save_func = save_func
+        # Called with the target of every dropped frame.
+        self.on_drop = on_drop
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stats_lock = threading.Lock()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        # Set by close(), frames submitted afterwards (e.g. by late sensor callbacks) are dropped.
+        self.closed = False
+        self._workers = []
+        self._start_workers()
+
+    def _start_workers(self):
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._work, name='FrameWriter-%d' % i, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def submit(self, target, data):
+        """Queues a frame for `save_func(target, data)`. Returns False if the frame was dropped."""
+        self._count('submitted')
+        if self.closed:
+            self._drop(target)
+            return False
+        item = (target, data)
+        if self.policy == BLOCK:
+            self._queue.put(item)
+            return True
+        if self.policy == DROP_NEWEST:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                self._drop(target)
+                return False
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    dropped = self._queue.get_nowait()
+                except queue.Empty:
+                    continue
+                self._queue.task_done()
+                if dropped is None:
+                    # A stop sentinel of close(), it goes back and the frame is dropped instead.
+                    self._queue.put(None)
+                    self._drop(target)
+                    return False
+                self._drop(dropped[0])
+
+    def _drop(self, target):
+        self._count('dropped')
+        if self.on_drop is not None:
+            self.on_drop(target)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                target, data = item
+                self.save_func(target, data)
+                self._count('written')
+            except Exception:
+                self._count('errors')
+                logging.exception('Failed writing frame %s', str(item[0]))
+            finally:
+                self._queue.task_done()
+
+    def get_queue_depth(self):
+        return self._queue.qsize()
+
+    def get_stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'submitted': self.submitted,
+                'written': self.written,
+                'dropped': self.dropped,
+                'errors': self.errors,
+            }
+
+    def drain(self):
+        """Blocks until every queued frame has been written."""
+        self._queue.join()
+
+    def close(self):
+        self.closed = True
+        self.drain()
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
@@ -1,33 +1,35 @@
 import os
 import json
 import numpy as np
-import cv2
 import random
+import threading
+import time
+import logging
 from scipy.spatial.transform import Rotation
 from os.path import join, exists
 import carla
-
-
-def to_bgra_array(image, scale):
-    """Convert a CARLA raw image to a BGRA numpy array."""
-    array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
-    array = np.reshape(array, (image.height, image.width, 4))
-    return cv2.resize(array, (0, 0), fx=float(1 / scale), fy=float(1 / scale)).astype(np.uint8)
-
-
-def depth_to_array(image, scale=None):
-    """
-    Convert an image containing CARLA encoded depth-map to a 2D array containing
-    the depth value of each pixel normalized between [0.0, 1.0].
-    """
-    array = to_bgra_array(image, scale)
-    array = array.astype(np.float32)
-    depth = np.dot(array[:, :, :3], [65536.0, 256.0, 1.0]) # (R + G * 256 + B * 256 * 256)
-    depth /= 16777.215  # (256.0 * 256.0 * 256.0 - 1.0) / 1000
-    if scale:
-        return cv2.resize(depth, (0,0), fx=float(1/scale), fy=float(1/scale), interpolation=cv2.INTER_NEAREST).astype(np.float32)
-    else:
-        return depth.astype(np.float32)
+from carla_scripts.Cameras.frame_writer import FrameWriter, BLOCK, save_npz
+from carla_scripts.Cameras.frame_assembler import FrameAssembler, FrameBundle
+from carla_scripts.Cameras.sync_capture import SyncCapture
+from carla_scripts.Cameras.conversion import ImageConverter, to_bgra_array, depth_to_array
+from carla_scripts.Dataset.clip_container import ClipWriter, CLIP_EXTENSION
+from carla_scripts.Dataset.codecs import get_codec, encode_frame, RAW
+from carla_scripts.Sensors.lidar_sensor import lidar_to_array, get_lidar_config, get_lidar_spawn_spec
+from carla_scripts.Dataset.manifest import ClipManifest, get_rig_version, MANIFEST_FILE
+from carla_scripts.Dataset.telemetry import TelemetryRecorder
+from carla_scripts.Dataset.index import DatasetIndex
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
+from carla_scripts.Utils.sim_utils import spawn_actors
+from carla_scripts.Utils.profiler import NULL_PROFILER
+
+NPZ_FORMAT = 'npz'
+CLIP_FORMAT = 'clip'
+OUTPUT_FORMATS = (NPZ_FORMAT, CLIP_FORMAT)
+CLIP_LAYOUT_PER_CLIP = 'clip'
+CLIP_LAYOUT_PER_VIEW = 'view'
+CLIP_LAYOUTS = (CLIP_LAYOUT_PER_CLIP, CLIP_LAYOUT_PER_VIEW)
+# Profiler counters of the sensor frames received, per part.
+RECEIVED_COUNTERS = {'image': 'frames_received', 'sim_depth': 'depth_frames_received'}
 
 
 def matrix_from_euler_angles(euler_angles, negate_yaw=False):
@@ -73,6 +75,8 @@ class MEView(object):
         self.cam_name = cam_name
         self.T_to_main = T_to_main
         self.sector = sector
+        R, T = matrix_from_euler_angles(self.sector.R_to_main), self.T_to_main
+        self._RT_view_to_main = np.r_[np.c_[R, T], np.array([0, 0, 0, 1]).reshape((1, 4))]
 
     def get_view_name(self):
         return "%s_to_%s" % (self.cam_name, self.sector.sector_name)
@@ -81,24 +85,84 @@ class MEView(object):
         return self.cam_name == self.sector.sector_name
 
     def get_RT_view_to_main(self):
-        R, T = matrix_from_euler_angles(self.sector.R_to_main), self.T_to_main
-        return np.r_[np.c_[R, T], np.array([0, 0, 0, 1]).reshape((1, 4))]
+        return self._RT_view_to_main
+
+    def get_calibration(self):
+        return {
+            'cam_name': self.cam_name,
+            'origin': self.sector.origin,
+            'focal': self.sector.focal,
+            'fov': float(self.sector.get_fov()),
+            'width': self.sector.width,
+            'height': self.sector.height,
+            'scale': self.sector.scale,
+            'R_to_main': self.sector.R_to_main,
+            'T_to_main': self.T_to_main,
+            'RT_view_to_main': self._RT_view_to_main.tolist(),
+        }
 
 
 class MECameraManager(object):
-    def __init__(self, world, player, simulation_id, sector, car_name, capture_frequency=0.5, output_dir=None):
+    def __init__(self, world, player, simulation_id, sector, car_name, capture_frequency=0.5, output_dir=None,
+                 writer_threads=2, writer_queue_size=64, writer_policy=BLOCK, assembler_timeout=2.0,
+                 write_partial_frames=True, output_format=NPZ_FORMAT, clip_layout=CLIP_LAYOUT_PER_CLIP,
+                 image_codec=RAW, depth_codec=RAW, map_name=None, full_frame_metadata=False,
+                 capture_every=0, capture_timeout=2.0, client=None, profiler=None, lidar_codec='points_q16',
+                 record_telemetry=True, write_index=True, index_root=None):
         self.world = world
+        # With a client the rig is spawned in one batch, otherwise sensor by sensor.
+        self.client = client
         self.player = player
         self.simulation_id = simulation_id
         self.car_name = car_name
         self.car_setup = MECameraManager.get_car_setup(self.car_name)
         self.sector = None
         self.update_sector(sector)
+        self.output_root = output_dir
         self.output_dir = None
         self.update_output_dir()
-        self.center_view_frame_data_with_depth = None
         self.capture_frequency = capture_frequency
         self.sensors_list = []
+        self.me_views = []
+        self.sensors_sector = None
+        self.assembler = None
+        self.assembler_timeout = assembler_timeout
+        self.write_partial_frames = write_partial_frames
+        self.view_dirs = {}
+        # Non-camera sensors recorded with the clip, {name: config} (see add_sensor).
+        self.extra_sensors = {}
+        # Lidars of the car setup, {name: config}. Their sweeps go to one <clip>/<name>.clip per clip.
+        self.lidars = dict((name, get_lidar_config(name, setup))
+                           for name, setup in self.car_setup.get('lidars', {}).items())
+        for config in self.lidars.values():
+            config['codec'] = lidar_codec
+        self.clip_dir = None
+        self.output_format = output_format
+        self.clip_layout = clip_layout
+        self.clip_writers = {}
+        self._clip_writers_lock = threading.Lock()
+        self.map_name = map_name
+        # Per-tick ego telemetry of the current clip, appended by Simulator.record_telemetry.
+        self.record_telemetry = record_telemetry
+        self.telemetry = None
+        self.weather = None
+        self.manifest = None
+        self.full_frame_metadata = full_frame_metadata
+        # With capture_every, sensors stream every tick and Simulator.tick collects them (see SyncCapture).
+        self.sync_capture = SyncCapture(capture_every, capture_timeout) if capture_every else None
+        self.sync_converters = {}
+        self.codecs = {'image': image_codec, 'sim_depth': depth_codec, 'lidar': lidar_codec}
+        for spec in self.codecs.values():
+            get_codec(spec)
+        self.profiler = profiler or NULL_PROFILER
+        # Frames written are added to the index of the output tree, <index root>/index.sqlite (see init_manifest),
+        # the index root defaults to the output root.
+        self.write_index = write_index
+        self.index_root = index_root
+        self.index = None
+        self.frame_writer = FrameWriter(num_workers=writer_threads, max_queue_size=writer_queue_size,
+                                        policy=writer_policy, save_func=self.write_frame,
+                                        on_drop=self.on_frame_dropped)
 
     @staticmethod
     def config_out_dir(car_name, sector, output_dir=None):
@@ -114,6 +178,9 @@ class MECameraManager(object):
         conf_file_path = 'Cameras/setup/{car_name}.json'.format(car_name=car_name)
         with open(conf_file_path, 'r') as f:
             setup = json.load(f)
+        if 'views' not in setup and 'sectors' in setup:
+            # Older setups (Alfred) name the views 'sectors'.
+            setup['views'] = setup.pop('sectors')
         return setup
 
     def update_sector(self, sector):
@@ -123,7 +190,7 @@ class MECameraManager(object):
         self.sector = sector
 
     def update_output_dir(self):
-        self.output_dir = MECameraManager.config_out_dir(self.car_name, self.sector)
+        self.output_dir = MECameraManager.config_out_dir(self.car_name, self.sector, self.output_root)
 
     def get_reset_matrix(self):
         return self.car_setup['reset_matrix']
@@ -141,76 +208,321 @@ class MECameraManager(object):
                              sector_setup['width'], sector_setup['height'], sector_setup['focal'],
                              sector_setup['scale'])
         sector_cams = sector_setup['cams']
-        for cam in sector_cams:
-            me_view = MEView(cam, self.get_camera_location(cam), me_sector)
-            self.init_sensor(me_view, reset_matrix)
+        me_views = [MEView(cam, self.get_camera_location(cam), me_sector) for cam in sector_cams]
+        expected_parts = [(me_view.get_view_name(), 'image') for me_view in me_views]
+        expected_parts += [(me_view.get_view_name(), 'sim_depth') for me_view in me_views if me_view.is_center_view()]
+        self.me_views = me_views
+        self.sensors_sector = self.sector
+        self.init_clip_dir()
+        for sensor_name in self.extra_sensors:
+            self.init_data_dir(sensor_name)
+        self.init_manifest(me_views)
+        self.init_telemetry()
+        self.assembler = FrameAssembler(expected_parts, self.save_bundle, timeout=self.assembler_timeout)
+        rig = []
+        for me_view in me_views:
+            rig.append((me_view, 'sensor.camera.rgb'))
             if me_view.is_center_view():
-                self.init_sensor(me_view, reset_matrix, sensor_type="sensor.camera.depth")
+                rig.append((me_view, 'sensor.camera.depth'))
+        lidars = sorted(self.lidars)
+        start = time.perf_counter()
+        if self.client is None:
+            for me_view, sensor_type in rig:
+                self.init_sensor(me_view, reset_matrix, sensor_type)
+            for lidar_name in lidars:
+                self.init_lidar(lidar_name)
+        else:
+            # The whole rig in one round trip, listeners are attached once every sensor exists.
+            specs = [(self.get_sensor_blueprint(me_view, sensor_type), self.get_sensor_transform(me_view, reset_matrix),
+                      self.player) for me_view, sensor_type in rig]
+            specs += [get_lidar_spawn_spec(self.world, self.lidars[lidar_name], self.get_sensor_tick()) + (self.player,)
+                      for lidar_name in lidars]
+            sensors = spawn_actors(self.client, self.world, specs)
+            for (me_view, sensor_type), sensor in zip(rig, sensors):
+                if sensor is None:
+                    self.init_sensor(me_view, reset_matrix, sensor_type)
+                else:
+                    self.sensors_list.append(sensor)
+                    sensor.listen(self.get_process_func(me_view, sensor_type))
+            for lidar_name, sensor in zip(lidars, sensors[len(rig):]):
+                if sensor is None:
+                    self.init_lidar(lidar_name)
+                else:
+                    self.sensors_list.append(sensor)
+                    sensor.listen(self.get_lidar_process_func(lidar_name))
+        logging.info('Spawned %d ME sensors in %.1f ms', len(rig) + len(lidars), (time.perf_counter() - start) * 1000.0)
+
+    def init_clip_dir(self):
+        if not exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        self.clip_dir = join(self.output_dir, self.simulation_id)
+        if not exists(self.clip_dir):
+            os.mkdir(self.clip_dir)
+
+    def init_view_dir(self, me_view):
+        self.init_data_dir(me_view.get_view_name())
+
+    def init_data_dir(self, name):
+        if self.output_format == NPZ_FORMAT:
+            dir_path = join(self.clip_dir, name)
+            if not exists(dir_path):
+                os.mkdir(dir_path)
+            self.view_dirs[name] = dir_path
+
+    def rotate_clip(self):
+        """
+        Starts writing to the clip of the current simulation_id while keeping the sensors alive. Pending
+        frames are written to the previous clip first. The sensors must still match the current sector.
+        """
+        if self.assembler is not None:
+            self.assembler.flush()
+        self.frame_writer.drain()
+        self.close_clip_writers()
+        self.init_clip_dir()
+        for me_view in self.me_views:
+            self.init_view_dir(me_view)
+        for sensor_name in self.extra_sensors:
+            self.init_data_dir(sensor_name)
+        self.init_manifest(self.me_views)
+        self.init_telemetry()
+
+    def init_manifest(self, me_views):
+        manifest = ClipManifest(self.simulation_id, self.car_name, self.sector,
+                                get_rig_version(self.car_name, self.car_setup), self.get_reset_matrix(),
+                                dict((me_view.get_view_name(), me_view.get_calibration()) for me_view in me_views),
+                                map_name=self.map_name, capture_frequency=self.capture_frequency,
+                                sensors=dict(self.extra_sensors, **self.lidars))
+        if exists(join(self.clip_dir, MANIFEST_FILE)):
+            # Restarted within the same clip, keep the weather history.
+            manifest.weather = ClipManifest.load(self.clip_dir).weather
+        if self.weather is not None:
+            manifest.set_weather(self.weather, self.world.get_snapshot().frame)
+        manifest.save(self.clip_dir)
+        self.manifest = manifest
+        if self.write_index and self.index is None:
+            self.index = DatasetIndex(self.index_root or self.output_root or 'output')
+        if self.index is not None:
+            self.index.add_clip(self.clip_dir, self.car_name, self.sector, list(manifest.views))
+
+    def init_telemetry(self):
+        if self.record_telemetry:
+            self.telemetry = TelemetryRecorder(self.clip_dir)
+
+    def set_weather(self, weather_name):
+        self.weather = weather_name
+        if self.manifest is not None and self.manifest.set_weather(weather_name, self.world.get_snapshot().frame):
+            self.manifest.save(self.clip_dir)
+
+    def get_sensor_tick(self):
+        """sensor_tick of the ME sensors, and of other sensors recorded with them."""
+        return 0.0 if self.sync_capture is not None else self.capture_frequency
+
+    def get_sensor_blueprint(self, me_view, sensor_type):
+        sensor_tick = self.get_sensor_tick()
+        return get_blueprint_registry(self.world).get(sensor_type,
+                                                      image_size_x=me_view.sector.get_image_width(),
+                                                      image_size_y=me_view.sector.get_image_height(),
+                                                      fov=me_view.sector.get_fov(), sensor_tick=sensor_tick)
 
-    def init_sensor(self, me_view, reset_matrix, sensor_type='sensor.camera.rgb'):
-        sensor_bp = self.world.get_blueprint_library().find(sensor_type)
-        sensor_bp.set_attribute('image_size_x', str(me_view.sector.get_image_width()))
-        sensor_bp.set_attribute('image_size_y', str(me_view.sector.get_image_height()))
-        sensor_bp.set_attribute('fov', str(me_view.sector.get_fov()))
-        sensor_bp.set_attribute('sensor_tick', str(self.capture_frequency))
+    @staticmethod
+    def get_sensor_transform(me_view, reset_matrix):
         rel_matrix = np.matmul(me_view.get_RT_view_to_main(), reset_matrix)
         y, z, x = rel_matrix[:3, 3]
         sensor_location = carla.Location(x=x, y=y, z=z)
-        negate_yaw = 'rear' in me_view.get_view_name()
         pitch, yaw, roll = me_view.sector.R_to_main
         sensor_rotation = carla.Rotation(pitch=pitch, yaw=yaw, roll=roll)
-        rel_transform = carla.Transform(sensor_location, sensor_rotation)
-        sensor = self.world.spawn_actor(sensor_bp, rel_transform, attach_to=self.player)
+        return carla.Transform(sensor_location, sensor_rotation)
+
+    def init_sensor(self, me_view, reset_matrix, sensor_type='sensor.camera.rgb'):
+        sensor = self.world.spawn_actor(self.get_sensor_blueprint(me_view, sensor_type),
+                                        self.get_sensor_transform(me_view, reset_matrix), attach_to=self.player)
         self.sensors_list.append(sensor)
         sensor.listen(self.get_process_func(me_view, sensor_type))
 
+    def init_lidar(self, lidar_name):
+        sensor = self.world.spawn_actor(*get_lidar_spawn_spec(self.world, self.lidars[lidar_name], self.get_sensor_tick()),
+                                        attach_to=self.player)
+        self.sensors_list.append(sensor)
+        sensor.listen(self.get_lidar_process_func(lidar_name))
+
     def destroy(self):
         for sensor in self.sensors_list:
             if sensor is not None:
                 sensor.destroy()
         self.sensors_list = []
+        self.me_views = []
+        self.sensors_sector = None
+        if self.sync_capture is not None:
+            self.sync_capture.clear()
+            self.sync_converters = {}
+        if self.assembler is not None:
+            self.assembler.close()
+            self.assembler = None
+        self.frame_writer.drain()
+        self.close_clip_writers()
+
+    def close(self):
+        self.destroy()
+        self.frame_writer.close()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
 
     def get_process_func(self, me_view, sensor_type):
         # Makes sure output folders exist
-        if not exists(self.output_dir):
-            os.mkdir(self.output_dir)
-        simulation_dir_path = join(self.output_dir, self.simulation_id)
-        if not exists(simulation_dir_path):
-            os.mkdir(simulation_dir_path)
-        cam_dir_path = join(simulation_dir_path, me_view.get_view_name())
-        if not exists(cam_dir_path):
-            os.mkdir(cam_dir_path)
+        self.init_view_dir(me_view)
+        assembler = self.assembler
+        converter = ImageConverter(me_view.sector.scale)
+        view_name = me_view.get_view_name()
+        part = 'sim_depth' if sensor_type == 'sensor.camera.depth' else 'image'
+        if self.sync_capture is not None:
+            self.sync_converters[(view_name, part)] = converter
+            return self.sync_capture.register((view_name, part))
+
+        profiler = self.profiler
+        stage = 'convert.%s.%s' % (view_name, part)
+        counter = RECEIVED_COUNTERS[part]
 
         # Generates the actual listen function run on each clock tick.
         def process(image):
-            gi = image.frame
-            file_path = join(cam_dir_path, '%s_%s_%07d.npz' %
-                             (self.simulation_id, me_view.get_view_name(), gi))
-            data = {
-                'origin': me_view.sector.origin,
-                'focal': me_view.sector.focal,
-                'fov': me_view.sector.get_fov(),
-                'grab_index': gi,
-                'RT_view_to_main': me_view.get_RT_view_to_main(),
-                'clip_name': self.simulation_id
-            }
-            scale = me_view.sector.scale
-            if sensor_type == 'sensor.camera.rgb':
-                data['image'] = np.flip(cv2.cvtColor(to_bgra_array(image, scale=scale),
-                                                     cv2.COLOR_BGRA2GRAY), 0)
-            elif sensor_type == 'sensor.camera.depth':
-                data['sim_depth'] = np.flip(depth_to_array(image, scale=scale), 0)
-            self.save_frame(file_path, data)
+            # The sensor was destroyed (or the sector changed) while this callback was in flight.
+            if assembler.closed:
+                return
+            profiler.count(counter, view_name)
+            with profiler.stage(stage):
+                data = self.convert(image, view_name, part, converter)
+            assembler.add(image.frame, view_name, part, data)
 
         return process
 
-    def save_frame(self, file_path, data):
-        center_view = "%s_to_%s" % (self.sector, self.sector)
-        if center_view in file_path:
-            if self.center_view_frame_data_with_depth is None:
-                self.center_view_frame_data_with_depth = data
+    def get_lidar_process_func(self, lidar_name):
+        profiler = self.profiler
+        stage = 'convert.%s' % lidar_name
+
+        def process(lidar_data):
+            if self.sync_capture is not None and not self.sync_capture.is_capture_frame(lidar_data.frame):
                 return
+            profiler.count('frames_received', lidar_name)
+            with profiler.stage(stage):
+                data = {'grab_index': lidar_data.frame, 'lidar': lidar_to_array(lidar_data)}
+            self.frame_writer.submit(self.get_sensor_container_target(lidar_name, lidar_data.frame), data)
+
+        return process
+
+    def convert(self, image, view_name, part, converter):
+        data = dict(self.manifest.frame_metadata(view_name)) if self.full_frame_metadata else {}
+        data['grab_index'] = image.frame
+        if part == 'image':
+            data[part] = converter.to_gray(image)
+        else:
+            data[part] = converter.to_depth(image)
+        return data
+
+    def capture(self, frame):
+        """Collects and saves the views of a tick in tick-locked mode. Returns False off the capture cadence."""
+        if not self.sync_capture.is_capture_frame(frame):
+            return False
+        profiler = self.profiler
+        with profiler.stage('collect'):
+            images, missing = self.sync_capture.collect(frame)
+        views = {}
+        for (view_name, part), image in images.items():
+            profiler.count(RECEIVED_COUNTERS[part], view_name)
+            with profiler.stage('convert.%s.%s' % (view_name, part)):
+                data = self.convert(image, view_name, part, self.sync_converters[(view_name, part)])
+            views.setdefault(view_name, {}).update(data)
+        self.save_bundle(FrameBundle(frame, views, sorted(missing)))
+        return True
+
+    def save_bundle(self, bundle):
+        if not bundle.complete:
+            for view_name in bundle.missing_views:
+                self.profiler.count('frames_missing', view_name)
+            if not self.write_partial_frames:
+                for view_name in bundle.views:
+                    self.profiler.count('frames_dropped', view_name)
+                return
+            missing_views = np.array(bundle.missing_views)
+        for view_name, data in bundle.views.items():
+            if not bundle.complete:
+                data['missing_views'] = missing_views
+            self.frame_writer.submit(self.get_frame_target(view_name, bundle.frame), data)
+
+    def get_frame_target(self, view_name, frame):
+        """The write target (see write_frame) of a view or sensor frame in the current clip."""
+        clip_name = os.path.basename(self.clip_dir)
+        if self.output_format == CLIP_FORMAT:
+            file_name = clip_name if self.clip_layout == CLIP_LAYOUT_PER_CLIP else view_name
+            return join(self.clip_dir, file_name + CLIP_EXTENSION), view_name, frame
+        return join(self.view_dirs[view_name], '%s_%s_%07d.npz' % (clip_name, view_name, frame)), view_name, frame
+
+    def get_sensor_container_target(self, sensor_name, frame):
+        """
+        The write target of a frame of a sensor kept in a container of its own, <clip>/<sensor>.clip, whatever
+        the output format: one file per clip holding every sweep, indexed by grab index.
+        """
+        return join(self.clip_dir, sensor_name + CLIP_EXTENSION), sensor_name, frame
+
+    def add_sensor(self, sensor_name, config):
+        """
+        Records a non-camera sensor (e.g. radar) with the clip: its frames, passed to save_sensor_frame, are
+        written next to the views and `config` goes to the clip manifest.
+        """
+        self.extra_sensors[sensor_name] = config
+        if self.manifest is not None:
+            self.init_data_dir(sensor_name)
+            self.init_manifest(self.me_views)
+
+    def save_sensor_frame(self, sensor_name, frame, data):
+        """Queues the data of a sensor added with add_sensor, keyed by its grab index like the views."""
+        if self.manifest is None or sensor_name not in self.extra_sensors:
+            return
+        if self.sync_capture is not None and not self.sync_capture.is_capture_frame(frame):
+            return
+        self.profiler.count('frames_received', sensor_name)
+        data['grab_index'] = frame
+        self.frame_writer.submit(self.get_frame_target(sensor_name, frame), data)
+
+    def write_frame(self, target, data):
+        """`target` is (path, view name, grab index), path is the clip file or the npz file of the frame."""
+        path, view_name, grab_index = target
+        with self.profiler.stage('write.%s' % view_name):
+            data = encode_frame(data, self.codecs)
+            if path.endswith(CLIP_EXTENSION):
+                self.get_clip_writer(path).append(grab_index, view_name, data)
             else:
-                data = {**self.center_view_frame_data_with_depth, **data}
-                self.center_view_frame_data_with_depth = None
-        np.savez(file_path, **data)
\ No newline at end of file
+                save_npz(path, data)
+            if self.index is not None:
+                self.add_to_index(path, view_name, grab_index, data)
+        self.profiler.count('frames_written', view_name)
+
+    def add_to_index(self, path, view_name, grab_index, data):
+        if path.endswith(CLIP_EXTENSION):
+            clip_dir = os.path.dirname(path)
+            size = sum(np.asarray(value).nbytes for value in data.values())
+            mtime = None
+        else:
+            clip_dir = os.path.dirname(os.path.dirname(path))
+            stat = os.stat(path)
+            size, mtime = stat.st_size, stat.st_mtime
+        self.index.add_frame(clip_dir, view_name, grab_index, path, data.keys(), size=size, mtime=mtime)
+
+    def on_frame_dropped(self, target):
+        self.profiler.count('frames_dropped', target[1])
+
+    def get_clip_writer(self, clip_path):
+        with self._clip_writers_lock:
+            if clip_path not in self.clip_writers:
+                self.clip_writers[clip_path] = ClipWriter(clip_path)
+            return self.clip_writers[clip_path]
+
+    def close_clip_writers(self):
+        if self.telemetry is not None:
+            self.telemetry.close()
+            self.telemetry = None
+        if self.index is not None:
+            self.index.commit()
+        with self._clip_writers_lock:
+            for clip_writer in self.clip_writers.values():
+                clip_writer.close()
+            self.clip_writers = {}
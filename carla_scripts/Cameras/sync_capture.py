@@ -0,0 +1,61 @@
+import queue
+import time
+
+# ==============================================================================
+# -- SyncCapture ---------------------------------------------------------------
+# ==============================================================================
+
+
+class SyncCapture(object):
+    """
+    Tick-locked capture for synchronous mode. Sensor callbacks only enqueue their data, and the
+    thread calling world.tick() collects exactly one item per sensor for the frame it just ticked.
+    A frame is captured every `capture_every` ticks, decided on the frame id alone so every sensor
+    agrees on it.
+    """
+    def __init__(self, capture_every=1, timeout=2.0):
+        self.capture_every = max(1, capture_every)
+        self.timeout = timeout
+        self._queues = {}
+
+    def is_capture_frame(self, frame):
+        return frame % self.capture_every == 0
+
+    def register(self, key):
+        """Returns the listen callback feeding the queue of sensor `key`."""
+        sensor_queue = queue.Queue()
+        self._queues[key] = sensor_queue
+
+        def push(data):
+            if self.is_capture_frame(data.frame):
+                sensor_queue.put(data)
+
+        return push
+
+    def clear(self):
+        self._queues = {}
+
+    def collect(self, frame):
+        """
+        Returns ({key: data}, missing keys) for `frame`. Older items left in the queues are
+        discarded; sensors that did not deliver within the timeout are reported as missing.
+        """
+        collected = {}
+        missing = []
+        deadline = time.monotonic() + self.timeout
+        for key, sensor_queue in list(self._queues.items()):
+            while True:
+                try:
+                    data = sensor_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    missing.append(key)
+                    break
+                if data.frame == frame:
+                    collected[key] = data
+                    break
+                if data.frame > frame:
+                    # Already the next capture, keep it for the following tick.
+                    sensor_queue.put(data)
+                    missing.append(key)
+                    break
+        return collected, missing
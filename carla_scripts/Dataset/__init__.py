@@ -0,0 +1,3 @@
+from .clip_container import ClipWriter, ClipReader, CLIP_EXTENSION
+from .codecs import get_codec, encode_frame, decode_frame, available_codecs
+from .manifest import ClipManifest, load_frame, rehydrate_frame, get_manifest
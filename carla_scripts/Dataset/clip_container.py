@@ -0,0 +1,143 @@
+import os
+import json
+import mmap
+import struct
+import threading
+import numpy as np
+
+# ==============================================================================
+# -- Clip container ------------------------------------------------------------
+# ==============================================================================
+#
+# One append-only file holding every frame of a clip (or of a single view):
+#
+#   [header][array bytes, 64-byte aligned]...[index json][trailer]
+#
+# The header is fixed size. The index is a json list of
+# (grab_index, view, key, offset, shape, dtype) entries, written on close and
+# located through the trailer at the very end of the file, so readers can mmap
+# the file and hand out zero-copy array views.
+
+CLIP_EXTENSION = '.clip'
+MAGIC = b'VIDARCLP'
+INDEX_MAGIC = b'VIDARIDX'
+VERSION = 1
+HEADER = struct.Struct('<8sII48x')
+TRAILER = struct.Struct('<QQ8s')
+ALIGNMENT = 64
+
+
+def _read_index(f):
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    if file_size < HEADER.size + TRAILER.size:
+        raise ValueError('%s is too small to be a clip file' % f.name)
+    f.seek(0)
+    magic, version, header_size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('%s is not a clip file' % f.name)
+    if version > VERSION:
+        raise ValueError('%s has unsupported clip version %d' % (f.name, version))
+    f.seek(file_size - TRAILER.size)
+    index_offset, index_size, index_magic = TRAILER.unpack(f.read(TRAILER.size))
+    if index_magic != INDEX_MAGIC:
+        raise ValueError('%s has no index, it was probably not closed properly' % f.name)
+    f.seek(index_offset)
+    index = json.loads(f.read(index_size).decode('utf-8'))
+    return index, index_offset
+
+
+class ClipWriter(object):
+    """Appends frames to a clip file. Re-opening an existing file continues appending to it."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._file = open(path, 'r+b')
+            self._index, index_offset = _read_index(self._file)
+            self._file.seek(index_offset)
+            self._file.truncate()
+        else:
+            self._file = open(path, 'w+b')
+            self._file.write(HEADER.pack(MAGIC, VERSION, HEADER.size))
+            self._index = []
+        self._offset = self._file.tell()
+
+    def append(self, grab_index, view, data):
+        """Appends a dict of arrays (or array-like values) recorded for `view` at `grab_index`."""
+        arrays = [(key, np.asarray(value, order='C')) for key, value in data.items()]
+        for key, array in arrays:
+            if array.dtype.hasobject:
+                raise TypeError('Cannot store %s of object dtype in a clip file' % key)
+        with self._lock:
+            for key, array in arrays:
+                padding = -self._offset % ALIGNMENT
+                if padding:
+                    self._file.write(b'\0' * padding)
+                    self._offset += padding
+                self._file.write(array.data if array.size else b'')
+                self._index.append([int(grab_index), view, key, self._offset,
+                                    list(array.shape), array.dtype.str])
+                self._offset += array.nbytes
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            index = json.dumps(self._index, separators=(',', ':')).encode('utf-8')
+            self._file.write(index)
+            self._file.write(TRAILER.pack(self._offset, len(index), INDEX_MAGIC))
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ClipReader(object):
+    """Memory-maps a clip file. Returned arrays are read-only views into the file."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            index, _ = _read_index(f)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._entries = {}
+        for grab_index, view, key, offset, shape, dtype in index:
+            self._entries.setdefault((grab_index, view), []).append((key, offset, tuple(shape), dtype))
+
+    def keys(self):
+        return sorted(self._entries)
+
+    def grab_indices(self, view=None):
+        return sorted(set(gi for gi, v in self._entries if view is None or v == view))
+
+    def views(self):
+        return sorted(set(v for _, v in self._entries))
+
+    def entries(self, grab_index, view):
+        """(key, offset, shape, dtype) of the arrays of a record, without reading them."""
+        return list(self._entries[(grab_index, view)])
+
+    def read(self, grab_index, view):
+        frame = {}
+        for key, offset, shape, dtype in self._entries[(grab_index, view)]:
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            frame[key] = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset).reshape(shape)
+        return frame
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Arrays handed out are still alive; the mapping is released with them.
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,301 @@
+import zlib
+import numpy as np
+import cv2
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# ==============================================================================
+# -- Codecs --------------------------------------------------------------------
+# ==============================================================================
+#
+# A codec spec is a '+' separated chain applied left to right, e.g. 'float16+zstd'.
+# Encoded keys are stored next to '<key>_codec', '<key>_shape' and '<key>_dtype'
+# entries describing the original array, so decode_frame can restore it. The
+# 'raw' codec stores arrays untouched and adds no extra keys.
+
+RAW = 'raw'
+
+
+class Codec(object):
+    name = None
+    lossless = True
+
+    def output_dtype(self, dtype):
+        """dtype of the encoded array, None for codecs producing a byte stream."""
+        return dtype
+
+    def encode(self, array):
+        raise NotImplementedError
+
+    def decode(self, encoded, shape, dtype):
+        raise NotImplementedError
+
+
+class RawCodec(Codec):
+    name = RAW
+
+    def encode(self, array):
+        return array
+
+    def decode(self, encoded, shape, dtype):
+        return encoded
+
+
+class ByteCodec(Codec):
+    def output_dtype(self, dtype):
+        return None
+
+    def compress(self, buffer):
+        raise NotImplementedError
+
+    def decompress(self, buffer):
+        raise NotImplementedError
+
+    def encode(self, array):
+        return np.frombuffer(self.compress(np.ascontiguousarray(array).data), dtype=np.uint8)
+
+    def decode(self, encoded, shape, dtype):
+        return np.frombuffer(self.decompress(np.ascontiguousarray(encoded).data), dtype=dtype).reshape(shape)
+
+
+class ZlibCodec(ByteCodec):
+    name = 'zlib'
+
+    def __init__(self, level=1):
+        self.level = level
+
+    def compress(self, buffer):
+        return zlib.compress(buffer, self.level)
+
+    def decompress(self, buffer):
+        return zlib.decompress(buffer)
+
+
+class ZstdCodec(ByteCodec):
+    name = 'zstd'
+
+    def __init__(self, level=3):
+        if zstandard is None:
+            raise ImportError('The zstd codec requires the zstandard package')
+        self.level = level
+
+    def compress(self, buffer):
+        # Compressor objects are not thread safe, and frames are encoded on the writer threads.
+        return zstandard.ZstdCompressor(level=self.level).compress(buffer)
+
+    def decompress(self, buffer):
+        return zstandard.ZstdDecompressor().decompress(buffer)
+
+
+class LZ4Codec(ByteCodec):
+    name = 'lz4'
+
+    def __init__(self, level=0):
+        if lz4 is None:
+            raise ImportError('The lz4 codec requires the lz4 package')
+        self.level = level
+
+    def compress(self, buffer):
+        return lz4.frame.compress(buffer, compression_level=self.level)
+
+    def decompress(self, buffer):
+        return lz4.frame.decompress(buffer)
+
+
+class PNGCodec(Codec):
+    """Lossless PNG for 8/16 bit single or multi channel images."""
+    name = 'png'
+
+    def __init__(self, level=3):
+        self.level = level
+
+    def output_dtype(self, dtype):
+        return None
+
+    def encode(self, array):
+        if array.dtype not in (np.uint8, np.uint16):
+            raise TypeError('The png codec only supports uint8 and uint16 images, got %s' % array.dtype)
+        ok, encoded = cv2.imencode('.png', array, [cv2.IMWRITE_PNG_COMPRESSION, self.level])
+        if not ok:
+            raise ValueError('Failed to png encode an array of shape %s' % (array.shape,))
+        return encoded.reshape(-1)
+
+    def decode(self, encoded, shape, dtype):
+        return cv2.imdecode(encoded, cv2.IMREAD_UNCHANGED).reshape(shape)
+
+
+class Float16Codec(Codec):
+    """Half precision floats: ~3 significant digits (relative error <= 2**-11) up to 65504."""
+    name = 'float16'
+    lossless = False
+
+    def output_dtype(self, dtype):
+        return np.dtype(np.float16)
+
+    def encode(self, array):
+        return array.astype(np.float16)
+
+    def decode(self, encoded, shape, dtype):
+        return encoded.astype(dtype)
+
+
+class DepthMillimeterCodec(Codec):
+    """
+    Depth in meters quantized to uint16 millimeters. Absolute error is at most 0.5 mm (plus float32
+    rounding) for depths below 65.535 m; anything farther (including the sky at 1000 m) saturates to
+    65.535 m.
+    """
+    name = 'depth_mm_u16'
+    lossless = False
+    max_depth = 65.535
+
+    def output_dtype(self, dtype):
+        return np.dtype(np.uint16)
+
+    def encode(self, array):
+        if not np.issubdtype(array.dtype, np.floating):
+            raise TypeError('The depth_mm_u16 codec expects depth in meters as floats, got %s' % array.dtype)
+        millimeters = np.multiply(array, 1000.0, dtype=np.float32)
+        np.clip(millimeters, 0, 65535, out=millimeters)
+        return np.rint(millimeters, out=millimeters).astype(np.uint16)
+
+    def decode(self, encoded, shape, dtype):
+        return np.multiply(encoded, 0.001, dtype=dtype)
+
+
+class PointsInt16Codec(Codec):
+    """
+    (N, 4) x, y, z, intensity points quantized to int16: x, y, z in 5 mm steps (error at most 2.5 mm) up to
+    +-163.8 m, intensity in [0, 1] in 1/32767 steps. Anything out of range saturates.
+    """
+    name = 'points_q16'
+    lossless = False
+    xyz_step = 0.005
+    intensity_step = 1.0 / 32767
+
+    def output_dtype(self, dtype):
+        return np.dtype(np.int16)
+
+    def encode(self, array):
+        if array.ndim != 2 or array.shape[1] != 4:
+            raise TypeError('The points_q16 codec expects (N, 4) x, y, z, intensity points, got %s' % (array.shape,))
+        scaled = np.empty(array.shape, dtype=np.float32)
+        np.multiply(array[:, :3], 1.0 / self.xyz_step, out=scaled[:, :3])
+        np.multiply(array[:, 3], 1.0 / self.intensity_step, out=scaled[:, 3])
+        np.clip(scaled, -32767, 32767, out=scaled)
+        return np.rint(scaled, out=scaled).astype(np.int16)
+
+    def decode(self, encoded, shape, dtype):
+        decoded = np.empty(encoded.shape, dtype=dtype)
+        np.multiply(encoded[:, :3], self.xyz_step, out=decoded[:, :3])
+        np.multiply(encoded[:, 3], self.intensity_step, out=decoded[:, 3])
+        return decoded
+
+
+CODECS = {
+    RawCodec.name: RawCodec,
+    ZlibCodec.name: ZlibCodec,
+    ZstdCodec.name: ZstdCodec,
+    LZ4Codec.name: LZ4Codec,
+    PNGCodec.name: PNGCodec,
+    Float16Codec.name: Float16Codec,
+    DepthMillimeterCodec.name: DepthMillimeterCodec,
+    PointsInt16Codec.name: PointsInt16Codec,
+}
+
+
+def available_codecs():
+    names = []
+    for name, codec in CODECS.items():
+        try:
+            codec()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+class CodecChain(object):
+    def __init__(self, spec):
+        self.spec = spec
+        names = [name for name in spec.split('+') if name != RAW]
+        for name in names:
+            if name not in CODECS:
+                raise ValueError('Unknown codec %r, expected one of %s' % (name, ', '.join(CODECS)))
+        self.codecs = [CODECS[name]() for name in names]
+
+    @property
+    def is_raw(self):
+        return not self.codecs
+
+    @property
+    def lossless(self):
+        return all(codec.lossless for codec in self.codecs)
+
+    def encode(self, array):
+        for codec in self.codecs:
+            array = codec.encode(array)
+        return array
+
+    def decode(self, encoded, shape, dtype):
+        # Replays the chain on (shape, dtype) to know what every stage expects back.
+        stages = []
+        for codec in self.codecs:
+            stages.append((shape, dtype))
+            out_dtype = codec.output_dtype(dtype)
+            if out_dtype is None:
+                shape, dtype = None, np.dtype(np.uint8)
+            else:
+                dtype = out_dtype
+        for codec, (shape, dtype) in reversed(list(zip(self.codecs, stages))):
+            encoded = codec.decode(encoded, shape, dtype)
+        return encoded
+
+
+_chains = {}
+
+
+def get_codec(spec):
+    if spec not in _chains:
+        _chains[spec] = CodecChain(spec)
+    return _chains[spec]
+
+
+def encode_frame(data, codecs):
+    """Returns a copy of `data` with the keys listed in `codecs` ({key: spec}) encoded."""
+    encoded = dict(data)
+    for key, spec in codecs.items():
+        chain = get_codec(spec)
+        if chain.is_raw or key not in data:
+            continue
+        array = np.asarray(data[key])
+        encoded[key] = chain.encode(array)
+        encoded['%s_codec' % key] = spec
+        encoded['%s_shape' % key] = np.array(array.shape)
+        encoded['%s_dtype' % key] = array.dtype.str
+    return encoded
+
+
+def decode_frame(data):
+    """Restores every encoded key of a frame loaded from an npz or a clip file."""
+    decoded = {}
+    codec_keys = [key for key in data.keys() if key.endswith('_codec')]
+    skip = set()
+    for codec_key in codec_keys:
+        key = codec_key[:-len('_codec')]
+        skip.update((codec_key, '%s_shape' % key, '%s_dtype' % key))
+        shape = tuple(int(x) for x in np.asarray(data['%s_shape' % key]))
+        dtype = np.dtype(str(data['%s_dtype' % key]))
+        decoded[key] = get_codec(str(data[codec_key])).decode(np.asarray(data[key]), shape, dtype)
+    for key in data.keys():
+        if key not in skip and key not in decoded:
+            decoded[key] = data[key]
+    return decoded
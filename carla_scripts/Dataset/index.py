@@ -0,0 +1,349 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+import numpy as np
+from carla_scripts.Dataset.clip_container import ClipReader, CLIP_EXTENSION
+from carla_scripts.Dataset.manifest import MANIFEST_FILE
+from carla_scripts.Dataset.telemetry import TELEMETRY_FILE
+
+# ==============================================================================
+# -- Dataset index -------------------------------------------------------------
+# ==============================================================================
+#
+# SQLite index of every frame of an output tree, one row per (clip, view,
+# grab_index) with its file, size, mtime and keys. Clips are identified by the
+# path of their directory relative to the root, e.g. Alfred/main/Town01_1585735847,
+# as clips of different cars or sectors may share a name. MECameraManager adds the
+# frames it writes; update() brings the index up to date with the tree, listing
+# only directories whose mtime changed and re-reading only clip files whose
+# size or mtime changed. Queries never touch the file system.
+
+INDEX_FILE = 'index.sqlite'
+NPZ_PATTERN = re.compile(r'_(\d+)\.npz$')
+
+# Bumped on schema changes, an index of another version is rebuilt by the next update().
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    car TEXT, sector TEXT, clip_path TEXT NOT NULL, view TEXT NOT NULL, grab_index INTEGER NOT NULL,
+    path TEXT NOT NULL, size INTEGER, mtime REAL, keys TEXT, source TEXT NOT NULL,
+    PRIMARY KEY (clip_path, view, grab_index));
+CREATE INDEX IF NOT EXISTS frames_source ON frames (source);
+CREATE INDEX IF NOT EXISTS frames_clip_frame ON frames (clip_path, grab_index);
+CREATE TABLE IF NOT EXISTS clips (
+    clip_path TEXT PRIMARY KEY, clip TEXT, car TEXT, sector TEXT, path TEXT, views TEXT);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY, parent TEXT, kind TEXT, size INTEGER, mtime_ns INTEGER);
+CREATE INDEX IF NOT EXISTS sources_parent ON sources (parent);
+CREATE TABLE IF NOT EXISTS excluded (path TEXT PRIMARY KEY);
+"""
+
+SOURCE_DIR = 'dir'
+SOURCE_CLIP = 'clip'
+
+
+class DatasetIndex(object):
+    """
+    Index of the output tree under `root`, stored in <root>/index.sqlite by default. Sub directories of
+    the root listed in `exclude` (e.g. work directories) are not indexed, now or by later updates of the same
+    index. Frames added with add_frame are
+    buffered and committed every `commit_every` frames or on commit(); safe to share between the writer
+    threads.
+    """
+    def __init__(self, root, db_path=None, commit_every=256, exclude=()):
+        self.root = os.path.abspath(root)
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        self.db_path = db_path or os.path.join(self.root, INDEX_FILE)
+        self.commit_every = commit_every
+        self._lock = threading.RLock()
+        self._pending = []
+        self._clip_info = {}
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        if self._db.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self._db.executescript('DROP TABLE IF EXISTS frames; DROP TABLE IF EXISTS clips; '
+                                   'DROP TABLE IF EXISTS sources; PRAGMA user_version = %d;' % SCHEMA_VERSION)
+        self._db.executescript(SCHEMA)
+        self._db.executemany('INSERT OR IGNORE INTO excluded VALUES (?)',
+                             [(os.path.normpath(path),) for path in exclude])
+        self._db.commit()
+        self.exclude = set(os.path.join(self.root, path) for path, in self._db.execute('SELECT path FROM excluded'))
+
+    # -- Writing ---------------------------------------------------------------
+
+    def get_clip_path(self, clip_dir):
+        """Path of a clip directory relative to the root, the key of its clip."""
+        return os.path.relpath(os.path.abspath(clip_dir), self.root)
+
+    def add_clip(self, clip_dir, car, sector, views):
+        """Registers a clip directory and its camera views, as listed in its manifest."""
+        clip_dir = os.path.abspath(clip_dir)
+        clip_path = self.get_clip_path(clip_dir)
+        with self._lock:
+            self._clip_info[clip_dir] = (car, sector, clip_path)
+            self._db.execute('INSERT OR REPLACE INTO clips VALUES (?, ?, ?, ?, ?, ?)',
+                             (clip_path, os.path.basename(clip_dir), car, sector, clip_dir, json.dumps(sorted(views))))
+            self._db.commit()
+
+    def add_frame(self, clip_dir, view, grab_index, path, keys, size=None, mtime=None):
+        """Adds a frame written to `path`, an npz file or the clip file it was appended to."""
+        car, sector, clip_path = self.get_clip_info(clip_dir)
+        path = os.path.abspath(path)
+        source = path if path.endswith(CLIP_EXTENSION) else os.path.dirname(path)
+        row = (car, sector, clip_path, view, int(grab_index), path, size, mtime, ','.join(sorted(keys)), source)
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= self.commit_every:
+                self._commit_pending()
+
+    def commit(self):
+        with self._lock:
+            self._commit_pending()
+
+    def _commit_pending(self):
+        if self._pending:
+            self._db.executemany('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self._pending)
+            self._pending = []
+        self._db.commit()
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def get_clip_info(self, clip_dir):
+        """(car, sector, clip path) of a clip directory, car and sector from its manifest or <car>/<sector>/<clip>."""
+        clip_dir = os.path.abspath(clip_dir)
+        info = self._clip_info.get(clip_dir)
+        if info is None:
+            manifest_path = os.path.join(clip_dir, MANIFEST_FILE)
+            if os.path.exists(manifest_path):
+                with open(manifest_path, 'r') as f:
+                    manifest = json.load(f)
+                car, sector = manifest.get('car_name'), manifest.get('sector')
+                views = list(manifest.get('views', {}))
+            else:
+                parts = self.get_clip_path(clip_dir).split(os.sep)
+                car, sector = (parts[-3], parts[-2]) if len(parts) >= 3 else (None, None)
+                views = []
+            self.add_clip(clip_dir, car, sector, views)
+            info = self._clip_info[clip_dir]
+        return info
+
+    # -- Incremental scan ------------------------------------------------------
+
+    def update(self):
+        """
+        Brings the index up to date with the tree: directories whose mtime is unchanged are not listed, their
+        known sub directories and clip files are checked instead. Returns the number of re-indexed sources.
+        """
+        with self._lock:
+            self._commit_pending()
+            updated = self._update()
+            self._db.commit()
+        return updated
+
+    def _update(self):
+        known = dict((path, (parent, kind, size, mtime_ns)) for path, parent, kind, size, mtime_ns in
+                     self._db.execute('SELECT path, parent, kind, size, mtime_ns FROM sources'))
+        children = {}
+        for path, (parent, kind, _, _) in known.items():
+            children.setdefault(parent, []).append((path, kind))
+        updated = 0
+        for path in self.exclude:
+            if path in known:
+                self._forget(path)
+                updated += 1
+        stack = [self.root]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            if dir_path in known and known[dir_path][3] == mtime_ns:
+                entries = children.get(dir_path, [])
+                stack.extend(path for path, kind in entries if kind == SOURCE_DIR and path not in self.exclude)
+                for path, kind in entries:
+                    if kind == SOURCE_CLIP:
+                        updated += self._update_clip_file(path, dir_path, known.get(path))
+                continue
+            sub_dirs, clip_files, npz_files = [], [], []
+            for entry in os.scandir(dir_path):
+                if entry.is_dir():
+                    if entry.path not in self.exclude:
+                        sub_dirs.append(entry.path)
+                elif entry.name.endswith(CLIP_EXTENSION) and entry.name != TELEMETRY_FILE:
+                    clip_files.append(entry.path)
+                elif NPZ_PATTERN.search(entry.name):
+                    npz_files.append(entry)
+            current = set(sub_dirs) | set(clip_files)
+            for path, _ in children.get(dir_path, []):
+                if path not in current:
+                    self._forget(path)
+            self._index_npz_dir(dir_path, npz_files)
+            for path in clip_files:
+                updated += self._update_clip_file(path, dir_path, known.get(path))
+            self._set_source(dir_path, os.path.dirname(dir_path), SOURCE_DIR, None, mtime_ns)
+            stack.extend(sub_dirs)
+            updated += 1
+        return updated
+
+    def _set_source(self, path, parent, kind, size, mtime_ns):
+        self._db.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)', (path, parent, kind, size, mtime_ns))
+
+    def _forget(self, path):
+        """Drops a vanished directory or clip file, and everything under it."""
+        prefix = path + os.sep
+        for table, column in (('frames', 'source'), ('sources', 'path'), ('clips', 'path')):
+            self._db.execute('DELETE FROM %s WHERE %s = ? OR substr(%s, 1, ?) = ?' % (table, column, column),
+                             (path, len(prefix), prefix))
+        self._clip_info = dict((clip_dir, info) for clip_dir, info in self._clip_info.items()
+                               if clip_dir != path and not clip_dir.startswith(prefix))
+
+    def _index_npz_dir(self, dir_path, npz_files):
+        """Re-indexes the npz files of a view directory, reading the keys of new or changed files only."""
+        known = dict((path, (size, mtime, keys)) for path, size, mtime, keys in self._db.execute(
+            'SELECT path, size, mtime, keys FROM frames WHERE source = ?', (dir_path,)))
+        if not npz_files and not known:
+            return
+        clip_dir, view = os.path.split(dir_path)
+        car, sector, clip_path = self.get_clip_info(clip_dir)
+        rows = []
+        for entry in npz_files:
+            stat = entry.stat()
+            previous = known.get(entry.path)
+            if previous is not None and previous[0] == stat.st_size and previous[1] == stat.st_mtime:
+                keys = previous[2]
+            else:
+                try:
+                    with np.load(entry.path) as data:
+                        keys = ','.join(sorted(data.files))
+                except Exception as e:
+                    logging.warning('Skipping %s: %s', entry.path, e)
+                    continue
+            grab_index = int(NPZ_PATTERN.search(entry.name).group(1))
+            rows.append((car, sector, clip_path, view, grab_index, entry.path, stat.st_size, stat.st_mtime, keys,
+                         dir_path))
+        self._db.execute('DELETE FROM frames WHERE source = ?', (dir_path,))
+        self._db.executemany('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _update_clip_file(self, path, clip_dir, known):
+        """Re-reads the index of a clip file whose size or mtime changed. Returns 1 if it was re-indexed."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._forget(path)
+            return 1
+        if known is not None and known[2] == stat.st_size and known[3] == stat.st_mtime_ns:
+            return 0
+        try:
+            reader = ClipReader(path)
+        except ValueError as e:
+            # Still being written, its index only exists once closed. Known without a size, so it is
+            # checked again even if its directory does not change.
+            logging.info('Not indexing %s yet: %s', path, e)
+            self._set_source(path, clip_dir, SOURCE_CLIP, None, None)
+            return 0
+        car, sector, clip_path = self.get_clip_info(clip_dir)
+        with reader:
+            rows = []
+            for grab_index, view in reader.keys():
+                entries = reader.entries(grab_index, view)
+                size = sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, _, shape, dtype in entries)
+                keys = ','.join(sorted(key for key, _, _, _ in entries))
+                rows.append((car, sector, clip_path, view, grab_index, path, size, stat.st_mtime, keys, path))
+        self._db.execute('DELETE FROM frames WHERE source = ?', (path,))
+        self._db.executemany('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self._set_source(path, clip_dir, SOURCE_CLIP, stat.st_size, stat.st_mtime_ns)
+        return 1
+
+    # -- Queries ---------------------------------------------------------------
+
+    def query(self, sql, params=()):
+        """Rows of an SQL query on the index, pending frames included."""
+        with self._lock:
+            self._commit_pending()
+            return list(self._db.execute(sql, params))
+
+    def clips(self, car=None, sector=None):
+        """(car, sector, clip path) of the indexed clips, optionally of one car and sector."""
+        sql, params = self._filter('SELECT car, sector, clip_path FROM clips', car=car, sector=sector)
+        return self.query(sql + ' ORDER BY clip_path', params)
+
+    def get_views(self, clip_path):
+        """Camera views of a clip from its manifest, or every indexed view without one."""
+        rows = self.query('SELECT views FROM clips WHERE clip_path = ?', (clip_path,))
+        views = json.loads(rows[0][0]) if rows and rows[0][0] else []
+        if not views:
+            views = [view for view, in self.query('SELECT DISTINCT view FROM frames WHERE clip_path = ?',
+                                                  (clip_path,))]
+        return sorted(views)
+
+    def frames(self, clip_path=None, view=None, car=None, sector=None):
+        """(clip path, view, grab_index, path, keys) rows, ordered by clip, grab index and view."""
+        sql, params = self._filter('SELECT clip_path, view, grab_index, path, keys FROM frames',
+                                   clip_path=clip_path, view=view, car=car, sector=sector)
+        return self.query(sql + ' ORDER BY clip_path, grab_index, view', params)
+
+    def complete_frames(self, clip_path, views=None, require_key=None):
+        """
+        Grab indices of the clip at `clip_path` present in every one of `views` (default: its camera views),
+        sorted. With `require_key`, only records holding that key count, e.g. 'image'.
+        """
+        views = views or self.get_views(clip_path)
+        if not views:
+            return []
+        sql = 'SELECT grab_index FROM frames WHERE clip_path = ? AND view IN (%s)' % ','.join('?' * len(views))
+        params = [clip_path] + list(views)
+        if require_key:
+            sql += " AND instr(',' || keys || ',', ?) > 0"
+            params.append(',%s,' % require_key)
+        sql += ' GROUP BY grab_index HAVING COUNT(DISTINCT view) = ? ORDER BY grab_index'
+        params.append(len(views))
+        return [grab_index for grab_index, in self.query(sql, params)]
+
+    def incomplete_frames(self, clip_path, views=None):
+        """{grab_index: [(view, path)]} of the frames of the clip at `clip_path` missing from one of `views`."""
+        views = views or self.get_views(clip_path)
+        if not views:
+            return {}
+        complete = set(self.complete_frames(clip_path, views))
+        incomplete = {}
+        for view, grab_index, path in self.query(
+                'SELECT view, grab_index, path FROM frames WHERE clip_path = ? AND view IN (%s)' %
+                ','.join('?' * len(views)), [clip_path] + list(views)):
+            if grab_index not in complete:
+                incomplete.setdefault(grab_index, []).append((view, path))
+        return incomplete
+
+    def remove_frames(self, clip_path, grab_indices):
+        """Forgets frames of a clip, e.g. once their files were deleted."""
+        with self._lock:
+            self._commit_pending()
+            self._db.executemany('DELETE FROM frames WHERE clip_path = ? AND grab_index = ?',
+                                 [(clip_path, int(grab_index)) for grab_index in grab_indices])
+            self._db.commit()
+
+    def split(self, test_fraction=0.1, seed='', car=None, sector=None, views=None):
+        """
+        Train and test lists of complete frames as (clip path, grab_index). Whole clips go to one side, by a
+        hash of the clip path and `seed`, so the split is stable as clips are added.
+        """
+        train, test = [], []
+        for _, _, clip_path in self.clips(car, sector):
+            digest = hashlib.sha1((seed + clip_path).encode('utf-8')).hexdigest()
+            side = test if int(digest[:8], 16) / float(0xffffffff) < test_fraction else train
+            side.extend((clip_path, grab_index) for grab_index in self.complete_frames(clip_path, views))
+        return train, test
+
+    @staticmethod
+    def _filter(query, **columns):
+        conditions = [(name, value) for name, value in sorted(columns.items()) if value is not None]
+        if not conditions:
+            return query, []
+        return query + ' WHERE ' + ' AND '.join('%s = ?' % name for name, _ in conditions), [v for _, v in conditions]
@@ -0,0 +1,140 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from carla_scripts.Dataset.codecs import decode_frame
+
+# ==============================================================================
+# -- Clip manifest -------------------------------------------------------------
+# ==============================================================================
+#
+# Static calibration of a clip, written once to <clip>/manifest.json. Per-frame
+# records then only hold dynamic data (grab_index, image, sim_depth, ...), and
+# rehydrate_frame restores the legacy per-frame dict for older readers.
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+STATIC_FRAME_KEYS = ('origin', 'focal', 'fov', 'RT_view_to_main', 'clip_name')
+
+
+def get_rig_version(car_name, car_setup):
+    """Identifies a rig by the content of its car setup json."""
+    digest = hashlib.sha1(json.dumps(car_setup, sort_keys=True).encode('utf-8')).hexdigest()
+    return '%s-%s' % (car_name, digest[:12])
+
+
+class ClipManifest(object):
+    def __init__(self, clip_name, car_name, sector, rig_version, reset_matrix, views,
+                 map_name=None, weather=None, capture_frequency=None, sensors=None):
+        self.clip_name = clip_name
+        self.car_name = car_name
+        self.sector = sector
+        self.rig_version = rig_version
+        self.reset_matrix = reset_matrix
+        self.views = views
+        self.map_name = map_name
+        self.weather = weather if weather is not None else []
+        self.capture_frequency = capture_frequency
+        # Non-camera sensors recorded with the clip (e.g. radar), {name: config}
+        self.sensors = sensors if sensors is not None else {}
+        self._frame_metadata = {}
+
+    def set_weather(self, name, first_grab_index):
+        """Weather can change within a clip, so it is kept as segments starting at a grab index."""
+        if self.weather and self.weather[-1]['name'] == name:
+            return False
+        self.weather.append({'name': name, 'first_grab_index': int(first_grab_index)})
+        return True
+
+    def get_weather(self, grab_index):
+        name = None
+        for segment in self.weather:
+            if segment['first_grab_index'] <= grab_index:
+                name = segment['name']
+        return name
+
+    def frame_metadata(self, view_name):
+        """The static keys every legacy per-frame record carried, none for non-camera sensors."""
+        if view_name not in self.views:
+            return {}
+        if view_name not in self._frame_metadata:
+            view = self.views[view_name]
+            self._frame_metadata[view_name] = {
+                'origin': view['origin'],
+                'focal': view['focal'],
+                'fov': view['fov'],
+                'RT_view_to_main': np.array(view['RT_view_to_main']),
+                'clip_name': self.clip_name,
+            }
+        return self._frame_metadata[view_name]
+
+    def to_dict(self):
+        return {
+            'version': MANIFEST_VERSION,
+            'clip_name': self.clip_name,
+            'car_name': self.car_name,
+            'sector': self.sector,
+            'rig_version': self.rig_version,
+            'reset_matrix': self.reset_matrix,
+            'map': self.map_name,
+            'weather': self.weather,
+            'capture_frequency': self.capture_frequency,
+            'views': self.views,
+            'sensors': self.sensors,
+        }
+
+    @staticmethod
+    def from_dict(d):
+        return ClipManifest(d['clip_name'], d['car_name'], d['sector'], d['rig_version'], d['reset_matrix'],
+                            d['views'], map_name=d.get('map'), weather=d.get('weather'),
+                            capture_frequency=d.get('capture_frequency'), sensors=d.get('sensors'))
+
+    def save(self, clip_dir):
+        path = os.path.join(clip_dir, MANIFEST_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(clip_dir):
+        with open(os.path.join(clip_dir, MANIFEST_FILE), 'r') as f:
+            return ClipManifest.from_dict(json.load(f))
+
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(clip_dir):
+    """Loads a clip manifest once per process."""
+    clip_dir = os.path.abspath(clip_dir)
+    with _manifests_lock:
+        if clip_dir not in _manifests:
+            _manifests[clip_dir] = ClipManifest.load(clip_dir)
+        return _manifests[clip_dir]
+
+
+def rehydrate_frame(data, manifest, view_name):
+    """Decodes a per-frame record and adds back the static keys, giving the legacy per-frame dict."""
+    frame = decode_frame(data)
+    for key, value in manifest.frame_metadata(view_name).items():
+        frame.setdefault(key, value)
+    return frame
+
+
+def load_frame(file_path, manifest=None):
+    """
+    Loads an npz frame laid out as <clip>/<view>/<file>.npz in the legacy per-frame dict shape,
+    whether it was written with full per-frame metadata or against a clip manifest.
+    """
+    view_dir = os.path.dirname(os.path.abspath(file_path))
+    view_name = os.path.basename(view_dir)
+    with np.load(file_path) as data:
+        data = dict(data)
+    if all(key in data for key in STATIC_FRAME_KEYS):
+        return decode_frame(data)
+    if manifest is None:
+        manifest = get_manifest(os.path.dirname(view_dir))
+    return rehydrate_frame(data, manifest, view_name)
@@ -0,0 +1,146 @@
+import os
+import numpy as np
+from carla_scripts.Dataset.clip_container import ClipWriter, ClipReader, CLIP_EXTENSION
+
+# ==============================================================================
+# -- Ego telemetry -------------------------------------------------------------
+# ==============================================================================
+#
+# One row per simulator tick, kept in preallocated column buffers and appended
+# to <clip>/telemetry.clip every `chunk_size` rows: each chunk is a record of
+# the 'telemetry' view keyed by the frame of its first row, one array per
+# column. TelemetryReader concatenates the chunks and joins rows on grab_index
+# (the simulator frame) through a dense frame -> row table.
+
+TELEMETRY_VIEW = 'telemetry'
+TELEMETRY_FILE = TELEMETRY_VIEW + CLIP_EXTENSION
+# (name, dtype, width), world coordinates and CARLA units: m, m/s, m/s^2, rad/s, degrees for rotation and
+# compass, control in [0, 1] ([-1, 1] for steer). IMU and GNSS callbacks run on sensor threads, so a row holds
+# their latest measurement: imu_frame and gnss_frame are the frames it was taken at (-1 before the first one),
+# rows where they differ from frame are not aligned (see TelemetryReader.aligned).
+TELEMETRY_COLUMNS = (
+    ('frame', np.int64, 1),
+    ('sim_time', np.float64, 1),
+    ('location', np.float64, 3),
+    ('rotation', np.float32, 3),
+    ('velocity', np.float32, 3),
+    ('accelerometer', np.float32, 3),
+    ('gyroscope', np.float32, 3),
+    ('compass', np.float32, 1),
+    ('imu_frame', np.int64, 1),
+    ('latitude', np.float64, 1),
+    ('longitude', np.float64, 1),
+    ('gnss_frame', np.int64, 1),
+    ('throttle', np.float32, 1),
+    ('steer', np.float32, 1),
+    ('brake', np.float32, 1),
+)
+
+
+class TelemetryRecorder(object):
+    """
+    Appends telemetry rows to <clip_dir>/telemetry.clip. Rows are written in chunks of `chunk_size`, call
+    close() to write the last partial chunk. Not thread safe, rows come from the simulator loop.
+    """
+    def __init__(self, clip_dir, chunk_size=256):
+        self.path = os.path.join(clip_dir, TELEMETRY_FILE)
+        self.chunk_size = chunk_size
+        self.columns = dict((name, np.zeros((chunk_size, width) if width > 1 else chunk_size, dtype=dtype))
+                            for name, dtype, width in TELEMETRY_COLUMNS)
+        self.rows = 0
+        self._writer = None
+
+    def append(self, frame, sim_time, location, rotation, velocity, accelerometer, gyroscope, compass, imu_frame,
+               latitude, longitude, gnss_frame, throttle, steer, brake):
+        row = self.rows
+        columns = self.columns
+        columns['frame'][row] = frame
+        columns['sim_time'][row] = sim_time
+        columns['location'][row] = location
+        columns['rotation'][row] = rotation
+        columns['velocity'][row] = velocity
+        columns['accelerometer'][row] = accelerometer
+        columns['gyroscope'][row] = gyroscope
+        columns['compass'][row] = compass
+        columns['imu_frame'][row] = imu_frame
+        columns['latitude'][row] = latitude
+        columns['longitude'][row] = longitude
+        columns['gnss_frame'][row] = gnss_frame
+        columns['throttle'][row] = throttle
+        columns['steer'][row] = steer
+        columns['brake'][row] = brake
+        self.rows = row + 1
+        if self.rows == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self._writer is None:
+            self._writer = ClipWriter(self.path)
+        rows = self.rows
+        self._writer.append(int(self.columns['frame'][0]), TELEMETRY_VIEW,
+                            dict((name, column[:rows]) for name, column in self.columns.items()))
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class TelemetryReader(object):
+    """
+    The telemetry of a clip (its telemetry.clip or the clip dir) as whole columns, with constant time row
+    lookups by grab index.
+    """
+    def __init__(self, path):
+        if not path.endswith(CLIP_EXTENSION):
+            path = os.path.join(path, TELEMETRY_FILE)
+        with ClipReader(path) as reader:
+            chunks = [reader.read(grab_index, TELEMETRY_VIEW) for grab_index in reader.grab_indices(TELEMETRY_VIEW)]
+            # Copies out of the mapping, so the file can be closed.
+            self.columns = dict((name, np.concatenate([chunk[name] for chunk in chunks]) if chunks
+                                 else np.zeros((0, width) if width > 1 else 0, dtype=dtype))
+                                for name, dtype, width in TELEMETRY_COLUMNS)
+        frames = self.columns['frame']
+        self.first_frame = int(frames.min()) if len(frames) else 0
+        # Dense frame -> row table, -1 for frames without a row (e.g. restart ticks).
+        self._rows = np.full(int(frames.max()) - self.first_frame + 1 if len(frames) else 0, -1, dtype=np.int64)
+        self._rows[frames - self.first_frame] = np.arange(len(frames))
+
+    def __len__(self):
+        return len(self.columns['frame'])
+
+    def rows(self, grab_indices):
+        """Row of every grab index, -1 where there is none."""
+        offsets = np.asarray(grab_indices, dtype=np.int64) - self.first_frame
+        inside = (offsets >= 0) & (offsets < len(self._rows))
+        rows = np.full(offsets.shape, -1, dtype=np.int64)
+        rows[inside] = self._rows[offsets[inside]]
+        return rows
+
+    def get(self, grab_index):
+        """{column: value} of the row of `grab_index`, None if there is none."""
+        row = int(self.rows(grab_index))
+        if row < 0:
+            return None
+        return dict((name, column[row]) for name, column in self.columns.items())
+
+    def take(self, grab_indices):
+        """{column: values} of the rows of `grab_indices`, which must all have one."""
+        rows = self.rows(grab_indices)
+        if (rows < 0).any():
+            raise KeyError('No telemetry for grab indices %s' % np.asarray(grab_indices)[rows < 0].tolist())
+        return dict((name, column[rows]) for name, column in self.columns.items())
+
+    def aligned(self, grab_indices=None):
+        """Mask of the rows (of `grab_indices`, by default of every row) whose IMU and GNSS are of their frame."""
+        columns = self.columns
+        rows = slice(None) if grab_indices is None else self.rows(grab_indices)
+        aligned = (columns['imu_frame'][rows] == columns['frame'][rows]) & \
+                  (columns['gnss_frame'][rows] == columns['frame'][rows])
+        if grab_indices is not None:
+            aligned &= rows >= 0
+        return aligned
@@ -1,6 +1,11 @@
 from .radar_sensor import RadarSensor
-from .camera_manager import CameraManager
 from .colision_sensor import CollisionSensor
 from .lane_invasion_sensor import LaneInvasionSensor
 from .gnss_sensor import GnssSensor
 from .imu_ensor import IMUSensor
+try:
+    from .camera_manager import CameraManager
+except ImportError as e:
+    # pygame is only needed by the preview camera, headless runs go without it.
+    if e.name != 'pygame':
+        raise
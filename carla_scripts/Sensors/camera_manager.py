@@ -4,6 +4,8 @@ import numpy as np
 import time
 import carla
 from carla import ColorConverter as cc
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
+from carla_scripts.Sensors.lidar_sensor import lidar_to_array, lidar_to_canvas
 
 # ==============================================================================
 # -- CameraManager -------------------------------------------------------------
@@ -41,21 +43,18 @@ class CameraManager(object):
                 'lens_circle_falloff': '3.0',
                 'chromatic_aberration_intensity': '0.5',
                 'chromatic_aberration_offset': '0'}]]
-        world = self._parent.get_world()
-        bp_library = world.get_blueprint_library()
+        registry = get_blueprint_registry(self._parent.get_world())
         for item in self.sensors:
-            bp = bp_library.find(item[0])
             if item[0].startswith('sensor.camera'):
-                bp.set_attribute('image_size_x', str(hud.dim[0]))
-                bp.set_attribute('image_size_y', str(hud.dim[1]))
-                if bp.has_attribute('gamma'):
-                    bp.set_attribute('gamma', str(gamma_correction))
-                for attr_name, attr_value in item[3].items():
-                    bp.set_attribute(attr_name, attr_value)
+                bp = registry.get(item[0], image_size_x=hud.dim[0], image_size_y=hud.dim[1], gamma=gamma_correction,
+                                  **item[3])
             elif item[0].startswith('sensor.lidar'):
-                bp.set_attribute('range', '50')
+                bp = registry.get(item[0], range=50)
+            else:
+                bp = registry.get(item[0])
             item.append(bp)
         self.index = None
+        self._lidar_canvas = None
 
     def toggle_camera(self):
         self.transform_index = (self.transform_index + 1) % len(self._camera_transforms)
@@ -99,18 +98,9 @@ class CameraManager(object):
         if not self:
             return
         if self.sensors[self.index][0].startswith('sensor.lidar'):
-            points = np.frombuffer(image.raw_data, dtype=np.dtype('f4'))
-            points = np.reshape(points, (int(points.shape[0] / 3), 3))
-            lidar_data = np.array(points[:, :2])
-            lidar_data *= min(self.hud.dim) / 100.0
-            lidar_data += (0.5 * self.hud.dim[0], 0.5 * self.hud.dim[1])
-            lidar_data = np.fabs(lidar_data)  # pylint: disable=E1111
-            lidar_data = lidar_data.astype(np.int32)
-            lidar_data = np.reshape(lidar_data, (-1, 2))
-            lidar_img_size = (self.hud.dim[0], self.hud.dim[1], 3)
-            lidar_img = np.zeros((lidar_img_size), dtype = int)
-            lidar_img[tuple(lidar_data.T)] = (255, 255, 255)
-            self.surface = pygame.surfarray.make_surface(lidar_img)
+            # The canvas is reused across sweeps, make_surface copies it.
+            self._lidar_canvas = lidar_to_canvas(lidar_to_array(image), self.hud.dim, self._lidar_canvas)
+            self.surface = pygame.surfarray.make_surface(self._lidar_canvas)
         else:
             image.convert(self.sensors[self.index][1])
             array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
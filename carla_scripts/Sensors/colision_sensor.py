@@ -1,8 +1,9 @@
 import weakref
 import math
-import collections
 from carla_scripts.Utils.sim_utils import get_actor_display_name
 import carla
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
+from carla_scripts.Utils.frame_history import FrameHistory
 
 # ==============================================================================
 # -- CollisionSensor -----------------------------------------------------------
@@ -10,34 +11,53 @@ import carla
 
 
 class CollisionSensor(object):
-    def __init__(self, parent_actor, hud):
+    def __init__(self, parent_actor, hud, sensor=None):
         self.sensor = None
-        self.history = []
+        # Collision intensity summed per frame, over the last 4096 frames.
+        self.history = FrameHistory(4096)
+        self._history_start = None
         self._parent = parent_actor
         self.hud = hud
-        world = self._parent.get_world()
-        bp = world.get_blueprint_library().find('sensor.other.collision')
-        self.sensor = world.spawn_actor(bp, carla.Transform(), attach_to=self._parent)
+        if sensor is None:
+            world = self._parent.get_world()
+            sensor = world.spawn_actor(*CollisionSensor.get_spawn_spec(world), attach_to=self._parent)
+        self.sensor = sensor
         # We need to pass the lambda a weak reference to self to avoid circular
         # reference.
         weak_self = weakref.ref(self)
         self.sensor.listen(lambda event: CollisionSensor._on_collision(weak_self, event))
 
+    @staticmethod
+    def get_spawn_spec(world):
+        """(blueprint, transform) of the sensor, to spawn it in a batch and pass it as `sensor`."""
+        return get_blueprint_registry(world).get('sensor.other.collision'), carla.Transform()
+
     def get_collision_history(self):
-        history = collections.defaultdict(int)
-        for frame, intensity in self.history:
-            history[frame] += intensity
-        return history
+        """{frame: summed intensity} of the recorded collisions."""
+        return dict(self.history.items())
+
+    def has_collided_since(self, frame=None):
+        """True on a collision after `frame`, or on any collision since clear_history when None."""
+        return self.history.has_events_since(frame)
+
+    def get_intensity_histogram(self, end_frame, out):
+        """Fills `out` with the collision intensity of the len(out) frames before `end_frame`."""
+        return self.history.histogram(end_frame, out)
+
+    def clear_history(self, frame=None):
+        """Forgets past events, and events of frames up to `frame` still in flight."""
+        self._history_start = frame
+        self.history.clear()
 
     @staticmethod
     def _on_collision(weak_self, event):
         self = weak_self()
         if not self:
             return
+        if self._history_start is not None and event.frame <= self._history_start:
+            return
         actor_type = get_actor_display_name(event.other_actor)
         self.hud.notification('Collision with %r' % actor_type)
         impulse = event.normal_impulse
         intensity = math.sqrt(impulse.x**2 + impulse.y**2 + impulse.z**2)
-        self.history.append((event.frame, intensity))
-        if len(self.history) > 4000:
-            self.history.pop(0)
\ No newline at end of file
+        self.history.add(event.frame, intensity)
@@ -2,6 +2,7 @@ import weakref
 import sys
 import math
 import carla
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
 
 # ==============================================================================
 # -- GnssSensor ----------------------------------------------------------------
@@ -9,23 +10,32 @@ import carla
 
 
 class GnssSensor(object):
-    def __init__(self, parent_actor):
+    def __init__(self, parent_actor, sensor=None):
         self.sensor = None
         self._parent = parent_actor
         self.lat = 0.0
         self.lon = 0.0
-        world = self._parent.get_world()
-        bp = world.get_blueprint_library().find('sensor.other.gnss')
-        self.sensor = world.spawn_actor(bp, carla.Transform(carla.Location(x=1.0, z=2.8)), attach_to=self._parent)
+        # Frame of the latest measurement, -1 before the first one.
+        self.frame = -1
+        if sensor is None:
+            world = self._parent.get_world()
+            sensor = world.spawn_actor(*GnssSensor.get_spawn_spec(world), attach_to=self._parent)
+        self.sensor = sensor
         # We need to pass the lambda a weak reference to self to avoid circular
         # reference.
         weak_self = weakref.ref(self)
         self.sensor.listen(lambda event: GnssSensor._on_gnss_event(weak_self, event))
 
+    @staticmethod
+    def get_spawn_spec(world):
+        """(blueprint, transform) of the sensor, to spawn it in a batch and pass it as `sensor`."""
+        return get_blueprint_registry(world).get('sensor.other.gnss'), carla.Transform(carla.Location(x=1.0, z=2.8))
+
     @staticmethod
     def _on_gnss_event(weak_self, event):
         self = weak_self()
         if not self:
             return
         self.lat = event.latitude
-        self.lon = event.longitude
\ No newline at end of file
+        self.lon = event.longitude
+        self.frame = event.frame
\ No newline at end of file
@@ -2,6 +2,7 @@ import weakref
 import sys
 import math
 import carla
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
 
 # ==============================================================================
 # -- IMUSensor -----------------------------------------------------------------
@@ -9,27 +10,42 @@ import carla
 
 
 class IMUSensor(object):
-    def __init__(self, parent_actor):
+    def __init__(self, parent_actor, sensor=None):
         self.sensor = None
         self._parent = parent_actor
         self.accelerometer = ()
         self.gyroscope = ()
         self.compass = 0.0
-        world = self._parent.get_world()
-        bp = world.get_blueprint_library().find('sensor.other.imu')
-        self.sensor = world.spawn_actor(
-            bp, carla.Transform(), attach_to=self._parent)
+        # Unclipped, in m/s^2 and rad/s, for the telemetry.
+        self.raw_accelerometer = (0.0, 0.0, 0.0)
+        self.raw_gyroscope = (0.0, 0.0, 0.0)
+        # Frame of the latest measurement, -1 before the first one.
+        self.frame = -1
+        if sensor is None:
+            world = self._parent.get_world()
+            sensor = world.spawn_actor(*IMUSensor.get_spawn_spec(world), attach_to=self._parent)
+        self.sensor = sensor
         # We need to pass the lambda a weak reference to self to avoid circular
         # reference.
         weak_self = weakref.ref(self)
         self.sensor.listen(
             lambda sensor_data: IMUSensor._IMU_callback(weak_self, sensor_data))
 
+    @staticmethod
+    def get_spawn_spec(world):
+        """(blueprint, transform) of the sensor, to spawn it in a batch and pass it as `sensor`."""
+        return get_blueprint_registry(world).get('sensor.other.imu'), carla.Transform()
+
     @staticmethod
     def _IMU_callback(weak_self, sensor_data):
         self = weak_self()
         if not self:
             return
+        accelerometer = sensor_data.accelerometer
+        gyroscope = sensor_data.gyroscope
+        self.raw_accelerometer = (accelerometer.x, accelerometer.y, accelerometer.z)
+        self.raw_gyroscope = (gyroscope.x, gyroscope.y, gyroscope.z)
+        self.frame = sensor_data.frame
         limits = (-99.9, 99.9)
         self.accelerometer = (
             max(limits[0], min(limits[1], sensor_data.accelerometer.x)),
@@ -2,6 +2,8 @@ import weakref
 import sys
 import math
 import carla
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
+from carla_scripts.Utils.frame_history import FrameHistory
 
 # ==============================================================================
 # -- LaneInvasionSensor --------------------------------------------------------
@@ -9,28 +11,45 @@ import carla
 
 
 class LaneInvasionSensor(object):
-    def __init__(self, parent_actor, hud):
+    def __init__(self, parent_actor, hud, sensor=None):
         self.sensor = None
-        self.history = []
+        # Invasions counted per frame, over the last 4096 frames.
+        self.history = FrameHistory(4096)
+        self._history_start = None
         self._parent = parent_actor
         self.hud = hud
-        world = self._parent.get_world()
-        bp = world.get_blueprint_library().find('sensor.other.lane_invasion')
-        self.sensor = world.spawn_actor(bp, carla.Transform(), attach_to=self._parent)
+        if sensor is None:
+            world = self._parent.get_world()
+            sensor = world.spawn_actor(*LaneInvasionSensor.get_spawn_spec(world), attach_to=self._parent)
+        self.sensor = sensor
         # We need to pass the lambda a weak reference to self to avoid circular
         # reference.
         weak_self = weakref.ref(self)
         self.sensor.listen(lambda event: LaneInvasionSensor._on_invasion(weak_self, event))
 
+    @staticmethod
+    def get_spawn_spec(world):
+        """(blueprint, transform) of the sensor, to spawn it in a batch and pass it as `sensor`."""
+        return get_blueprint_registry(world).get('sensor.other.lane_invasion'), carla.Transform()
+
+    def clear_history(self, frame=None):
+        """Forgets past events, and events of frames up to `frame` still in flight."""
+        self._history_start = frame
+        self.history.clear()
+
+    def invasions_in_last(self, n_frames, frame=None):
+        """Invasions of the `n_frames` frames up to `frame`, by default up to the latest invasion."""
+        return self.history.count_in_last(n_frames, frame)
+
     @staticmethod
     def _on_invasion(weak_self, event):
         self = weak_self()
         if not self:
             return
+        if self._history_start is not None and event.frame <= self._history_start:
+            return
         lane_types = set(x.type for x in event.crossed_lane_markings)
         text = ['%r' % str(x).split()[-1] for x in lane_types]
         self.hud.notification('Crossed line %s' % ' and '.join(text))
-        self.history.append(event.frame)
-        if len(self.history) > 4000:
-            self.history.pop(0)
-        self.history = [frame for frame in self.history if event.frame - frame < 100]
+        self.history.add(event.frame)
+
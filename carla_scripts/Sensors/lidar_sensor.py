@@ -0,0 +1,79 @@
+import numpy as np
+import carla
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
+
+# ==============================================================================
+# -- Lidar decoding ------------------------------------------------------------
+# ==============================================================================
+
+# Columns of the decoded points. CARLA 0.9.8 sends x, y, z only, intensity is then 0.
+LIDAR_FIELDS = ('x', 'y', 'z', 'intensity')
+# Blueprint attributes a car setup may set on a lidar, and their defaults. At 5 Hz a sweep is one full
+# turn per 0.2 s simulator tick.
+LIDAR_DEFAULTS = {
+    'channels': 32,
+    'range': 50.0,
+    'points_per_second': 56000,
+    'rotation_frequency': 5.0,
+    'upper_fov': 10.0,
+    'lower_fov': -30.0,
+}
+
+
+def lidar_to_array(lidar_data):
+    """(N, 4) float32 points of a CARLA lidar measurement: x, y, z, intensity, owned by the caller."""
+    raw = np.frombuffer(lidar_data.raw_data, dtype=np.float32)
+    count = len(lidar_data)
+    stride = raw.size // count if count else 3
+    points = np.zeros((count, 4), dtype=np.float32)
+    points[:, :min(stride, 4)] = raw.reshape(count, stride)[:, :4]
+    return points
+
+
+def lidar_to_canvas(points, dim, canvas=None):
+    """
+    Top view of (N, >= 2) points painted white on a (W, H, 3) uint8 canvas, one pixel per point,
+    100 m across the smaller side. Reuses `canvas` when given, points outside of it are dropped.
+    """
+    if canvas is None or canvas.shape != (dim[0], dim[1], 3):
+        canvas = np.zeros((dim[0], dim[1], 3), dtype=np.uint8)
+    else:
+        canvas.fill(0)
+    pixels = points[:, :2] * np.float32(min(dim) / 100.0)
+    pixels += np.array([0.5 * dim[0], 0.5 * dim[1]], dtype=np.float32)
+    np.fabs(pixels, out=pixels)
+    pixels = pixels.astype(np.int32)
+    inside = (pixels[:, 0] < dim[0]) & (pixels[:, 1] < dim[1])
+    canvas[pixels[inside, 0], pixels[inside, 1]] = 255
+    return canvas
+
+
+# ==============================================================================
+# -- Lidar rig -----------------------------------------------------------------
+# ==============================================================================
+
+
+def get_lidar_config(name, setup):
+    """
+    Full description of a lidar of the car setup, `setup` as under "lidars" in the setup json:
+    location [x, y, z] and rotation [pitch, yaw, roll] in vehicle coordinates, plus any of LIDAR_DEFAULTS.
+    """
+    config = {
+        'type': 'sensor.lidar.ray_cast',
+        'name': name,
+        'fields': list(LIDAR_FIELDS),
+        'location': [float(v) for v in setup.get('location', (0.0, 0.0, 2.0))],
+        'rotation': [float(v) for v in setup.get('rotation', (0.0, 0.0, 0.0))],
+    }
+    for key, default in LIDAR_DEFAULTS.items():
+        config[key] = type(default)(setup.get(key, default))
+    return config
+
+
+def get_lidar_spawn_spec(world, config, sensor_tick=0.0):
+    """(blueprint, transform) of a lidar described by get_lidar_config, to spawn it in a batch."""
+    attributes = dict((key, config[key]) for key in LIDAR_DEFAULTS)
+    bp = get_blueprint_registry(world).get(config['type'], sensor_tick=sensor_tick, **attributes)
+    x, y, z = config['location']
+    pitch, yaw, roll = config['rotation']
+    return bp, carla.Transform(carla.Location(x=x, y=y, z=z), carla.Rotation(pitch=pitch, yaw=yaw, roll=roll))
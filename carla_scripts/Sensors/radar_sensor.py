@@ -1,7 +1,49 @@
 import weakref
-import sys
-import math
+import numpy as np
 import carla
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
+
+# ==============================================================================
+# -- Radar decoding ------------------------------------------------------------
+# ==============================================================================
+
+# Columns of the decoded detections, as laid out in the raw buffer.
+RADAR_FIELDS = ('velocity', 'azimuth', 'altitude', 'depth')
+# Mounting of the radar on the ego, (x, y, z) and (pitch, yaw, roll).
+RADAR_LOCATION = (2.8, 0.0, 1.0)
+RADAR_ROTATION = (5.0, 0.0, 0.0)
+
+
+def radar_to_array(radar_data):
+    """(N, 4) float32 detections of a CARLA radar measurement: velocity, azimuth, altitude, depth."""
+    return np.frombuffer(radar_data.raw_data, dtype=np.float32).reshape(-1, 4)
+
+
+def radar_to_points(detections, pitch=0.0, yaw=0.0):
+    """
+    (N, 3) float32 Cartesian points of (N, 4) detections, in the sensor frame, or in a frame rotated
+    by `pitch` and `yaw` degrees, e.g. the sensor rotation to get world axes.
+    """
+    altitude = detections[:, 2] + np.float32(np.radians(pitch))
+    azimuth = detections[:, 1] + np.float32(np.radians(yaw))
+    depth = detections[:, 3]
+    cos_altitude = np.cos(altitude)
+    points = np.empty((len(detections), 3), dtype=np.float32)
+    points[:, 0] = depth * cos_altitude * np.cos(azimuth)
+    points[:, 1] = depth * cos_altitude * np.sin(azimuth)
+    points[:, 2] = depth * np.sin(altitude)
+    return points
+
+
+def velocity_colors(velocities, velocity_range):
+    """(N, 3) uint8 debug colors, red approaching, white static, blue receding."""
+    norm_velocity = np.clip(velocities / velocity_range, -1.0, 1.0)
+    colors = np.empty((len(velocities), 3), dtype=np.uint8)
+    colors[:, 0] = np.clip(1.0 - norm_velocity, 0.0, 1.0) * 255.0
+    colors[:, 1] = (1.0 - np.abs(norm_velocity)) * 255.0
+    colors[:, 2] = np.abs(np.clip(-1.0 - norm_velocity, -1.0, 0.0)) * 255.0
+    return colors
+
 
 # ==============================================================================
 # -- RadarSensor ---------------------------------------------------------------
@@ -9,59 +51,79 @@ import carla
 
 
 class RadarSensor(object):
-    def __init__(self, parent_actor):
+    """
+    Decodes every sweep into an (N, 4) array. With `record_func`, sweeps are handed to it as
+    record_func(frame, {'radar': detections}). Debug points are drawn on every `debug_every` sweep,
+    at most `debug_max_points` of them, or not at all with debug_every=0.
+    """
+    def __init__(self, parent_actor, sensor=None, record_func=None, debug_every=1, debug_max_points=200,
+                 sensor_tick=0.0):
         self.sensor = None
         self._parent = parent_actor
         self.velocity_range = 7.5 # m/s
+        self.record_func = record_func
+        self.debug_every = debug_every
+        self.debug_max_points = debug_max_points
+        self.sweeps = 0
         world = self._parent.get_world()
         self.debug = world.debug
-        bp = world.get_blueprint_library().find('sensor.other.radar')
-        bp.set_attribute('horizontal_fov', str(35))
-        bp.set_attribute('vertical_fov', str(20))
-        self.sensor = world.spawn_actor(
-            bp,
-            carla.Transform(
-                carla.Location(x=2.8, z=1.0),
-                carla.Rotation(pitch=5)),
-            attach_to=self._parent)
+        if sensor is None:
+            sensor = world.spawn_actor(*RadarSensor.get_spawn_spec(world, sensor_tick), attach_to=self._parent)
+        self.sensor = sensor
         # We need a weak reference to self to avoid circular reference.
         weak_self = weakref.ref(self)
         self.sensor.listen(
             lambda radar_data: RadarSensor._Radar_callback(weak_self, radar_data))
 
+    @staticmethod
+    def get_spawn_spec(world, sensor_tick=0.0):
+        """(blueprint, transform) of the sensor, to spawn it in a batch and pass it as `sensor`."""
+        bp = get_blueprint_registry(world).get('sensor.other.radar', horizontal_fov=35, vertical_fov=20,
+                                               sensor_tick=sensor_tick)
+        x, y, z = RADAR_LOCATION
+        pitch, yaw, roll = RADAR_ROTATION
+        return bp, carla.Transform(carla.Location(x=x, y=y, z=z), carla.Rotation(pitch=pitch, yaw=yaw, roll=roll))
+
+    def get_config(self):
+        """Describes the recorded sweeps, for the clip manifest."""
+        attributes = self.sensor.attributes
+        return {
+            'type': 'sensor.other.radar',
+            'fields': list(RADAR_FIELDS),
+            'location': list(RADAR_LOCATION),
+            'rotation': list(RADAR_ROTATION),
+            'horizontal_fov': float(attributes.get('horizontal_fov', 0.0)),
+            'vertical_fov': float(attributes.get('vertical_fov', 0.0)),
+            'range': float(attributes.get('range', 0.0)),
+        }
+
     @staticmethod
     def _Radar_callback(weak_self, radar_data):
         self = weak_self()
         if not self:
             return
-        # To get a numpy [[vel, altitude, azimuth, depth],...[,,,]]:
-        # points = np.frombuffer(radar_data.raw_data, dtype=np.dtype('f4'))
-        # points = np.reshape(points, (len(radar_data), 4))
+        detections = radar_to_array(radar_data)
+        if self.record_func is not None:
+            self.record_func(radar_data.frame, {'radar': detections.copy()})
+        self.sweeps += 1
+        if self.debug_every and self.sweeps % self.debug_every == 0:
+            self.draw(radar_data, detections)
 
+    def draw(self, radar_data, detections):
+        if len(detections) > self.debug_max_points:
+            detections = detections[::-(-len(detections) // self.debug_max_points)]
         current_rot = radar_data.transform.rotation
-        for detect in radar_data:
-            azi = math.degrees(detect.azimuth)
-            alt = math.degrees(detect.altitude)
-            # The 0.25 adjusts a bit the distance so the dots can
-            # be properly seen
-            fw_vec = carla.Vector3D(x=detect.depth - 0.25)
-            carla.Transform(
-                carla.Location(),
-                carla.Rotation(
-                    pitch=current_rot.pitch + alt,
-                    yaw=current_rot.yaw + azi,
-                    roll=current_rot.roll)).transform(fw_vec)
-
-            def clamp(min_v, max_v, value):
-                return max(min_v, min(value, max_v))
-
-            norm_velocity = detect.velocity / self.velocity_range # range [-1, 1]
-            r = int(clamp(0.0, 1.0, 1.0 - norm_velocity) * 255.0)
-            g = int(clamp(0.0, 1.0, 1.0 - abs(norm_velocity)) * 255.0)
-            b = int(abs(clamp(- 1.0, 0.0, - 1.0 - norm_velocity)) * 255.0)
+        # The 0.25 adjusts a bit the distance so the dots can be properly seen
+        shortened = detections.copy()
+        shortened[:, 3] -= 0.25
+        points = radar_to_points(shortened, current_rot.pitch, current_rot.yaw)
+        points += np.array([radar_data.transform.location.x, radar_data.transform.location.y,
+                            radar_data.transform.location.z], dtype=np.float32)
+        colors = velocity_colors(detections[:, 0], self.velocity_range)
+        for (x, y, z), (r, g, b) in zip(points.tolist(), colors.tolist()):
             self.debug.draw_point(
-                radar_data.transform.location + fw_vec,
+                carla.Location(x, y, z),
                 size=0.075,
                 life_time=0.06,
                 persistent_lines=False,
-                color=carla.Color(r, g, b))
\ No newline at end of file
+                color=carla.Color(r, g, b))
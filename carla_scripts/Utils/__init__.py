@@ -1,3 +1,9 @@
-from .hud import HUD
-from .keyboard_control import KeyboardControl
 from .sim_utils import *
+from .headless_hud import HeadlessHUD
+try:
+    from .hud import HUD
+    from .keyboard_control import KeyboardControl
+except ImportError as e:
+    # pygame is only needed by the interactive client, headless runs go without it.
+    if e.name != 'pygame':
+        raise
@@ -0,0 +1,208 @@
+import argparse
+import time
+from carla_scripts.Cameras.frame_writer import BACKPRESSURE_POLICIES, BLOCK
+from carla_scripts.Cameras.me_camera_manager import OUTPUT_FORMATS, NPZ_FORMAT, CLIP_LAYOUTS, CLIP_LAYOUT_PER_CLIP
+from carla_scripts.Utils.profiler import EXPORT_FORMATS, JSONL_FORMAT
+
+
+def get_argparser(description):
+    """Options shared by every simulator entry point."""
+    argparser = argparse.ArgumentParser(
+        description=description)
+    argparser.add_argument(
+        '--car_name',
+        metavar='car_name',
+        default='Alfred',
+        help='The ME car to simulate (default: Alfred)')
+    argparser.add_argument(
+        '--sector',
+        metavar='Sector',
+        default='main',
+        help='The sector of Cameras. "rand" for random choice (default: main)')
+    argparser.add_argument(
+        '--map_id',
+        metavar='map_id',
+        type=int,
+        default=0,
+        help='map index from world.get_maps(). currently available: 0-6')
+    argparser.add_argument(
+        '-c', '--clip_interval',
+        type=int,
+        default=0,
+        help='Start new clip every x seconds (default - 0, i.e. same for whole run)')
+    argparser.add_argument(
+        '--filter',
+        metavar='PATTERN',
+        default='vehicle.*',
+        help='actor filter (default: "vehicle.*")')
+    argparser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+        dest='debug',
+        help='print debug information and draw cameras bounding boxes')
+    argparser.add_argument(
+        '-r', '--record_interval',
+        type=int,
+        default=0,
+        dest='record',
+        help='Record simulator (not ME sensors!) images every x seconds')
+    argparser.add_argument(
+        '--host',
+        metavar='H',
+        default='127.0.0.1',
+        help='IP of the host server (default: 127.0.0.1)')
+    argparser.add_argument(
+        '-p', '--port',
+        metavar='P',
+        default=2000,
+        type=int,
+        help='TCP port to listen to (default: 2000)')
+    argparser.add_argument(
+        '--tm_port',
+        metavar='P',
+        default=8000,
+        type=int,
+        help='Port of the Traffic Manager, distinct per server on one host (default: 8000)')
+    argparser.add_argument(
+        '-a', '--autopilot',
+        type=bool,
+        default=True,
+        help='enable autopilot')
+    argparser.add_argument(
+        '-l', '--low_quality',
+        action='store_true',
+        help='run in low quality')
+    argparser.add_argument(
+        '--off_screen',
+        action='store_true',
+        help='run in off screen')
+    argparser.add_argument(
+        '-s', '--spawn_interval',
+        type=int,
+        default=0,
+        help='spawn every x seconds')
+    argparser.add_argument(
+        '--res',
+        metavar='WIDTHxHEIGHT',
+        default='1280x720',
+        help='window resolution (default: 1280x720)')
+    argparser.add_argument(
+        '--rolename',
+        metavar='NAME',
+        default='hero',
+        help='actor role name (default: "hero")')
+    argparser.add_argument(
+        '--gamma',
+        default=2.2,
+        type=float,
+        help='Gamma correction of the camera (default: 2.2)')
+    argparser.add_argument(
+        '--writer_threads',
+        default=2,
+        type=int,
+        help='Number of threads writing ME frames to disk (default: 2)')
+    argparser.add_argument(
+        '--writer_queue_size',
+        default=64,
+        type=int,
+        help='Max number of ME frames waiting to be written (default: 64)')
+    argparser.add_argument(
+        '--writer_policy',
+        default=BLOCK,
+        choices=BACKPRESSURE_POLICIES,
+        help='What to do when the write queue is full (default: block)')
+    argparser.add_argument(
+        '--assembler_timeout',
+        default=2.0,
+        type=float,
+        help='Seconds to wait for all views of a frame before saving it as partial (default: 2.0)')
+    argparser.add_argument(
+        '--drop_partial_frames',
+        action='store_true',
+        help='Do not save frames missing some of their views')
+    argparser.add_argument(
+        '--output_format',
+        default=NPZ_FORMAT,
+        choices=OUTPUT_FORMATS,
+        help='npz file per frame and view, or a single append-only clip file (default: npz)')
+    argparser.add_argument(
+        '--clip_layout',
+        default=CLIP_LAYOUT_PER_CLIP,
+        choices=CLIP_LAYOUTS,
+        help='With --output_format=clip, write one file per clip or one per view (default: clip)')
+    argparser.add_argument(
+        '--image_codec',
+        default='raw',
+        help='Codec chain for ME images, e.g. png, zlib, zstd, lz4 (default: raw)')
+    argparser.add_argument(
+        '--depth_codec',
+        default='raw',
+        help='Codec chain for ME depth, e.g. float16, depth_mm_u16+png, float16+zstd (default: raw)')
+    argparser.add_argument(
+        '--lidar_codec',
+        default='points_q16',
+        help='Codec chain for the lidar sweeps of the car setup, e.g. raw, float16, points_q16+zstd '
+             '(default: points_q16)')
+    argparser.add_argument(
+        '--full_frame_metadata',
+        action='store_true',
+        help='Repeat the static calibration in every frame instead of only in the clip manifest')
+    argparser.add_argument(
+        '--capture_every',
+        default=0,
+        type=int,
+        help='Tick-locked capture: save ME frames every N simulator ticks '
+             '(default: 0, sensors capture on their own 0.5s sensor_tick)')
+    argparser.add_argument(
+        '--output_dir',
+        default=None,
+        help='Write clips directly under this directory (default: output/<car_name>/<sector>)')
+    argparser.add_argument(
+        '--weather',
+        default=None,
+        help='Keep this weather preset, e.g. ClearNoon (default: a random preset on every restart)')
+    argparser.add_argument(
+        '--map_cache_dir',
+        default=None,
+        help='Keep the spawn points and navigation locations of every map in this directory (default: memory only)')
+    argparser.add_argument(
+        '--full_restart',
+        action='store_true',
+        help='Re-spawn the ego and all its sensors on every episode restart instead of teleporting it')
+    argparser.add_argument(
+        '--record_radar',
+        action='store_true',
+        help='Attach a radar to the ego and write its sweeps with the ME frames, keyed by grab index')
+    argparser.add_argument(
+        '--no_telemetry',
+        action='store_true',
+        help='Do not write the per-tick ego pose, velocity, IMU, GNSS and control to <clip>/telemetry.clip')
+    argparser.add_argument(
+        '--no_index',
+        action='store_true',
+        help='Do not add the written frames to the dataset index, <output dir>/index.sqlite')
+    argparser.add_argument(
+        '--capture_timeout',
+        default=2.0,
+        type=float,
+        help='Seconds to wait for every ME sensor in tick-locked capture (default: 2.0)')
+    argparser.add_argument(
+        '--profile_dir',
+        default=None,
+        help='Time the tick stages and ME sensor callbacks and export them to this folder (default: off)')
+    argparser.add_argument(
+        '--profile_interval',
+        default=10.0,
+        type=float,
+        help='Seconds between profile exports (default: 10.0)')
+    argparser.add_argument(
+        '--profile_format',
+        default=JSONL_FORMAT,
+        choices=EXPORT_FORMATS,
+        help='Format of the profile history next to metrics.prom (default: jsonl)')
+    argparser.add_argument(
+        '-i', '--id',
+        metavar='I',
+        default=str(int(time.time())),
+        help='Simulation ID, clips are named <map>_<id> (default: the start time)')
+    return argparser
@@ -0,0 +1,59 @@
+import threading
+
+# ==============================================================================
+# -- BlueprintRegistry ---------------------------------------------------------
+# ==============================================================================
+
+
+class BlueprintRegistry(object):
+    """
+    Fetches the blueprint library of a world once and hands out configured blueprint templates, one per
+    blueprint id and attribute values. Templates are shared, spawn them but never set their attributes.
+    """
+    def __init__(self, world):
+        self.world = world
+        self._library = None
+        self._templates = {}
+        self._filters = {}
+        self._lock = threading.Lock()
+
+    def get_library(self):
+        with self._lock:
+            if self._library is None:
+                self._library = self.world.get_blueprint_library()
+            return self._library
+
+    def get(self, blueprint_id, **attributes):
+        """
+        The blueprint `blueprint_id` with `attributes` set. Attributes the blueprint does not have are
+        ignored, e.g. gamma on a depth camera.
+        """
+        attributes = tuple(sorted((name, str(value)) for name, value in attributes.items()))
+        key = (blueprint_id, attributes)
+        template = self._templates.get(key)
+        if template is None:
+            template = self.get_library().find(blueprint_id)
+            for name, value in attributes:
+                if template.has_attribute(name):
+                    template.set_attribute(name, value)
+            self._templates[key] = template
+        return template
+
+    def filter(self, pattern):
+        """Blueprints matching `pattern`, the caller may set their attributes."""
+        blueprints = self._filters.get(pattern)
+        if blueprints is None:
+            blueprints = self._filters[pattern] = list(self.get_library().filter(pattern))
+        return blueprints
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_blueprint_registry(world):
+    """One BlueprintRegistry per world (episode) and process."""
+    with _registries_lock:
+        if world.id not in _registries:
+            _registries[world.id] = BlueprintRegistry(world)
+        return _registries[world.id]
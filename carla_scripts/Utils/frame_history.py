@@ -0,0 +1,101 @@
+import threading
+import numpy as np
+
+# ==============================================================================
+# -- FrameHistory --------------------------------------------------------------
+# ==============================================================================
+
+
+class FrameHistory(object):
+    """
+    Events of the last `size` frames aggregated per frame (event count and summed value) in fixed arrays
+    indexed by frame % size. Adding an event is O(1), windowed queries are O(window) and allocate nothing.
+    """
+    def __init__(self, size=4096):
+        self.size = size
+        self.frames = np.full(size, -1, dtype=np.int64)
+        self.counts = np.zeros(size, dtype=np.int32)
+        self.values = np.zeros(size, dtype=np.float64)
+        # Frame of the latest event and events since clear(), for O(1) checks.
+        self.last_frame = None
+        self.total = 0
+        self._lock = threading.Lock()
+        self._windows = {}
+
+    def add(self, frame, value=1.0):
+        slot = frame % self.size
+        with self._lock:
+            if self.frames[slot] != frame:
+                self.frames[slot] = frame
+                self.counts[slot] = 0
+                self.values[slot] = 0.0
+            self.counts[slot] += 1
+            self.values[slot] += value
+            self.total += 1
+            if self.last_frame is None or frame > self.last_frame:
+                self.last_frame = frame
+
+    def clear(self):
+        with self._lock:
+            self.frames.fill(-1)
+            self.last_frame = None
+            self.total = 0
+
+    def has_events_since(self, frame=None):
+        """True if an event of a frame after `frame` was added, or any event since clear() when None."""
+        last_frame = self.last_frame
+        return last_frame is not None and (frame is None or last_frame > frame)
+
+    def count_in_last(self, n_frames, frame=None):
+        """Events of the `n_frames` frames up to `frame` included, by default the frame of the latest event."""
+        if frame is None:
+            frame = self.last_frame
+            if frame is None:
+                return 0
+        window = self._get_window(n_frames, frame + 1)
+        with self._lock:
+            np.take(self.frames, window.slots, out=window.taken)
+            np.take(self.counts, window.slots, out=window.counts)
+        np.equal(window.taken, window.frames, out=window.mask)
+        np.multiply(window.counts, window.mask, out=window.counts)
+        return int(window.counts.sum())
+
+    def histogram(self, end_frame, out):
+        """Fills `out` with the summed values of the len(out) frames before `end_frame`, oldest first."""
+        window = self._get_window(len(out), end_frame)
+        with self._lock:
+            np.take(self.frames, window.slots, out=window.taken)
+            np.take(self.values, window.slots, out=out)
+        np.equal(window.taken, window.frames, out=window.mask)
+        np.multiply(out, window.mask, out=out)
+        return out
+
+    def items(self):
+        """(frame, value) of the frames with events, in no particular order."""
+        with self._lock:
+            used = np.flatnonzero(self.frames >= 0)
+            return list(zip(self.frames[used].tolist(), self.values[used].tolist()))
+
+    def _get_window(self, n_frames, end_frame):
+        """The buffers of a window of `n_frames` frames ending before `end_frame`. Query from a single thread."""
+        window = self._windows.get(n_frames)
+        if window is None:
+            if n_frames > self.size:
+                raise ValueError('A window of %d frames is longer than the history (%d)' % (n_frames, self.size))
+            window = self._windows[n_frames] = _Window(n_frames)
+        np.add(window.offsets, end_frame, out=window.frames)
+        np.remainder(window.frames, self.size, out=window.slots)
+        return window
+
+
+class _Window(object):
+    """Buffers of a query over a fixed number of frames, allocated once."""
+    __slots__ = ('offsets', 'frames', 'slots', 'taken', 'counts', 'mask')
+
+    def __init__(self, n_frames):
+        self.offsets = np.arange(-n_frames, 0, dtype=np.int64)
+        self.frames = np.empty(n_frames, dtype=np.int64)
+        self.slots = np.empty(n_frames, dtype=np.int64)
+        self.taken = np.empty(n_frames, dtype=np.int64)
+        self.counts = np.empty(n_frames, dtype=np.int32)
+        self.mask = np.empty(n_frames, dtype=np.bool_)
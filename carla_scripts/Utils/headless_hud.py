@@ -0,0 +1,46 @@
+import logging
+import time
+
+# ==============================================================================
+# -- HeadlessHUD ---------------------------------------------------------------
+# ==============================================================================
+
+
+class HeadlessHUD(object):
+    """Drop-in for HUD without pygame: keeps the state Simulator reads and logs notifications."""
+    def __init__(self, width, height):
+        self.dim = (width, height)
+        self.server_fps = 0
+        self.frame = 0
+        self.simulation_time = 0
+        self.closest_vehicle_distance = None
+        self._last_server_tick = None
+
+    def on_world_tick(self, timestamp):
+        now = time.monotonic()
+        if self._last_server_tick is not None and now > self._last_server_tick:
+            self.server_fps = 1.0 / (now - self._last_server_tick)
+        self._last_server_tick = now
+        self.frame = timestamp.frame
+        self.simulation_time = timestamp.elapsed_seconds
+
+    def tick(self, world, clock=None):
+        world_state = world.world_state
+        # None once no other vehicle is left, so restart checks never act on a stale distance.
+        self.closest_vehicle_distance = None
+        position = world_state.get_position(world.player.id)
+        if position is not None:
+            self.closest_vehicle_distance = world_state.closest_distance(position, 'vehicle.',
+                                                                         exclude_id=world.player.id)
+
+    def toggle_info(self):
+        pass
+
+    def notification(self, text, seconds=2.0):
+        logging.debug(text)
+
+    def error(self, text):
+        logging.error(text)
+
+    def render(self, display):
+        pass
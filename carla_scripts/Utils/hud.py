@@ -36,6 +36,7 @@ import os
 from carla_scripts.Utils.sim_utils import *
 import datetime
 import math
+import numpy as np
 import carla
 
 # ==============================================================================
@@ -117,6 +118,8 @@ class HUD(object):
         self.simulation_time = 0
         self._show_info = True
         self._info_text = []
+        # Collision intensity of the last 200 frames, refilled in place every tick.
+        self._collision = np.zeros(200)
         self._server_clock = pygame.time.Clock()
         self.closest_vehicle_distance = None
 
@@ -138,11 +141,9 @@ class HUD(object):
         heading += 'S' if 90.5 < compass < 269.5 else ''
         heading += 'E' if 0.5 < compass < 179.5 else ''
         heading += 'W' if 180.5 < compass < 359.5 else ''
-        colhist = world.collision_sensor.get_collision_history()
-        collision = [colhist[x + self.frame - 200] for x in range(0, 200)]
-        max_col = max(1.0, max(collision))
-        collision = [x / max_col for x in collision]
-        vehicles = world.world.get_actors().filter('vehicle.*')
+        collision = world.collision_sensor.get_intensity_histogram(self.frame, self._collision)
+        collision /= max(1.0, collision.max())
+        world_state = world.world_state
         # pedestrians = world.world.get_actors().filter('walker.pedestrian.*')
         self._info_text = [
             'Server:  % 16.0f FPS' % self.server_fps,
@@ -173,22 +174,30 @@ class HUD(object):
             self._info_text += [
                 ('Speed:', c.speed, 0.0, 5.556),
                 ('Jump:', c.jump)]
+        writer_stats = world.me_sensor_manager.frame_writer.get_stats()
         self._info_text += [
+            '',
+            'Write queue: % 16d' % writer_stats['queue_depth'],
+            'Dropped frames: % 13d' % writer_stats['dropped'],
             '',
             'Collision:',
             collision,
             '',
-            'Number of vehicles: % 8d' % len(vehicles)]
-        if len(vehicles) > 1:
+            'Number of vehicles: % 8d' % world_state.count('vehicle.')]
+        position = world_state.get_position(world.player.id)
+        if position is None:
+            return
+        distances, ids = world_state.nearest(position, 'vehicle.', exclude_id=world.player.id)
+        if len(ids) > 0:
             self._info_text += ['Nearby vehicles:']
-            distance = lambda l: math.sqrt((l.x - t.location.x)**2 + (l.y - t.location.y)**2 + (l.z - t.location.z)**2)
-            vehicles = sorted([(distance(x.get_location()), x) for x in vehicles if x.id != world.player.id])
-            self.closest_vehicle_distance = vehicles[0][0]
-            for d, vehicle in vehicles:
+            self.closest_vehicle_distance = distances[0]
+            for d, actor_id in zip(distances, ids):
                 if d > 200.0:
                     break
-                vehicle_type = get_actor_display_name(vehicle, truncate=22)
-                self._info_text.append('% 4dm %s' % (d, vehicle_type))
+                vehicle = world_state.get_actor(actor_id)
+                if vehicle is not None:
+                    vehicle_type = get_actor_display_name(vehicle, truncate=22)
+                    self._info_text.append('% 4dm %s' % (d, vehicle_type))
 
     def toggle_info(self):
         self._show_info = not self._show_info
@@ -210,7 +219,7 @@ class HUD(object):
             for item in self._info_text:
                 if v_offset + 18 > self.dim[1]:
                     break
-                if isinstance(item, list):
+                if isinstance(item, (list, np.ndarray)):
                     if len(item) > 1:
                         points = [(x + 8, v_offset + 8 + (1.0 - y) * 30) for x, y in enumerate(item)]
                         pygame.draw.lines(display, (255, 136, 0), False, points, 2)
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+# ==============================================================================
+# -- Profiler ------------------------------------------------------------------
+# ==============================================================================
+
+JSONL_FORMAT = 'jsonl'
+CSV_FORMAT = 'csv'
+EXPORT_FORMATS = (JSONL_FORMAT, CSV_FORMAT)
+PERCENTILES = (50, 90, 99)
+
+
+class _StageTimer(object):
+    """Rolling window of the last `window` durations of a stage, plus cumulative count and sum."""
+    __slots__ = ('name', 'samples', 'index', 'count', 'total', 'lock')
+
+    def __init__(self, name, window):
+        self.name = name
+        self.samples = np.zeros(window)
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples[self.index] = seconds
+            self.index = (self.index + 1) % len(self.samples)
+            self.count += 1
+            self.total += seconds
+
+    def summary(self):
+        with self.lock:
+            window = self.samples[:min(self.count, len(self.samples))].copy()
+            count, total = self.count, self.total
+        summary = {'count': count, 'sum_s': total}
+        if len(window):
+            summary['mean_ms'] = float(window.mean() * 1000.0)
+            summary['max_ms'] = float(window.max() * 1000.0)
+            for p, value in zip(PERCENTILES, np.percentile(window, PERCENTILES)):
+                summary['p%d_ms' % p] = float(value * 1000.0)
+        return summary
+
+
+class _Stage(object):
+    """Context manager timing one run of a stage."""
+    __slots__ = ('timer', 'start')
+
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(time.perf_counter() - self.start)
+        return False
+
+
+class Profiler(object):
+    """
+    Times named stages (rolling percentiles over the last `window` runs) and counts events per label,
+    e.g. frames received per view. Every `interval` seconds tick() appends a summary line to
+    <output_dir>/profile.jsonl or profile.csv and rewrites <output_dir>/metrics.prom in the Prometheus
+    text format.
+    """
+    enabled = True
+
+    def __init__(self, output_dir=None, interval=10.0, export_format=JSONL_FORMAT, window=1000):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError('Unknown profile format %r, expected one of %s' % (export_format, ', '.join(EXPORT_FORMATS)))
+        self.output_dir = output_dir
+        self.interval = interval
+        self.export_format = export_format
+        self.window = window
+        self._timers = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._last_export = time.time()
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+    def get_timer(self, name):
+        timer = self._timers.get(name)
+        if timer is None:
+            with self._lock:
+                timer = self._timers.setdefault(name, _StageTimer(name, self.window))
+        return timer
+
+    def stage(self, name):
+        """`with profiler.stage('hud'):` times the block."""
+        return _Stage(self.get_timer(name))
+
+    def record(self, name, seconds):
+        self.get_timer(name).add(seconds)
+
+    def count(self, name, label=None, n=1):
+        key = (name, label)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def summary(self):
+        with self._lock:
+            timers = list(self._timers.values())
+            counters = dict(self._counters)
+        return {
+            'time': time.time(),
+            'stages': dict((timer.name, timer.summary()) for timer in timers),
+            'counters': [{'name': name, 'label': label, 'value': value}
+                         for (name, label), value in sorted(counters.items(), key=lambda x: (x[0][0], str(x[0][1])))],
+        }
+
+    def tick(self):
+        """Exports when the interval elapsed, call it once per simulator tick."""
+        now = time.time()
+        if self.output_dir and now - self._last_export >= self.interval:
+            self._last_export = now
+            self.export()
+
+    def export(self):
+        summary = self.summary()
+        if self.export_format == CSV_FORMAT:
+            self.write_csv(summary)
+        else:
+            with open(os.path.join(self.output_dir, 'profile.jsonl'), 'a') as f:
+                f.write(json.dumps(summary) + '\n')
+        self.write_prometheus(summary)
+        return summary
+
+    def write_csv(self, summary):
+        path = os.path.join(self.output_dir, 'profile.csv')
+        columns = ['count', 'sum_s', 'mean_ms'] + ['p%d_ms' % p for p in PERCENTILES] + ['max_ms']
+        new_file = not os.path.exists(path)
+        with open(path, 'a') as f:
+            if new_file:
+                f.write(','.join(['time', 'kind', 'name', 'label'] + columns) + '\n')
+            for name, stage in sorted(summary['stages'].items()):
+                values = ['%g' % stage[c] if c in stage else '' for c in columns]
+                f.write(','.join(['%.3f' % summary['time'], 'stage', name, ''] + values) + '\n')
+            for counter in summary['counters']:
+                values = [str(counter['value'])] + [''] * (len(columns) - 1)
+                f.write(','.join(['%.3f' % summary['time'], 'counter', counter['name'],
+                                  counter['label'] or ''] + values) + '\n')
+
+    def write_prometheus(self, summary):
+        lines = ['# TYPE vidar_stage_seconds summary']
+        for name, stage in sorted(summary['stages'].items()):
+            for p in PERCENTILES:
+                if 'p%d_ms' % p in stage:
+                    lines.append('vidar_stage_seconds{stage="%s",quantile="%g"} %g' %
+                                 (name, p / 100.0, stage['p%d_ms' % p] / 1000.0))
+            lines.append('vidar_stage_seconds_sum{stage="%s"} %g' % (name, stage['sum_s']))
+            lines.append('vidar_stage_seconds_count{stage="%s"} %d' % (name, stage['count']))
+        names = sorted(set(counter['name'] for counter in summary['counters']))
+        for name in names:
+            lines.append('# TYPE vidar_%s_total counter' % name)
+            for counter in summary['counters']:
+                if counter['name'] == name:
+                    label = '{view="%s"}' % counter['label'] if counter['label'] is not None else ''
+                    lines.append('vidar_%s_total%s %d' % (name, label, counter['value']))
+        path = os.path.join(self.output_dir, 'metrics.prom')
+        with open(path + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(path + '.tmp', path)
+
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class NullProfiler(object):
+    """Disabled profiler: every method is a no-op, stage() returns one shared context manager."""
+    enabled = False
+
+    def stage(self, name):
+        return _NULL_STAGE
+
+    def record(self, name, seconds):
+        pass
+
+    def count(self, name, label=None, n=1):
+        pass
+
+    def tick(self):
+        pass
+
+    def export(self):
+        return None
+
+
+NULL_PROFILER = NullProfiler()
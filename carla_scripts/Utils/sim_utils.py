@@ -2,6 +2,7 @@ from subprocess import Popen
 from time import sleep
 import psutil
 import os
+import logging
 import carla
 
 SERVER_PATH = '/opt/carla/bin/CarlaUE4.sh'
@@ -35,3 +36,22 @@ def run_carla_server(use_ini_file=True, use_opengl=True, low_quality=False, off_
 def get_actor_display_name(actor, truncate=250):
     name = ' '.join(actor.type_id.replace('_', '.').title().split('.')[1:])
     return (name[:truncate - 1] + u'\u2026') if len(name) > truncate else name
+
+
+def spawn_actors(client, world, specs):
+    """
+    Spawns (blueprint, transform, parent or None) specs in one apply_batch_sync round trip. Returns the
+    actors in the order of `specs`, None where a spawn failed.
+    """
+    batch = [carla.command.SpawnActor(blueprint, transform, parent.id) if parent is not None
+             else carla.command.SpawnActor(blueprint, transform)
+             for blueprint, transform, parent in specs]
+    actor_ids = []
+    for response in client.apply_batch_sync(batch, False):
+        if response.error:
+            logging.error(response.error)
+            actor_ids.append(None)
+        else:
+            actor_ids.append(response.actor_id)
+    actors = dict((actor.id, actor) for actor in world.get_actors([x for x in actor_ids if x is not None]))
+    return [actors.get(actor_id) for actor_id in actor_ids]
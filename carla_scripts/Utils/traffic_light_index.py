@@ -0,0 +1,54 @@
+import math
+import numpy as np
+
+# ==============================================================================
+# -- TrafficLightIndex ---------------------------------------------------------
+# ==============================================================================
+
+
+class TrafficLightIndex(object):
+    """
+    Uniform grid over the traffic lights of a map. Traffic lights are static, so the index is built
+    once per map (on the first query after the world is loaded) and a radius query is then local.
+    """
+    def __init__(self, world, cell_size=20.0):
+        self.world = world
+        self.cell_size = float(cell_size)
+        self._actors = None
+        self._positions = None
+        self._grid = None
+
+    def build(self):
+        self._actors = list(self.world.get_actors().filter('traffic.traffic_light'))
+        locations = [tl.get_location() for tl in self._actors]
+        self._positions = np.array([(l.x, l.y, l.z) for l in locations], dtype=np.float64).reshape(-1, 3)
+        cells = np.floor(self._positions[:, :2] / self.cell_size).astype(np.int64)
+        grid = {}
+        for i, cell in enumerate(map(tuple, cells.tolist())):
+            grid.setdefault(cell, []).append(i)
+        self._grid = dict((cell, np.array(indices, dtype=np.int64)) for cell, indices in grid.items())
+
+    def __len__(self):
+        if self._actors is None:
+            self.build()
+        return len(self._actors)
+
+    def query(self, position, radius):
+        """Traffic lights closer than `radius` to `position` (x, y, z)."""
+        if self._grid is None:
+            self.build()
+        if not self._actors:
+            return []
+        position = np.asarray(position, dtype=np.float64)
+        reach = int(math.ceil(radius / self.cell_size))
+        cx = int(math.floor(position[0] / self.cell_size))
+        cy = int(math.floor(position[1] / self.cell_size))
+        candidates = [self._grid[(x, y)]
+                      for x in range(cx - reach, cx + reach + 1)
+                      for y in range(cy - reach, cy + reach + 1)
+                      if (x, y) in self._grid]
+        if not candidates:
+            return []
+        candidates = np.concatenate(candidates)
+        distances = np.linalg.norm(self._positions[candidates] - position, axis=1)
+        return [self._actors[i] for i in candidates[distances < radius].tolist()]
@@ -0,0 +1,175 @@
+import logging
+import random
+import numpy as np
+import carla
+
+# ==============================================================================
+# -- TrafficPool ---------------------------------------------------------------
+# ==============================================================================
+
+# Vehicles prone to accidents, left out with safe=True.
+UNSAFE_VEHICLES = ('isetta', 'carlacola', 'cybertruck', 't2')
+
+
+class TrafficPool(object):
+    """
+    NPC vehicles and walkers living in the simulator process and kept alive across ego restarts.
+    Actors are spawned, moved and destroyed in batches with apply_batch_sync; the caller ticks the
+    world. Walker controllers are started on the tick after they spawn (see on_tick).
+    """
+    def __init__(self, client, map_cache, world_state, filterv='vehicle.*', filterw='walker.pedestrian.*',
+                 safe=False, clearance=5.0, tm_port=8000):
+        self.client = client
+        self.tm_port = tm_port
+        self.map_cache = map_cache
+        self.world = map_cache.world
+        self.world_state = world_state
+        self.clearance = clearance
+        blueprints = map_cache.filter_blueprints(filterv)
+        if safe:
+            blueprints = [x for x in blueprints if int(x.get_attribute('number_of_wheels')) == 4]
+            blueprints = [x for x in blueprints if not x.id.endswith(UNSAFE_VEHICLES)]
+        self.vehicle_blueprints = list(blueprints)
+        self.walker_blueprints = map_cache.filter_blueprints(filterw)
+        self.controller_blueprint = map_cache.find_blueprint('controller.ai.walker')
+        self.spawn_points = map_cache.get_spawn_points()
+        self._spawn_positions = np.array([(t.location.x, t.location.y, t.location.z)
+                                          for t in self.spawn_points]).reshape(-1, 3)
+        self.vehicles = []
+        # (walker id, controller id)
+        self.walkers = []
+        # (controller id, max speed) waiting for their first tick
+        self._pending_controllers = []
+        traffic_manager = client.get_trafficmanager(tm_port)
+        traffic_manager.set_global_distance_to_leading_vehicle(3.0)
+        traffic_manager.global_percentage_speed_difference(30.0)
+        self.world.set_pedestrians_cross_factor(0.0)
+
+    def apply_batch(self, batch):
+        """Runs a batch without ticking, returns the ids of the actors it created or touched successfully."""
+        actor_ids = []
+        for response in self.client.apply_batch_sync(batch, False):
+            if response.error:
+                logging.debug(response.error)
+            else:
+                actor_ids.append(response.actor_id)
+        return actor_ids
+
+    def free_spawn_points(self, count):
+        """Up to `count` spawn points with no vehicle within the clearance, in random order."""
+        occupied = self.world_state.positions[self.world_state.type_mask('vehicle.')]
+        if len(occupied) and len(self._spawn_positions):
+            distances = np.linalg.norm(self._spawn_positions[:, None, :] - occupied[None, :, :], axis=2)
+            free = np.flatnonzero(distances.min(axis=1) > self.clearance).tolist()
+        else:
+            free = list(range(len(self.spawn_points)))
+        random.shuffle(free)
+        return [self.spawn_points[i] for i in free[:count]]
+
+    def prune(self):
+        """Forgets actors that no longer exist, the controllers of dead walkers are stopped and destroyed."""
+        actors = self.world.get_actors(self.vehicles + [x for walker in self.walkers for x in walker])
+        actors = dict((actor.id, actor) for actor in actors)
+        self.vehicles = [x for x in self.vehicles if x in actors]
+        orphans = [c for w, c in self.walkers if w not in actors and c in actors]
+        self.walkers = [(w, c) for w, c in self.walkers if w in actors]
+        if orphans:
+            pending = set(c for c, _ in self._pending_controllers)
+            for controller in orphans:
+                if controller not in pending:
+                    actors[controller].stop()
+            self._pending_controllers = [(c, speed) for c, speed in self._pending_controllers if c not in orphans]
+            self.apply_batch([carla.command.DestroyActor(x) for x in orphans])
+            logging.debug('destroyed %d controllers of dead walkers', len(orphans))
+
+    def top_up(self, num_vehicles, num_walkers):
+        """Spawns only the actors missing to reach the requested counts."""
+        self.prune()
+        if len(self.vehicles) < num_vehicles:
+            self.spawn_vehicles(num_vehicles - len(self.vehicles))
+        if len(self.walkers) < num_walkers:
+            self.spawn_walkers(num_walkers - len(self.walkers))
+
+    def spawn_vehicles(self, count):
+        spawn_points = self.free_spawn_points(count)
+        if len(spawn_points) < count:
+            logging.warning('requested %d vehicles, but could only find %d free spawn points', count, len(spawn_points))
+        batch = []
+        for transform in spawn_points:
+            blueprint = random.choice(self.vehicle_blueprints)
+            if blueprint.has_attribute('color'):
+                color = random.choice(blueprint.get_attribute('color').recommended_values)
+                blueprint.set_attribute('color', color)
+            if blueprint.has_attribute('driver_id'):
+                driver_id = random.choice(blueprint.get_attribute('driver_id').recommended_values)
+                blueprint.set_attribute('driver_id', driver_id)
+            blueprint.set_attribute('role_name', 'autopilot')
+            batch.append(carla.command.SpawnActor(blueprint, transform).then(
+                carla.command.SetAutopilot(carla.command.FutureActor, True, self.tm_port)))
+        self.vehicles += self.apply_batch(batch)
+
+    def spawn_walkers(self, count):
+        batch = []
+        speeds = []
+        for _ in range(count):
+            location = self.map_cache.get_random_nav_location()
+            if location is None:
+                continue
+            walker_bp = random.choice(self.walker_blueprints)
+            if walker_bp.has_attribute('is_invincible'):
+                walker_bp.set_attribute('is_invincible', 'false')
+            if walker_bp.has_attribute('speed'):
+                speeds.append(float(walker_bp.get_attribute('speed').recommended_values[1]))
+            else:
+                speeds.append(0.0)
+            batch.append(carla.command.SpawnActor(walker_bp, carla.Transform(location)))
+        walkers = []
+        walker_speeds = []
+        for response, speed in zip(self.client.apply_batch_sync(batch, False), speeds):
+            if response.error:
+                logging.debug(response.error)
+            else:
+                walkers.append(response.actor_id)
+                walker_speeds.append(speed)
+        batch = [carla.command.SpawnActor(self.controller_blueprint, carla.Transform(), walker) for walker in walkers]
+        for walker, speed, response in zip(walkers, walker_speeds, self.client.apply_batch_sync(batch, False)):
+            if response.error:
+                logging.debug(response.error)
+                self.apply_batch([carla.command.DestroyActor(walker)])
+            else:
+                self.walkers.append((walker, response.actor_id))
+                self._pending_controllers.append((response.actor_id, speed))
+
+    def on_tick(self):
+        """Starts the walker controllers spawned before the last tick."""
+        if not self._pending_controllers:
+            return
+        speeds = dict(self._pending_controllers)
+        self._pending_controllers = []
+        for controller in self.world.get_actors(list(speeds)):
+            controller.start()
+            controller.go_to_location(self.map_cache.get_random_nav_location())
+            controller.set_max_speed(speeds[controller.id])
+
+    def relocate(self, actor_ids):
+        """Moves vehicles of the pool, e.g. the ones blocking the ego, to free spawn points."""
+        vehicles = set(self.vehicles)
+        actor_ids = [x for x in actor_ids if x in vehicles]
+        apply_velocity = getattr(carla.command, 'ApplyTargetVelocity', None) or carla.command.ApplyVelocity
+        batch = []
+        for actor_id, transform in zip(actor_ids, self.free_spawn_points(len(actor_ids))):
+            batch.append(carla.command.ApplyTransform(actor_id, transform))
+            batch.append(apply_velocity(actor_id, carla.Vector3D()))
+        self.apply_batch(batch)
+
+    def destroy(self):
+        controllers = [c for _, c in self.walkers]
+        pending = set(c for c, _ in self._pending_controllers)
+        for controller in self.world.get_actors([c for c in controllers if c not in pending]):
+            controller.stop()
+        actor_ids = self.vehicles + controllers + [w for w, _ in self.walkers]
+        self.apply_batch([carla.command.DestroyActor(x) for x in actor_ids])
+        logging.info('destroyed %d vehicles and %d walkers', len(self.vehicles), len(self.walkers))
+        self.vehicles = []
+        self.walkers = []
+        self._pending_controllers = []
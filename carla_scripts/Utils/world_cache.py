@@ -0,0 +1,128 @@
+import os
+import json
+import random
+import logging
+import threading
+import carla
+from carla_scripts.Utils.traffic_light_index import TrafficLightIndex
+from carla_scripts.Utils.blueprint_registry import get_blueprint_registry
+
+# ==============================================================================
+# -- World and map cache -------------------------------------------------------
+# ==============================================================================
+
+# Random navigation locations sampled once per map, walkers pick from them.
+NAV_SAMPLES = 1000
+# Destroyed when a loaded world is reused, controllers first so walkers are stopped before they go.
+LEFTOVER_TYPES = ('controller.', 'sensor.', 'vehicle.', 'walker.')
+
+
+def get_map_name(name):
+    """'/Game/Carla/Maps/Town03' and 'Town03' both give 'Town03'."""
+    return name.rsplit('/', 1)[-1]
+
+
+def load_map(client, map_name):
+    """
+    Returns (world, map) on `map_name`. The world already loaded by the server is reused when it is on that
+    map, after destroying the actors a previous client left in it, instead of reloading it.
+    """
+    world = client.get_world()
+    world_map = world.get_map()
+    if get_map_name(world_map.name) != get_map_name(map_name):
+        world = client.load_world(map_name)
+        return world, world.get_map()
+    leftovers = [actor for actor in world.get_actors() if actor.type_id.startswith(LEFTOVER_TYPES)]
+    if leftovers:
+        leftovers.sort(key=lambda actor: LEFTOVER_TYPES.index(actor.type_id.split('.')[0] + '.'))
+        for actor in leftovers:
+            if actor.type_id.startswith('controller.'):
+                actor.stop()
+        client.apply_batch_sync([carla.command.DestroyActor(actor.id) for actor in leftovers], False)
+        logging.info('Reusing %s, destroyed %d leftover actors', world_map.name, len(leftovers))
+    return world, world_map
+
+
+class MapCache(object):
+    """
+    Static data of the map of a world: spawn points, navigation locations, the traffic light index and
+    filtered blueprint lists (from the world's BlueprintRegistry). With `cache_dir`, spawn points and
+    navigation locations are also kept in <cache_dir>/<map>.json and shared by later runs.
+    """
+    def __init__(self, world, world_map, cache_dir=None):
+        self.world = world
+        self.map = world_map
+        self.name = get_map_name(world_map.name)
+        self.cache_dir = cache_dir
+        self.traffic_lights = TrafficLightIndex(world)
+        self._spawn_points = None
+        self._nav_locations = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def get_path(self):
+        return os.path.join(self.cache_dir, '%s.json' % self.name) if self.cache_dir else None
+
+    def load(self):
+        path = self.get_path()
+        if path is None or not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            data = json.load(f)
+        self._spawn_points = [carla.Transform(carla.Location(x, y, z), carla.Rotation(pitch, yaw, roll))
+                              for x, y, z, pitch, yaw, roll in data['spawn_points']]
+        if data.get('nav_locations'):
+            self._nav_locations = [carla.Location(x, y, z) for x, y, z in data['nav_locations']]
+
+    def save(self):
+        """Called with the lock held."""
+        path = self.get_path()
+        if path is None:
+            return
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        data = {
+            'map': self.name,
+            'spawn_points': [(t.location.x, t.location.y, t.location.z, t.rotation.pitch, t.rotation.yaw,
+                              t.rotation.roll) for t in self._spawn_points or []],
+            'nav_locations': [(l.x, l.y, l.z) for l in self._nav_locations or []],
+        }
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+    def get_spawn_points(self):
+        """A new list every call, callers may shuffle it."""
+        with self._lock:
+            if self._spawn_points is None:
+                self._spawn_points = self.map.get_spawn_points()
+                if self.cache_dir:
+                    self.save()
+        return list(self._spawn_points)
+
+    def get_random_nav_location(self):
+        with self._lock:
+            if self._nav_locations is None:
+                locations = (self.world.get_random_location_from_navigation() for _ in range(NAV_SAMPLES))
+                self._nav_locations = [l for l in locations if l is not None]
+                if self.cache_dir:
+                    self.save()
+        return random.choice(self._nav_locations) if self._nav_locations else None
+
+    def filter_blueprints(self, pattern):
+        return get_blueprint_registry(self.world).filter(pattern)
+
+    def find_blueprint(self, blueprint_id):
+        return get_blueprint_registry(self.world).get(blueprint_id)
+
+
+_map_caches = {}
+_map_caches_lock = threading.Lock()
+
+
+def get_map_cache(world, world_map, cache_dir=None):
+    """One MapCache per world (episode) and process."""
+    with _map_caches_lock:
+        if world.id not in _map_caches:
+            _map_caches[world.id] = MapCache(world, world_map, cache_dir)
+        return _map_caches[world.id]
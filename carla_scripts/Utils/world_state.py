@@ -0,0 +1,98 @@
+import numpy as np
+
+# ==============================================================================
+# -- WorldState ----------------------------------------------------------------
+# ==============================================================================
+
+
+class WorldState(object):
+    """
+    Positions and velocities of every actor for the current tick, built from a single
+    world.get_snapshot() into NumPy arrays. Actor handles (and their type ids) are cached and
+    only fetched from the server for actors not seen before.
+    """
+    def __init__(self, world):
+        self.world = world
+        self.frame = None
+        self.elapsed_seconds = None
+        self.snapshot = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.positions = np.empty((0, 3))
+        self.velocities = np.empty((0, 3))
+        self._rows = {}
+        self._actors = {}
+        self._masks = {}
+
+    def update(self):
+        snapshot = self.world.get_snapshot()
+        self.snapshot = snapshot
+        self.frame = snapshot.frame
+        self.elapsed_seconds = snapshot.timestamp.elapsed_seconds
+        n = len(snapshot)
+        ids = np.empty(n, dtype=np.int64)
+        positions = np.empty((n, 3))
+        velocities = np.empty((n, 3))
+        for i, actor_snapshot in enumerate(snapshot):
+            location = actor_snapshot.get_transform().location
+            velocity = actor_snapshot.get_velocity()
+            ids[i] = actor_snapshot.id
+            positions[i] = (location.x, location.y, location.z)
+            velocities[i] = (velocity.x, velocity.y, velocity.z)
+        self.positions = positions
+        self.velocities = velocities
+        if np.array_equal(ids, self.ids):
+            # Same actors as the previous tick, the row lookup and type masks still hold.
+            return
+        self.ids = ids
+        self._rows = dict((actor_id, row) for row, actor_id in enumerate(ids.tolist()))
+        self._masks = {}
+        unknown = [actor_id for actor_id in self._rows if actor_id not in self._actors]
+        if unknown:
+            for actor in self.world.get_actors(unknown):
+                self._actors[actor.id] = actor
+        if len(self._actors) > len(self._rows):
+            self._actors = dict((actor_id, actor) for actor_id, actor in self._actors.items()
+                                if actor_id in self._rows)
+
+    def get_actor(self, actor_id):
+        return self._actors.get(actor_id)
+
+    def get_position(self, actor_id):
+        row = self._rows.get(actor_id)
+        return None if row is None else self.positions[row]
+
+    def get_velocity(self, actor_id):
+        row = self._rows.get(actor_id)
+        return None if row is None else self.velocities[row]
+
+    def type_mask(self, type_prefix):
+        """Boolean mask of the actors whose type id starts with `type_prefix`, cached for the tick."""
+        if type_prefix not in self._masks:
+            actors = self._actors
+            self._masks[type_prefix] = np.array(
+                [actor_id in actors and actors[actor_id].type_id.startswith(type_prefix)
+                 for actor_id in self.ids.tolist()], dtype=bool)
+        return self._masks[type_prefix]
+
+    def count(self, type_prefix):
+        return int(np.count_nonzero(self.type_mask(type_prefix)))
+
+    def distances(self, position, type_prefix=None, exclude_id=None):
+        """Returns (distances, actor ids) of the matching actors from `position`, unsorted."""
+        mask = self.type_mask(type_prefix) if type_prefix else np.ones(len(self.ids), dtype=bool)
+        if exclude_id is not None:
+            mask = mask & (self.ids != exclude_id)
+        return np.linalg.norm(self.positions[mask] - position, axis=1), self.ids[mask]
+
+    def nearest(self, position, type_prefix=None, exclude_id=None, max_distance=None):
+        """Returns (distances, actor ids) of the matching actors sorted by distance from `position`."""
+        distances, ids = self.distances(position, type_prefix, exclude_id)
+        if max_distance is not None:
+            within = distances <= max_distance
+            distances, ids = distances[within], ids[within]
+        order = np.argsort(distances)
+        return distances[order], ids[order]
+
+    def closest_distance(self, position, type_prefix=None, exclude_id=None):
+        distances, _ = self.distances(position, type_prefix, exclude_id)
+        return float(distances.min()) if len(distances) else None
@@ -0,0 +1,454 @@
+"""
+Runs a matrix of headless data generation jobs (map x sector x car x weather) across several CARLA
+servers, retries failed jobs and merges every job's clips into one output tree.
+
+    python3 orchestrator.py --ports 2000 2002 2004 --maps 1 3 --sectors main rear --weathers ClearNoon WetNoon \
+        --clips 2 --clip_interval 60 --output_dir output/batch
+
+Every job writes to <output_dir>/jobs/<job_id> and, once it succeeded, its clips are moved to
+<output_dir>/<car_name>/<sector>/<clip>, listed in <output_dir>/clips.json and indexed in
+<output_dir>/index.sqlite (see Dataset/index.py). Job states are kept in
+<output_dir>/jobs.json, so running the same command again only runs the jobs that did not succeed.
+Servers are not launched here, start one per port first. --fake runs the jobs without any server, and
+--fake_server runs run_headless.py on the fake server of benchmarks/fake_carla.py. Every server gets its
+own Traffic Manager, on its port + --tm_port_offset.
+"""
+import sys
+import os
+sys.path.append(os.getcwd() + "/../")
+import argparse
+import itertools
+import json
+import logging
+import queue
+import random
+import shutil
+import subprocess
+import threading
+import time
+from carla_scripts.Dataset.manifest import ClipManifest, MANIFEST_FILE
+from carla_scripts.Dataset.index import DatasetIndex
+
+JOBS_FILE = 'jobs.json'
+# Work directories of the jobs, <output_dir>/jobs/<job_id>, never indexed.
+JOBS_DIR = 'jobs'
+CLIPS_FILE = 'clips.json'
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobError(Exception):
+    pass
+
+
+class Job(object):
+    def __init__(self, map_id, sector, car_name, weather, clips, repeat=0):
+        self.map_id = map_id
+        self.sector = sector
+        self.car_name = car_name
+        self.weather = weather
+        self.clips = clips
+        self.repeat = repeat
+        self.job_id = '%s_map%d_%s_%s_%d' % (car_name, map_id, sector, weather or 'rand', repeat)
+        self.state = PENDING
+        self.attempts = 0
+        self.errors = []
+        self.endpoint = None
+
+    def get_run_id(self):
+        """Simulation id of the current attempt, clips of every job and attempt get distinct names."""
+        return '%s_a%d' % (self.job_id, self.attempts)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'map_id': self.map_id,
+            'sector': self.sector,
+            'car_name': self.car_name,
+            'weather': self.weather,
+            'clips': self.clips,
+            'repeat': self.repeat,
+            'state': self.state,
+            'attempts': self.attempts,
+            'errors': self.errors,
+            'endpoint': self.endpoint,
+        }
+
+
+def job_matrix(maps, sectors, cars, weathers, clips, repeats=1):
+    return [Job(map_id, sector, car_name, weather, clips, repeat)
+            for car_name, map_id, sector, weather, repeat
+            in itertools.product(cars, maps, sectors, weathers, range(repeats))]
+
+
+# ==============================================================================
+# -- Job runners ---------------------------------------------------------------
+# ==============================================================================
+
+
+class HeadlessRunner(object):
+    """
+    Runs a job as a run_headless.py process against one server, whose Traffic Manager listens on the server
+    port + `tm_port_offset`. With fake_server, the process runs on benchmarks/fake_carla.py instead.
+    """
+    def __init__(self, clip_interval, timeout=None, extra_args=(), tm_port_offset=6000, fake_server=False):
+        self.clip_interval = clip_interval
+        self.timeout = timeout
+        self.extra_args = list(extra_args)
+        self.tm_port_offset = tm_port_offset
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        if fake_server:
+            self.script = os.path.join(self.script_dir, '..', 'benchmarks', 'fake_headless.py')
+        else:
+            self.script = 'run_headless.py'
+
+    def run(self, job, endpoint, job_dir):
+        host, port = endpoint
+        command = [sys.executable, self.script,
+                   '--host', host, '--port', str(port), '--tm_port', str(port + self.tm_port_offset),
+                   '--map_id', str(job.map_id), '--sector', job.sector, '--car_name', job.car_name,
+                   '--clip_interval', str(self.clip_interval), '--max_clips', str(job.clips),
+                   '--id', job.get_run_id(), '--output_dir', os.path.abspath(job_dir),
+                   # Clips are indexed once merged, an index in the job directory would be left behind.
+                   '--no_index']
+        if job.weather:
+            command += ['--weather', job.weather]
+        command += self.extra_args
+        try:
+            process = subprocess.run(command, cwd=self.script_dir, timeout=self.timeout,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except subprocess.TimeoutExpired:
+            raise JobError('timed out after %ss' % self.timeout)
+        if process.returncode != 0:
+            stderr = process.stderr.decode('utf-8', 'replace').strip().splitlines()
+            raise JobError('exit code %d: %s' % (process.returncode, stderr[-1] if stderr else ''))
+
+
+class FakeJobRunner(object):
+    """
+    Stand-in for a server and run_headless.py: writes `clips` clip directories holding only a manifest,
+    and fails a job attempt with probability `failure_rate`.
+    """
+    def __init__(self, duration=0.01, failure_rate=0.0, seed=None):
+        self.duration = duration
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def run(self, job, endpoint, job_dir):
+        time.sleep(self.duration)
+        with self._lock:
+            fail = self._random.random() < self.failure_rate
+        if fail:
+            raise JobError('fake failure on %s:%d' % endpoint)
+        for i in range(job.clips):
+            # Named like the simulator names the clips of a run.
+            clip_name = 'Town%02d_%s' % (job.map_id, job.get_run_id())
+            if i:
+                clip_name += '_%d' % (i + 1)
+            clip_dir = os.path.join(job_dir, clip_name)
+            os.makedirs(clip_dir)
+            manifest = ClipManifest(clip_name, job.car_name, job.sector, '%s-fake' % job.car_name, [], {},
+                                    map_name='Town%02d' % job.map_id)
+            manifest.set_weather(job.weather or 'Clear Noon', 0)
+            manifest.save(clip_dir)
+
+
+# ==============================================================================
+# -- Orchestrator --------------------------------------------------------------
+# ==============================================================================
+
+
+class Orchestrator(object):
+    """
+    One worker thread per server endpoint pulls jobs from a shared queue. A failed job goes back to the
+    queue, so another server can pick it up, until it used `retries` extra attempts. An endpoint failing
+    `max_endpoint_failures` jobs in a row is considered down and its worker stops.
+    """
+    def __init__(self, jobs, endpoints, runner, output_dir, retries=2, max_endpoint_failures=3):
+        self.jobs = jobs
+        self.endpoints = endpoints
+        self.runner = runner
+        self.output_dir = output_dir
+        self.retries = retries
+        self.max_endpoint_failures = max_endpoint_failures
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._remaining = 0
+        self._workers_alive = 0
+        self._done = threading.Event()
+
+    def job_dir(self, job):
+        return os.path.join(self.output_dir, JOBS_DIR, job.job_id)
+
+    def load_states(self):
+        """
+        Keeps the jobs already done by a previous run with the same output directory. Attempts carry on
+        counting, so the clips of a new attempt never take the names of earlier ones.
+        """
+        path = os.path.join(self.output_dir, JOBS_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r') as f:
+            states = dict((d['job_id'], d) for d in json.load(f))
+        for job in self.jobs:
+            if job.job_id in states:
+                job.attempts = states[job.job_id]['attempts']
+                if states[job.job_id]['state'] == DONE:
+                    job.state = DONE
+
+    def save_states(self):
+        path = os.path.join(self.output_dir, JOBS_FILE)
+        with self._lock:
+            states = [job.to_dict() for job in self.jobs]
+        # Workers and the main thread save concurrently, they share the temporary file.
+        with self._save_lock:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(states, f, indent=2)
+            os.replace(path + '.tmp', path)
+
+    def run(self):
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        self.load_states()
+        pending = [job for job in self.jobs if job.state != DONE]
+        self._remaining = len(pending)
+        for job in pending:
+            job.state = PENDING
+            self._queue.put(job)
+        if pending:
+            self._workers_alive = len(self.endpoints)
+            workers = [threading.Thread(target=self.worker, args=(endpoint,)) for endpoint in self.endpoints]
+            for worker in workers:
+                worker.daemon = True
+                worker.start()
+            self._done.wait()
+        self.save_states()
+        self.merge()
+        self.save_states()
+        self.update_index()
+        return [job for job in self.jobs if job.state != DONE]
+
+    def worker(self, endpoint):
+        failures = 0
+        try:
+            while not self._done.is_set() and failures < self.max_endpoint_failures:
+                try:
+                    job = self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if self.run_job(job, endpoint):
+                    failures = 0
+                else:
+                    failures += 1
+            if failures >= self.max_endpoint_failures:
+                logging.error('%s:%d failed %d jobs in a row, stopped using it', endpoint[0], endpoint[1], failures)
+        finally:
+            with self._lock:
+                self._workers_alive -= 1
+                if not self._workers_alive:
+                    self._done.set()
+
+    def run_job(self, job, endpoint):
+        job_dir = self.job_dir(job)
+        with self._lock:
+            job.state = RUNNING
+            job.attempts += 1
+            job.endpoint = '%s:%d' % endpoint
+        # Attempts start from scratch, so a failed attempt never leaves partial clips behind.
+        if os.path.exists(job_dir):
+            shutil.rmtree(job_dir)
+        os.makedirs(job_dir)
+        try:
+            self.runner.run(job, endpoint, job_dir)
+            ok = True
+        except Exception as e:
+            ok = False
+            error = '%s: %s' % (job.endpoint, e)
+        with self._lock:
+            if ok:
+                job.state = DONE
+                self._remaining -= 1
+                logging.info('%s done on %s (attempt %d)', job.job_id, job.endpoint, job.attempts)
+            elif job.attempts <= self.retries:
+                job.state = PENDING
+                job.errors.append(error)
+                logging.warning('%s failed, retrying: %s', job.job_id, error)
+                self._queue.put(job)
+            else:
+                job.state = FAILED
+                job.errors.append(error)
+                self._remaining -= 1
+                logging.error('%s failed after %d attempts: %s', job.job_id, job.attempts, error)
+            if not self._remaining:
+                self._done.set()
+        self.save_states()
+        return ok
+
+    def merge(self):
+        """
+        Moves the clips of the jobs that are done to <output_dir>/<car_name>/<sector>/<clip> and indexes
+        every merged clip manifest in clips.json, keyed by its path. A job with a clip whose target already
+        exists is not merged and marked failed, so it runs again on the next run.
+        """
+        clips_path = os.path.join(self.output_dir, CLIPS_FILE)
+        clips = {}
+        if os.path.exists(clips_path):
+            with open(clips_path, 'r') as f:
+                clips = dict((c['path'], c) for c in json.load(f))
+        for job in self.jobs:
+            job_dir = self.job_dir(job)
+            if job.state != DONE or not os.path.isdir(job_dir):
+                continue
+            moves = []
+            for clip_name in sorted(os.listdir(job_dir)):
+                clip_dir = os.path.join(job_dir, clip_name)
+                if not os.path.exists(os.path.join(clip_dir, MANIFEST_FILE)):
+                    continue
+                manifest = ClipManifest.load(clip_dir)
+                target = os.path.join(self.output_dir, manifest.car_name, manifest.sector, clip_name)
+                moves.append((clip_name, clip_dir, target, manifest))
+            taken = [target for _, _, target, _ in moves if os.path.exists(target)]
+            if taken:
+                with self._lock:
+                    job.state = FAILED
+                    job.errors.append('merge: %s already exists' % ', '.join(taken))
+                logging.error('%s not merged, %s already exists', job.job_id, ', '.join(taken))
+                continue
+            for clip_name, clip_dir, target, manifest in moves:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.rename(clip_dir, target)
+                path = os.path.relpath(target, self.output_dir)
+                clips[path] = {
+                    'clip_name': clip_name,
+                    'path': path,
+                    'job_id': job.job_id,
+                    'car_name': manifest.car_name,
+                    'sector': manifest.sector,
+                    'rig_version': manifest.rig_version,
+                    'map': manifest.map_name,
+                    'weather': manifest.weather,
+                }
+            if not os.listdir(job_dir):
+                os.rmdir(job_dir)
+        with open(clips_path + '.tmp', 'w') as f:
+            json.dump(sorted(clips.values(), key=lambda c: c['path']), f, indent=2)
+        os.replace(clips_path + '.tmp', clips_path)
+        return clips
+
+    def update_index(self):
+        """
+        Brings <output_dir>/index.sqlite up to date with the merged clips. Clips left in the job directories,
+        of failed jobs or not merged, are not part of the dataset.
+        """
+        index = DatasetIndex(self.output_dir, exclude=(JOBS_DIR,))
+        try:
+            updated = index.update()
+        finally:
+            index.close()
+        logging.info('indexed %s, %d directories or clip files updated', index.db_path, updated)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument(
+        '--host',
+        default='127.0.0.1',
+        help='IP of the servers (default: 127.0.0.1)')
+    argparser.add_argument(
+        '--ports',
+        nargs='+',
+        default=[2000],
+        type=int,
+        help='Port of every server, one job runs per server at a time (default: 2000)')
+    argparser.add_argument(
+        '--maps',
+        nargs='+',
+        default=[0],
+        type=int,
+        help='Map indices (default: 0)')
+    argparser.add_argument(
+        '--sectors',
+        nargs='+',
+        default=['main'],
+        help='Sectors (default: main)')
+    argparser.add_argument(
+        '--cars',
+        nargs='+',
+        default=['Alfred'],
+        help='ME car setups (default: Alfred)')
+    argparser.add_argument(
+        '--weathers',
+        nargs='+',
+        default=[None],
+        help='Weather presets, e.g. ClearNoon (default: random weather)')
+    argparser.add_argument(
+        '--clips',
+        default=1,
+        type=int,
+        help='Clips per job (default: 1)')
+    argparser.add_argument(
+        '--repeats',
+        default=1,
+        type=int,
+        help='Jobs per combination of the matrix (default: 1)')
+    argparser.add_argument(
+        '-c', '--clip_interval',
+        default=60,
+        type=int,
+        help='Clip length in seconds (default: 60)')
+    argparser.add_argument(
+        '--output_dir',
+        required=True,
+        help='Root of the merged output')
+    argparser.add_argument(
+        '--retries',
+        default=2,
+        type=int,
+        help='Extra attempts of a failed job (default: 2)')
+    argparser.add_argument(
+        '--job_timeout',
+        default=None,
+        type=float,
+        help='Seconds before a job attempt is killed (default: no limit)')
+    argparser.add_argument(
+        '--fake',
+        action='store_true',
+        help='Run the jobs with a fake runner, without any server')
+    argparser.add_argument(
+        '--fake_failure_rate',
+        default=0.0,
+        type=float,
+        help='With --fake, probability of a job attempt failing (default: 0)')
+    argparser.add_argument(
+        '--fake_server',
+        action='store_true',
+        help='Run run_headless.py on the fake server of benchmarks/fake_carla.py, without any server')
+    argparser.add_argument(
+        '--tm_port_offset',
+        default=6000,
+        type=int,
+        help='Traffic Manager port of every server, relative to its port (default: 6000)')
+    args, extra_args = argparser.parse_known_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+
+    jobs = job_matrix(args.maps, args.sectors, args.cars, args.weathers, args.clips, args.repeats)
+    endpoints = [(args.host, port) for port in args.ports]
+    if args.fake:
+        runner = FakeJobRunner(failure_rate=args.fake_failure_rate)
+    else:
+        # Options not known here are passed on to run_headless.py.
+        runner = HeadlessRunner(args.clip_interval, timeout=args.job_timeout, extra_args=extra_args,
+                                tm_port_offset=args.tm_port_offset, fake_server=args.fake_server)
+    failed = Orchestrator(jobs, endpoints, runner, args.output_dir, retries=args.retries).run()
+    logging.info('%d jobs done, %d failed', len(jobs) - len(failed), len(failed))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
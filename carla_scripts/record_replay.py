@@ -0,0 +1,173 @@
+"""
+Record once, render many. The record phase drives the ego and the traffic without rendering and without
+ME sensors, and saves the drive with the CARLA recorder. The render phase replays the recording once per
+sector, attaching only the ME sensors to the replayed ego, so an extra sector or rig costs no traffic
+simulation and sectors can be rendered in parallel on several servers.
+
+    python3 record_replay.py record --map_id 3 --max_frames 3000 --recording /data/rec/Town03_run1.log
+    python3 record_replay.py render --recording /data/rec/Town03_run1.log --sectors main rear --port 2002
+
+The recording path is read and written by the server. Next to it, <recording>.json keeps what the
+recorder does not: the map, the weather, the ego role name and the number of recorded frames. Every sector
+is rendered into a clip named after the recording, in <output_dir>/<car_name>/<sector> (output/<car_name>/<sector>
+by default), and indexed in <output_dir>/index.sqlite.
+"""
+import sys
+import os
+sys.path.append(os.getcwd() + "/../")
+import json
+import logging
+import time
+from carla_scripts.simulator import Simulator, find_weather_presets
+from carla_scripts.Cameras import MECameraManager
+from carla_scripts.Utils import get_carla_client, HeadlessHUD
+from carla_scripts.Utils.arguments import get_argparser
+from carla_scripts.Utils.world_cache import load_map
+
+
+def sidecar_path(recording):
+    return recording + '.json'
+
+
+def record(args, client):
+    simulator = None
+    try:
+        args.me_sensors = False
+        # The replayed ego is found by role name and must stay the same actor for the whole drive.
+        args.full_restart = False
+        hud = HeadlessHUD(args.width, args.height)
+        simulator = Simulator(client, hud, args)
+        # The recorder does not keep the weather, pin it so the sidecar holds the one weather of the drive.
+        simulator.weather = simulator.get_weather_name()
+        simulator.set_no_rendering()
+        client.start_recorder(args.recording)
+        first_frame = simulator.world.tick()
+        frame = first_frame
+        while frame - first_frame < args.max_frames:
+            frame = simulator.tick(None) or frame
+        client.stop_recorder()
+        sidecar = {
+            'recording': args.recording,
+            'map': simulator.map.name,
+            'weather': simulator.weather,
+            'role_name': args.rolename,
+            'fixed_delta_seconds': simulator.world.get_settings().fixed_delta_seconds,
+            'frames': frame - first_frame,
+        }
+        with open(sidecar_path(args.recording), 'w') as f:
+            json.dump(sidecar, f, indent=2)
+        logging.info('recorded %d frames of %s to %s', sidecar['frames'], sidecar['map'], args.recording)
+    finally:
+        if simulator is not None:
+            simulator.destroy()
+            simulator.destroy_spawn()
+            simulator.close_me_sensor()
+
+
+def set_sync_mode(world, synchronous_mode, fixed_delta_seconds=None):
+    settings = world.get_settings()
+    settings.synchronous_mode = synchronous_mode
+    settings.fixed_delta_seconds = fixed_delta_seconds
+    world.apply_settings(settings)
+
+
+def find_ego(world, role_name):
+    for actor in world.get_actors().filter('vehicle.*'):
+        if actor.attributes.get('role_name') == role_name:
+            return actor
+    return None
+
+
+def render_sector(args, client, world, sidecar, sector):
+    client.replay_file(sidecar['recording'], 0, 0, 0)
+    world.tick()
+    ego = find_ego(world, sidecar['role_name'])
+    if ego is None:
+        raise RuntimeError('No vehicle with role name %r in %s' % (sidecar['role_name'], sidecar['recording']))
+    clip_name = os.path.splitext(os.path.basename(sidecar['recording']))[0]
+    # Every sector renders the same clip name, each into <output_dir>/<car>/<sector> of its own.
+    output_dir = os.path.join(args.output_dir, args.car_name, sector) if args.output_dir else None
+    me_sensor_manager = MECameraManager(world, ego, simulation_id=clip_name, sector=sector, car_name=args.car_name,
+                                        map_name=sidecar['map'], output_dir=output_dir, index_root=args.output_dir,
+                                        writer_threads=args.writer_threads, writer_queue_size=args.writer_queue_size,
+                                        writer_policy=args.writer_policy, assembler_timeout=args.assembler_timeout,
+                                        write_partial_frames=not args.drop_partial_frames,
+                                        output_format=args.output_format, clip_layout=args.clip_layout,
+                                        image_codec=args.image_codec, depth_codec=args.depth_codec,
+                                        full_frame_metadata=args.full_frame_metadata,
+                                        capture_every=args.capture_every, capture_timeout=args.capture_timeout,
+                                        client=client)
+    try:
+        me_sensor_manager.set_weather(sidecar['weather'])
+        me_sensor_manager.init_sensors()
+        start = time.time()
+        for _ in range(sidecar['frames']):
+            frame = world.tick()
+            if me_sensor_manager.sync_capture is not None:
+                me_sensor_manager.capture(frame)
+        logging.info('rendered sector %s of %s in %.1f s, writer %s', sector, clip_name, time.time() - start,
+                     me_sensor_manager.frame_writer.get_stats())
+    finally:
+        me_sensor_manager.close()
+        client.stop_replayer(False)
+
+
+def render(args, client):
+    with open(sidecar_path(args.recording), 'r') as f:
+        sidecar = json.load(f)
+    world, _ = load_map(client, sidecar['map'])
+    try:
+        set_sync_mode(world, True, sidecar['fixed_delta_seconds'])
+        world.set_weather(dict((name.replace(' ', ''), weather)
+                               for weather, name in find_weather_presets())[sidecar['weather']])
+        for sector in args.sectors or [args.sector]:
+            render_sector(args, client, world, sidecar, sector)
+    finally:
+        set_sync_mode(world, False)
+
+
+def main():
+    argparser = get_argparser('Record a drive once, render ME sensors from it many times')
+    argparser.add_argument(
+        'phase',
+        choices=['record', 'render'],
+        help='Record the drive, or render ME sensors from a recording')
+    argparser.add_argument(
+        '--recording',
+        required=True,
+        help='Path of the recording, as seen by the server')
+    argparser.add_argument(
+        '--max_frames',
+        default=3000,
+        type=int,
+        help='Simulator ticks to record (default: 3000)')
+    argparser.add_argument(
+        '--sectors',
+        nargs='+',
+        default=None,
+        help='Sectors to render, one replay each (default: --sector)')
+    argparser.set_defaults(headless=True)
+    args = argparser.parse_args()
+
+    args.width, args.height = [int(x) for x in args.res.split('x')]
+    args.recording = os.path.abspath(args.recording)
+
+    log_level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=log_level)
+
+    logging.info('listening to server %s:%s', args.host, args.port)
+
+    try:
+        client = get_carla_client(args.host, args.port, low_quality=args.low_quality, off_screen=True)
+        client.set_timeout(20.0)
+        if args.phase == 'record':
+            record(args, client)
+        else:
+            render(args, client)
+
+    except KeyboardInterrupt:
+        print('\nCancelled by user. Bye!')
+
+
+if __name__ == '__main__':
+    main()
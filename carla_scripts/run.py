@@ -1,12 +1,11 @@
 import sys
 import os
 sys.path.append(os.getcwd() + "/../")
-import argparse
 import logging
 import pygame
-import time
 from carla_scripts.simulator import Simulator
 from carla_scripts.Utils import *
+from carla_scripts.Utils.arguments import get_argparser
 
 
 def game_loop(args):
@@ -44,100 +43,15 @@ def game_loop(args):
 
         if simulator is not None:
             simulator.destroy()
+            simulator.destroy_spawn()
+            simulator.close_me_sensor()
+            simulator.profiler.export()
 
         pygame.quit()
 
 
 def main():
-    argparser = argparse.ArgumentParser(
-        description='CARLA Manual Control Client')
-    argparser.add_argument(
-        '--car_name',
-        metavar='car_name',
-        default='Alfred',
-        help='The ME car to simulate (default: Alfred)')
-    argparser.add_argument(
-        '--sector',
-        metavar='Sector',
-        default='main',
-        help='The sector of Cameras. "rand" for random choice (default: main)')
-    argparser.add_argument(
-        '--map_id',
-        metavar='map_id',
-        type=int,
-        default=0,
-        help='map index from world.get_maps(). currently available: 0-6')
-    argparser.add_argument(
-        '-c', '--clip_interval',
-        type=int,
-        default=0,
-        help='Start new clip every x seconds (default - 0, i.e. same for whole run)')
-    argparser.add_argument(
-        '--filter',
-        metavar='PATTERN',
-        default='vehicle.*',
-        help='actor filter (default: "vehicle.*")')
-    argparser.add_argument(
-        '-v', '--verbose',
-        action='store_true',
-        dest='debug',
-        help='print debug information and draw cameras bounding boxes')
-    argparser.add_argument(
-        '-r', '--record_interval',
-        type=int,
-        default=0,
-        dest='record',
-        help='Record simulator (not ME sensors!) images every x seconds')
-    argparser.add_argument(
-        '--host',
-        metavar='H',
-        default='127.0.0.1',
-        help='IP of the host server (default: 127.0.0.1)')
-    argparser.add_argument(
-        '-p', '--port',
-        metavar='P',
-        default=2000,
-        type=int,
-        help='TCP port to listen to (default: 2000)')
-    argparser.add_argument(
-        '-a', '--autopilot',
-        type=bool,
-        default=True,
-        help='enable autopilot')
-    argparser.add_argument(
-        '-l', '--low_quality',
-        action='store_true',
-        help='run in low quality')
-    argparser.add_argument(
-        '--off_screen',
-        action='store_true',
-        help='run in off screen')
-    argparser.add_argument(
-        '-s', '--spawn_interval',
-        type=int,
-        default=0,
-        help='spawn every x seconds')
-    argparser.add_argument(
-        '--res',
-        metavar='WIDTHxHEIGHT',
-        default='1280x720',
-        help='window resolution (default: 1280x720)')
-    argparser.add_argument(
-        '--rolename',
-        metavar='NAME',
-        default='hero',
-        help='actor role name (default: "hero")')
-    argparser.add_argument(
-        '--gamma',
-        default=2.2,
-        type=float,
-        help='Gamma correction of the camera (default: 2.2)')
-    argparser.add_argument(
-        '-i', '--id',
-        metavar='I',
-        default=int(time.time()),
-        type=int,
-        help='Simulation ID, used for naming output npz files')
+    argparser = get_argparser('CARLA Manual Control Client')
     args = argparser.parse_args()
 
     args.width, args.height = [int(x) for x in args.res.split('x')]
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.append(os.getcwd() + "/../")
+import logging
+import time
+from carla_scripts.simulator import Simulator
+from carla_scripts.Utils import get_carla_client, HeadlessHUD
+from carla_scripts.Utils.arguments import get_argparser
+
+
+def headless_loop(args):
+    simulator = None
+    client = None
+
+    try:
+        client = get_carla_client(args.host, args.port, low_quality=args.low_quality, off_screen=True)
+        client.set_timeout(10.0)
+
+        hud = HeadlessHUD(args.width, args.height)
+        simulator = Simulator(client, hud, args)
+
+        # world.tick() blocks until the server has stepped, so the loop runs as fast as the server allows.
+        # With --max_clips, the simulator is finished once the last clip reached the clip interval.
+        frames = 0
+        start = time.time()
+        while not simulator.finished and (not args.max_frames or frames < args.max_frames):
+            if simulator.tick(None) is not None:
+                frames += 1
+                if frames % 100 == 0:
+                    logging.info('%d frames, %d clips, %.1f frames/s, writer %s', frames, simulator.clip_count,
+                                 frames / (time.time() - start), simulator.me_sensor_manager.frame_writer.get_stats())
+
+    finally:
+
+        if simulator is not None:
+            for mode, timings in simulator.restart_timings.items():
+                if timings:
+                    logging.info('%d episode %ss, %.1f ms on average', len(timings), mode, sum(timings) / len(timings))
+
+        if simulator and simulator.recording_enabled:
+            client.stop_recorder()
+
+        if simulator is not None:
+            simulator.destroy()
+            simulator.destroy_spawn()
+            simulator.close_me_sensor()
+            simulator.profiler.export()
+
+
+def main():
+    argparser = get_argparser('Headless CARLA data generation')
+    argparser.add_argument(
+        '--max_frames',
+        default=0,
+        type=int,
+        help='Stop after this many simulator ticks (default: 0, no limit)')
+    argparser.add_argument(
+        '--max_clips',
+        default=0,
+        type=int,
+        help='Stop after this many clips, requires --clip_interval (default: 0, no limit)')
+    argparser.set_defaults(headless=True)
+    args = argparser.parse_args()
+    if args.max_clips and not args.clip_interval:
+        argparser.error('--max_clips requires --clip_interval')
+
+    args.width, args.height = [int(x) for x in args.res.split('x')]
+
+    log_level = logging.DEBUG if args.debug else logging.INFO
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=log_level)
+
+    logging.info('listening to server %s:%s', args.host, args.port)
+
+    try:
+
+        headless_loop(args)
+
+    except KeyboardInterrupt:
+        print('\nCancelled by user. Bye!')
+
+
+if __name__ == '__main__':
+    main()
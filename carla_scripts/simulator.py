@@ -17,22 +17,30 @@ from __future__ import print_function
 # -- find carla module ---------------------------------------------------------
 # ==============================================================================
 
+import logging
+import functools
 import random
-import signal
 import time
 from time import sleep
 import re
-from subprocess import Popen
 import carla
+import numpy as np
 
 from carla_scripts.Sensors import *
 from carla_scripts.Cameras import *
-from carla_scripts.Utils.sim_utils import get_actor_display_name
+from carla_scripts.Utils.sim_utils import get_actor_display_name, spawn_actors
+from carla_scripts.Utils.world_state import WorldState
+from carla_scripts.Utils.world_cache import load_map, get_map_cache
+from carla_scripts.Utils.traffic_pool import TrafficPool
+from carla_scripts.Utils.profiler import Profiler, NULL_PROFILER
 
 # ==============================================================================
 # -- Simulator ---------------------------------------------------------------------
 # ==============================================================================
 
+# A recorded radar draws its debug points on every RADAR_DEBUG_EVERY sweep with --verbose.
+RADAR_DEBUG_EVERY = 5
+
 def find_weather_presets():
     rgx = re.compile('.+?(?:(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|$)')
     name = lambda x: ' '.join(m.group(0) for m in rgx.finditer(x))
@@ -44,12 +52,23 @@ class Simulator(object):
     def __init__(self, client, hud, args):
         carla_world = client.get_world()
         self.world = carla_world
+        self.client = client
         self.set_map(client, args.map_id)
         self.actor_role_name = args.rolename
         self.map_id = args.map_id
-        self.map = self.world.get_map()
-        self.simulation_id = self.map.name + '_' + str(args.id)
+        # Autopilots of the ego and the NPCs register with the Traffic Manager on this port.
+        self.tm_port = getattr(args, 'tm_port', 8000)
+        self.map_cache = get_map_cache(self.world, self.map, getattr(args, 'map_cache_dir', None))
+        self.world_state = WorldState(self.world)
+        self.traffic_lights = self.map_cache.traffic_lights
+        # Clips are named <map>_<id>, then <map>_<id>_<n> for the n-th clip of a run with clip_interval.
+        self.run_id = str(args.id)
+        self.clip_count = 1
+        self.simulation_id = self.map.name + '_' + self.run_id
         self.debug = args.debug
+        self.headless = getattr(args, 'headless', False)
+        # Without ME sensors the simulator only drives the ego and the traffic, e.g. to record it.
+        self.me_sensors = getattr(args, 'me_sensors', True)
         self.hud = hud
         self.player = None
         self.location = None
@@ -58,23 +77,55 @@ class Simulator(object):
         self.gnss_sensor = None
         self.imu_sensor = None
         self.radar_sensor = None
+        self.record_radar = getattr(args, 'record_radar', False)
         self.camera_manager = None
         self._weather_presets = find_weather_presets()
         self._weather_index = 0
+        self.weather = getattr(args, 'weather', None)
+        if self.weather is not None:
+            self.get_weather_index(self.weather)
         self._actor_filter = args.filter
         self._gamma = args.gamma
         self.me_sensor_manager = None
         self.recording_enabled = args.record
         self.recording_start = 0
         self.world.on_tick(hud.on_world_tick)
-        self.spawn_process = None
+        self.traffic_pool = None
         self.closest_vehicle_distance = None
         self.spawn_interval = args.spawn_interval
         self.clip_interval = args.clip_interval
+        # With max_clips the run is finished once the last clip reached the clip interval.
+        self.max_clips = getattr(args, 'max_clips', 0)
+        self.finished = False
         self.sector = args.sector
+        if getattr(args, 'profile_dir', None):
+            self.profiler = Profiler(args.profile_dir, interval=args.profile_interval,
+                                     export_format=args.profile_format)
+        else:
+            self.profiler = NULL_PROFILER
         self.me_sensor_manager = MECameraManager(self.world, self.player, simulation_id=self.simulation_id,
-                                                 sector=args.sector, car_name=args.car_name)
+                                                 map_name=self.map.name,
+                                                 output_dir=getattr(args, 'output_dir', None),
+                                                 full_frame_metadata=args.full_frame_metadata,
+                                                 sector=args.sector, car_name=args.car_name,
+                                                 writer_threads=args.writer_threads,
+                                                 writer_queue_size=args.writer_queue_size,
+                                                 writer_policy=args.writer_policy,
+                                                 assembler_timeout=args.assembler_timeout,
+                                                 write_partial_frames=not args.drop_partial_frames,
+                                                 output_format=args.output_format,
+                                                 clip_layout=args.clip_layout,
+                                                 image_codec=args.image_codec,
+                                                 depth_codec=args.depth_codec,
+                                                 lidar_codec=args.lidar_codec,
+                                                 capture_every=args.capture_every,
+                                                 capture_timeout=args.capture_timeout,
+                                                 record_telemetry=not getattr(args, 'no_telemetry', False),
+                                                 write_index=not getattr(args, 'no_index', False),
+                                                 client=client, profiler=self.profiler)
         self.restarting = False
+        self.fast_reset = not getattr(args, 'full_restart', False)
+        self.restart_timings = {'restart': [], 'reset': []}
         self.restart()
         self.start_time = time.time()
         self.spawn_npc()
@@ -82,8 +133,7 @@ class Simulator(object):
 
     def set_map(self, client, map_id):
         all_maps = client.get_available_maps()
-        world_map = all_maps[map_id]
-        self.world = client.load_world(world_map)
+        self.world, self.map = load_map(client, all_maps[map_id])
 
     def set_fixed_timestep(self, t=0.2):
         settings = self.world.get_settings()
@@ -127,31 +177,94 @@ class Simulator(object):
         self.set_sync_mode()
         self.me_sensor_manager.player = self.player
         self.me_sensor_manager.simulation_id = self.simulation_id
-        self.me_sensor_manager.init_sensors()
+        if self.me_sensors:
+            self.me_sensor_manager.init_sensors()
         self.restarting = False
 
+    def reset(self):
+        """
+        Fast episode reset: teleports the existing ego to a free spawn point and clears its physics state
+        and sensor histories, keeping every attached sensor alive. The ME output moves to the clip of
+        the current simulation_id; ME sensors are only re-spawned when the sector changed.
+        """
+        if self.player is None:
+            self.restart()
+            return
+        self.player.set_transform(self.get_free_spawn_point())
+        zero = carla.Vector3D()
+        if hasattr(self.player, 'set_target_velocity'):
+            self.player.set_target_velocity(zero)
+            self.player.set_target_angular_velocity(zero)
+        else:
+            self.player.set_velocity(zero)
+            self.player.set_angular_velocity(zero)
+        self.location = None
+        if self.me_sensors and self.me_sensor_manager.sensors_sector != self.me_sensor_manager.sector:
+            self.destroy_me_sensor()
+            self.me_sensor_manager.simulation_id = self.simulation_id
+            self.me_sensor_manager.init_sensors()
+        elif self.me_sensors and self.me_sensor_manager.simulation_id != self.simulation_id:
+            self.me_sensor_manager.simulation_id = self.simulation_id
+            self.me_sensor_manager.rotate_clip()
+        # Applies the teleport, events up to this frame belong to the previous episode.
+        frame = self.world.tick()
+        self.collision_sensor.clear_history(frame)
+        self.lane_invasion_sensor.clear_history(frame)
+
+    def get_free_spawn_point(self, clearance=5.0):
+        spawn_points = self.map_cache.get_spawn_points()
+        if not spawn_points:
+            return carla.Transform()
+        random.shuffle(spawn_points)
+        for spawn_point in spawn_points:
+            l = spawn_point.location
+            closest = self.world_state.closest_distance((l.x, l.y, l.z), 'vehicle.', exclude_id=self.player.id)
+            if closest is None or closest > clearance:
+                return spawn_point
+        return spawn_points[0]
+
     def create_player(self, on_ground=True):
         blueprint = self.create_blueprint()
-        spawn_points = self.map.get_spawn_points()
+        spawn_points = self.map_cache.get_spawn_points()
         spawn_point = random.choice(spawn_points) if spawn_points else carla.Transform()
         # if on_ground:
         #     spawn_point.location.z = 0.35
         while self.player is None:
             self.player = self.world.try_spawn_actor(blueprint, spawn_point)
             sleep(0.1)
-        self.player.set_autopilot()
-        self.location = self.player.get_location()
+        self.player.set_autopilot(True, self.tm_port)
+        self.location = None
 
 
     def setup_sensors(self):
-        self.collision_sensor = CollisionSensor(self.player, self.hud)
-        self.lane_invasion_sensor = LaneInvasionSensor(self.player, self.hud)
-        self.gnss_sensor = GnssSensor(self.player)
-        self.imu_sensor = IMUSensor(self.player)
-        self.set_camera_manager()
+        sensor_classes = [CollisionSensor, LaneInvasionSensor, GnssSensor, IMUSensor]
+        specs = [sensor_class.get_spawn_spec(self.world) + (self.player,) for sensor_class in sensor_classes]
+        if self.record_radar:
+            specs.append(RadarSensor.get_spawn_spec(self.world, self.me_sensor_manager.get_sensor_tick()) +
+                         (self.player,))
+        # A sensor whose batch spawn failed (None) is spawned again by its class.
+        sensors = spawn_actors(self.client, self.world, specs)
+        collision, lane_invasion, gnss, imu = sensors[:4]
+        self.collision_sensor = CollisionSensor(self.player, self.hud, sensor=collision)
+        self.lane_invasion_sensor = LaneInvasionSensor(self.player, self.hud, sensor=lane_invasion)
+        self.gnss_sensor = GnssSensor(self.player, sensor=gnss)
+        self.imu_sensor = IMUSensor(self.player, sensor=imu)
+        if self.record_radar:
+            self.set_recorded_radar(sensors[4])
+        if not self.headless:
+            self.set_camera_manager()
+
+    def set_recorded_radar(self, sensor=None):
+        """Radar whose sweeps are written with the ME clip, debug points only with --verbose and decimated."""
+        self.radar_sensor = RadarSensor(self.player, sensor=sensor,
+                                        record_func=functools.partial(self.me_sensor_manager.save_sensor_frame,
+                                                                      'radar'),
+                                        debug_every=RADAR_DEBUG_EVERY if self.debug else 0,
+                                        sensor_tick=self.me_sensor_manager.get_sensor_tick())
+        self.me_sensor_manager.add_sensor('radar', self.radar_sensor.get_config())
 
     def create_blueprint(self):
-        blueprint = random.choice(self.world.get_blueprint_library().filter(self._actor_filter))
+        blueprint = random.choice(self.map_cache.filter_blueprints(self._actor_filter))
         blueprint.set_attribute('role_name', self.actor_role_name)
         if blueprint.has_attribute('color'):
             color = random.choice(blueprint.get_attribute('color').recommended_values)
@@ -170,8 +283,21 @@ class Simulator(object):
         self.camera_manager.transform_index = cam_pos_index
         self.camera_manager.set_sensor(cam_index, notify=False)
 
+    def get_weather_index(self, name):
+        """Index of a weather preset, given as 'ClearNoon' or 'Clear Noon'."""
+        for index, (_, preset_name) in enumerate(self._weather_presets):
+            if name in (preset_name, preset_name.replace(' ', '')):
+                return index
+        raise ValueError('Unknown weather %r, available: %s' %
+                         (name, ', '.join(x[1].replace(' ', '') for x in self._weather_presets)))
+
+    def get_weather_name(self):
+        return self._weather_presets[self._weather_index][1].replace(' ', '')
+
     def next_weather(self, reverse=False, rand=False):
-        if rand:
+        if rand and self.weather is not None:
+            self._weather_index = self.get_weather_index(self.weather)
+        elif rand:
             dry_indices = range(0, 5)
             wet_indices = range(5, len(self._weather_presets))
             select_from = dry_indices if random.random() > 0 else wet_indices  # for now we don't use wet maps
@@ -182,13 +308,23 @@ class Simulator(object):
         preset = self._weather_presets[self._weather_index]
         self.hud.notification('Weather: %s' % preset[1])
         self.player.get_world().set_weather(preset[0])
+        self.me_sensor_manager.set_weather(preset[1])
 
     def toggle_radar(self):
-        if self.radar_sensor is None:
+        if self.record_radar:
+            # The recorded radar stays, only its debug points are toggled.
+            if self.radar_sensor is not None:
+                self.radar_sensor.debug_every = 0 if self.radar_sensor.debug_every else RADAR_DEBUG_EVERY
+                self.hud.notification('Radar debug points %s' % ('on' if self.radar_sensor.debug_every else 'off'))
+        elif self.radar_sensor is None:
             self.radar_sensor = RadarSensor(self.player)
-        elif self.radar_sensor.sensor is not None:
+        else:
+            self.destroy_radar()
+
+    def destroy_radar(self):
+        if self.radar_sensor is not None and self.radar_sensor.sensor is not None:
             self.radar_sensor.sensor.destroy()
-            self.radar_sensor = None
+        self.radar_sensor = None
 
     def get_closest_vehicle_distance(self):
         if self.hud.closest_vehicle_distance is None:
@@ -205,27 +341,33 @@ class Simulator(object):
         if self.get_closest_vehicle_distance() <= 2.5:
             if self.hud.closest_vehicle_distance != self.closest_vehicle_distance:
                 self.closest_vehicle_distance = self.hud.closest_vehicle_distance
-                self.spawn_npc()
+                self.relocate_blocking_npcs()
 
         if self.clip_interval:
             elapsed_seconds = self.get_elapsed_seconds()
             if elapsed_seconds > self.clip_interval + 3:
                 print("Clip interval reached")
-                self.simulation_id = self.map.name + '_' + str(int(time.time()))
+                if self.max_clips and self.clip_count >= self.max_clips:
+                    # Stops before the next clip is created.
+                    self.finished = True
+                    return True
+                self.clip_count += 1
+                self.simulation_id = '%s_%s_%d' % (self.map.name, self.run_id, self.clip_count)
                 self.me_sensor_manager.update_sector(self.sector)
                 self.me_sensor_manager.update_output_dir()
                 self.start_time = time.time()
                 need_restart = True
 
-        if self.collision_sensor.get_collision_history() or \
-                len(self.lane_invasion_sensor.history) > 5:
+        if self.collision_sensor.has_collided_since() or \
+                self.lane_invasion_sensor.invasions_in_last(100) > 5:
             need_restart = True
 
-        elif self.world.get_snapshot().frame % 10 == 0:
-            if self.location == self.player.get_location():
+        elif self.world_state.frame % 10 == 0:
+            location = self.world_state.get_position(self.player.id)
+            if location is not None and self.location is not None and np.array_equal(self.location, location):
                 need_restart = True
             else:
-                self.location = self.player.get_location()
+                self.location = location
 
         elif self.spawn_interval:
             elapsed_seconds = self.get_elapsed_seconds()
@@ -246,23 +388,65 @@ class Simulator(object):
                                                         carla.Color(255, 0, 0, 0), 0.01)
 
     def tick(self, clock):
-        self.hud.tick(self, clock)
-        self.short_traffic_lights()
-        if self.restart_if_needed():
+        """Advances the simulation by one step, returns the new frame id or None if it restarted instead."""
+        profiler = self.profiler
+        with profiler.stage('tick'):
+            with profiler.stage('world_state'):
+                self.world_state.update()
+            if self.me_sensor_manager.telemetry is not None:
+                with profiler.stage('telemetry'):
+                    self.record_telemetry()
+            with profiler.stage('hud'):
+                self.hud.tick(self, clock)
+            with profiler.stage('traffic_lights'):
+                self.short_traffic_lights()
+            with profiler.stage('restart_check'):
+                restarted = self.restart_if_needed()
+            if restarted:
+                return None
+            if self.debug:
+                self.draw_sensors()
+            with profiler.stage('world_tick'):
+                frame = self.world.tick()
+            if self.traffic_pool is not None:
+                with profiler.stage('traffic_pool'):
+                    self.traffic_pool.on_tick()
+            if self.me_sensor_manager.sync_capture is not None:
+                with profiler.stage('capture'):
+                    self.me_sensor_manager.capture(frame)
+        profiler.tick()
+        return frame
+
+    def record_telemetry(self):
+        """
+        Appends the ego state of the world state frame, the frame the last tick returned and captured, to
+        the telemetry of the clip. IMU and GNSS hold their latest measurement, recorded with its frame.
+        """
+        actor_snapshot = self.world_state.snapshot.find(self.player.id)
+        if actor_snapshot is None:
             return
-        if self.debug:
-            self.draw_sensors()
-        self.world.tick()
+        transform = actor_snapshot.get_transform()
+        velocity = actor_snapshot.get_velocity()
+        control = self.player.get_control()
+        location, rotation = transform.location, transform.rotation
+        # Callbacks set the frame after the values, read it first: a newer value never passes for an older frame.
+        imu_frame, gnss_frame = self.imu_sensor.frame, self.gnss_sensor.frame
+        self.me_sensor_manager.telemetry.append(
+            self.world_state.frame, self.world_state.elapsed_seconds,
+            (location.x, location.y, location.z), (rotation.pitch, rotation.yaw, rotation.roll),
+            (velocity.x, velocity.y, velocity.z), self.imu_sensor.raw_accelerometer, self.imu_sensor.raw_gyroscope,
+            self.imu_sensor.compass, imu_frame, self.gnss_sensor.lat, self.gnss_sensor.lon, gnss_frame,
+            control.throttle, control.steer, control.brake)
 
     def short_traffic_lights(self):
         if self.player.is_at_traffic_light():
             self.player.get_traffic_light().set_state(carla.TrafficLightState.Green)
         else:
-            traffic_lights = self.world.get_actors().filter('traffic.traffic_light')
-            for tl in traffic_lights:
-                distance_from_player = tl.get_location().distance(self.player.get_location())
-                if distance_from_player < 20:
-                    tl.set_state(carla.TrafficLightState.Green)
+            player_location = self.world_state.get_position(self.player.id)
+            if player_location is None:
+                return
+            for tl in self.traffic_lights.query(player_location, 20):
+                tl.set_state(carla.TrafficLightState.Green)
 
     def render(self, display):
         self.camera_manager.render(display)
@@ -277,13 +461,16 @@ class Simulator(object):
         if self.me_sensor_manager is not None:
             self.me_sensor_manager.destroy()
 
+    def close_me_sensor(self):
+        if self.me_sensor_manager is not None:
+            self.me_sensor_manager.close()
+
     def destroy(self):
-        if self.radar_sensor is not None:
-            self.toggle_radar()
+        self.destroy_radar()
         if self.player is not None:
             self.player.set_autopilot(False)
         actors = [
-            self.camera_manager.sensor,
+            self.camera_manager.sensor if self.camera_manager is not None else None,
             self.collision_sensor.sensor,
             self.lane_invasion_sensor.sensor,
             self.gnss_sensor.sensor,
@@ -295,6 +482,7 @@ class Simulator(object):
         self.player = None
 
     def spawn_npc(self, filterv='vehicle.*', filterw='walker.pedestrian.*'):
+        """Tops up the NPC pool of the map, only the missing vehicles and walkers are spawned."""
         actors_dict = {
             0: [100, 20, True],
             1: [100, 100, False],
@@ -305,23 +493,37 @@ class Simulator(object):
             6: [30, 40, False],
         }
         num_of_vehicles, num_of_walkers, safe = actors_dict[self.map_id]
-        command = "python3 ./Utils/spawn_npc.py -n %s -w %s --filterv %s --filterw %s --on_ground" %\
-                  (num_of_vehicles, num_of_walkers, filterv, filterw)
-        if safe:
-            command += ' --safe'
-        if self.spawn_process is not None:
-            self.destroy_spawn()
-        self.spawn_process = Popen(command.split(" "))
+        if self.traffic_pool is None:
+            self.traffic_pool = TrafficPool(self.client, self.map_cache, self.world_state, filterv, filterw, safe,
+                                            tm_port=self.tm_port)
+        self.world_state.update()
+        self.traffic_pool.top_up(num_of_vehicles, num_of_walkers)
 
     def destroy_spawn(self):
-        if self.spawn_process is None:
+        if self.traffic_pool is None:
             return
-        self.spawn_process.send_signal(signal.SIGINT)
-        sleep(1)
-        self.spawn_process = None
+        self.traffic_pool.destroy()
+        self.traffic_pool = None
+
+    def relocate_blocking_npcs(self, distance=2.5):
+        if self.traffic_pool is None:
+            return
+        position = self.world_state.get_position(self.player.id)
+        if position is None:
+            return
+        _, ids = self.world_state.nearest(position, 'vehicle.', exclude_id=self.player.id, max_distance=distance)
+        self.traffic_pool.relocate(ids.tolist())
 
     def restart_spawn(self):
-        self.destroy_spawn()
-        self.restart()
-        sleep(0.1)
+        start = time.perf_counter()
+        if self.fast_reset:
+            self.reset()
+            mode = 'reset'
+        else:
+            self.restart()
+            mode = 'restart'
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        self.restart_timings[mode].append(elapsed_ms)
+        self.profiler.record(mode, elapsed_ms / 1000.0)
+        logging.info('Episode %s took %.1f ms', mode, elapsed_ms)
         self.spawn_npc()
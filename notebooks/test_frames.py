@@ -126,18 +126,15 @@ anim = animation.ArtistAnimation(fig, ims, interval=100, blit=True, repeat_delay
 plt.show()
 
 # +
-root_path = output_dir #os.path.join('../carla_scripts/output/', sim_id)
-frames = set()
-views_dirs = os.listdir(root_path,)
-for i, view_name in enumerate(views_dirs):
-    file_path = os.path.join(root_path, view_name)
-    frame_nums = [re.search('_(\d+)\.npz', file_name).group(1) for file_name in os.listdir(file_path,) if 'image' in np.load(os.path.join(file_path,file_name))]
-    if i == 0:
-        frames = set(frame_nums)
-        print('out of %d frames in %s,' % (len(frames), view_name)),
-    else:
-        frames = frames.intersection(set(frame_nums))
-print('%d exist in all %d views. ' % (len(frames), len(views_dirs))),
+# Frames with an image in every view, from the dataset index (only changed directories are rescanned)
+sys.path.append(os.getcwd() + "/../")
+from carla_scripts.Dataset.index import DatasetIndex
+index = DatasetIndex('../carla_scripts/output/')
+index.update()
+clip_path = os.path.join(car_name, sector, sim_id)
+views_names = index.get_views(clip_path)
+frames = set('%07d' % gi for gi in index.complete_frames(clip_path, require_key='image'))
+print('%d exist in all %d views. ' % (len(frames), len(views_names))),
 
 if len(frames)>0:
     frame = random.choice(list(frames))
@@ -1,38 +1,215 @@
-import os
+"""
+Links (or copies) the simulator npz frames of <sim_output_dir>/<clip>/<view>/*.npz into the dataset layout,
+one file per frame named <clip>_<view>_<grab index, 7 digits>.npz, placed by file2path (or flat in the output
+directory). Every target is planned first, each directory is created once, then a pool of workers links or
+copies the files. Up-to-date targets are skipped, so re-runs only handle new or changed frames.
 
+    python3 format_carla_output.py --sim_output_dir ~/sim_sample/rcl --output_dir ~/sim_sample/rcl_linked
+"""
+import sys
+import os
+sys.path.append(os.getcwd() + "/../")
+import re
+import time
 import shutil
-from file2path import file2path
-
-#sim_output_dir = '/mobileye/algo_STEREO3/stereo/data/simulator/Clips'
-sim_output_dir = '/homes/guygo/sim_sample/rcl'
-#output_dir ='/mobileye/algo_STEREO3/stereo/data/simulator/Clips_dump1_linked'
-output_dir ='/homes/guygo/sim_sample/rcl_linked'
-filter_clips = []
-
-for clip_dir in os.listdir(sim_output_dir):
-    clip_dir_path = os.path.join(sim_output_dir, clip_dir)
-    if os.path.isdir(clip_dir_path): #and clip_dir in filter_clips:
-        #print('Scanning %s' % clip_dir)
-        for cam_dir in os.listdir(clip_dir_path):
-            cam_dir_path = os.path.join(clip_dir_path, cam_dir)
-            if os.path.isdir(cam_dir_path):
-                #print('Scanning %s' % cam_dir)
-                for filename in os.listdir(cam_dir_path):
-                    if 'npz' in filename:
-
-                        new_filename = str.join('_', (filename.split('_')[:-1] +
-                                                      [filename.split('_')[-1].split('.')[0].zfill(7) + '.npz']))
-
-                        orig_file_path = os.path.join(cam_dir_path, filename)
-                        new_file_path = file2path(os.path.join(output_dir, new_filename ))
-                        #print('copying %s' % orig_file_path),
-                        #print('into %s' % new_file_path)
-
-                        try:
-                            os.symlink(orig_file_path, new_file_path)
-			   #shutil.copy(orig_file_path, new_file_path)
-                        except OSError as os_err:
-                            os.makedirs(os.path.dirname(new_file_path))
-			    os.symlink(orig_file_path, new_file_path)
-                           # shutil.copy(orig_file_path, new_file_path)
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LINK_MODE = 'link'
+COPY_MODE = 'copy'
+MODES = (LINK_MODE, COPY_MODE)
+FILE2PATH_LAYOUT = 'file2path'
+FLAT_LAYOUT = 'flat'
+LAYOUTS = (FILE2PATH_LAYOUT, FLAT_LAYOUT)
+NPZ_PATTERN = re.compile(r'^(.*)_(\d+)\.npz$')
+
+
+def get_target_func(layout, output_dir):
+    """Maps a target file name to its path in `output_dir`."""
+    if layout == FILE2PATH_LAYOUT:
+        from file2path import file2path
+        return lambda file_name: file2path(os.path.join(output_dir, file_name))
+    return lambda file_name: os.path.join(output_dir, file_name)
+
+
+def target_name(file_name):
+    """<clip>_<view>_<grab index>.npz with the grab index zero padded to 7 digits, None for other files."""
+    match = NPZ_PATTERN.match(file_name)
+    if match is None:
+        return None
+    return '%s_%s.npz' % (match.group(1), match.group(2).zfill(7))
+
+
+def plan(sim_output_dir, target_func, clips=None):
+    """(source, target) of every npz frame of the clips in `sim_output_dir`, listing each directory once."""
+    entries = []
+    for clip_entry in sorted(os.scandir(sim_output_dir), key=lambda e: e.name):
+        if not clip_entry.is_dir() or (clips and clip_entry.name not in clips):
+            continue
+        for view_entry in os.scandir(clip_entry.path):
+            if not view_entry.is_dir():
+                continue
+            for frame_entry in os.scandir(view_entry.path):
+                name = target_name(frame_entry.name)
+                if name is not None:
+                    entries.append((frame_entry.path, target_func(name)))
+    return entries
+
+
+def plan_from_index(sim_output_dir, target_func, clips=None):
+    """Same as plan, from the dataset index of `sim_output_dir` (see Dataset/index.py) once brought up to date."""
+    from carla_scripts.Dataset.index import DatasetIndex
+    index = DatasetIndex(sim_output_dir)
+    index.update()
+    entries = []
+    for clip_path, _, _, path, _ in index.frames():
+        if clips and os.path.basename(clip_path) not in clips:
+            continue
+        name = target_name(os.path.basename(path))
+        if name is not None:
+            entries.append((path, target_func(name)))
+    index.close()
+    return entries
+
+
+def make_dirs(entries):
+    """Creates every target directory once, returns how many were created."""
+    created = 0
+    for dir_path in sorted(set(os.path.dirname(target) for _, target in entries)):
+        if not os.path.isdir(dir_path):
+            os.makedirs(dir_path, exist_ok=True)
+            created += 1
+    return created
+
+
+def is_up_to_date(source, target, mode):
+    try:
+        if mode == LINK_MODE:
+            return os.readlink(target) == source
+        source_stat, target_stat = os.stat(source), os.lstat(target)
+    except OSError:
+        return False
+    return target_stat.st_size == source_stat.st_size and target_stat.st_mtime >= source_stat.st_mtime
+
+
+def export_file(source, target, mode):
+    """Links or copies `source` to `target`, replacing a stale target atomically. Returns the bytes copied."""
+    tmp_path = '%s.tmp%d' % (target, threading.get_ident())
+    if mode == LINK_MODE:
+        os.symlink(source, tmp_path)
+        copied = 0
+    else:
+        shutil.copy2(source, tmp_path)
+        copied = os.path.getsize(tmp_path)
+    os.replace(tmp_path, target)
+    return copied
+
+
+class ExportStats(object):
+    def __init__(self, planned):
+        self.planned = planned
+        self.exported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.start = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, exported, skipped, failed, copied):
+        with self._lock:
+            self.exported += exported
+            self.skipped += skipped
+            self.failed += failed
+            self.bytes += copied
+
+    def report(self):
+        seconds = max(time.time() - self.start, 1e-9)
+        done = self.exported + self.skipped + self.failed
+        return '%d/%d files in %.1fs (%.0f files/s, %.1f MB/s): %d exported, %d up to date, %d failed' % (
+            done, self.planned, seconds, done / seconds, self.bytes / seconds / 1e6, self.exported, self.skipped,
+            self.failed)
+
+
+def export_batch(batch, mode, stats):
+    exported = skipped = failed = copied = 0
+    for source, target in batch:
+        if is_up_to_date(source, target, mode):
+            skipped += 1
+            continue
+        try:
+            copied += export_file(source, target, mode)
+            exported += 1
+        except OSError as e:
+            print('Failed to %s %s: %s' % (mode, source, e))
+            failed += 1
+    stats.add(exported, skipped, failed, copied)
+
+
+def export(entries, mode=LINK_MODE, workers=16, batch_size=1000, report_every=10.0):
+    """Links or copies (source, target) entries with a pool of `workers` threads, returns the ExportStats."""
+    stats = ExportStats(len(entries))
+    batches = [entries[i:i + batch_size] for i in range(0, len(entries), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(export_batch, batch, mode, stats) for batch in batches]
+        last_report = time.time()
+        for future in futures:
+            future.result()
+            if time.time() - last_report >= report_every:
+                last_report = time.time()
+                print(stats.report())
+    return stats
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argparser.add_argument(
+        '--sim_output_dir',
+        default='/homes/guygo/sim_sample/rcl',
+        help='Simulator output laid out as <clip>/<view>/*.npz (default: /homes/guygo/sim_sample/rcl)')
+    argparser.add_argument(
+        '--output_dir',
+        default='/homes/guygo/sim_sample/rcl_linked',
+        help='Dataset directory (default: /homes/guygo/sim_sample/rcl_linked)')
+    argparser.add_argument(
+        '--mode',
+        default=LINK_MODE,
+        choices=MODES,
+        help='Symlink or copy the frames (default: link)')
+    argparser.add_argument(
+        '--layout',
+        default=FILE2PATH_LAYOUT,
+        choices=LAYOUTS,
+        help='Place the frames with file2path or flat in the output directory (default: file2path)')
+    argparser.add_argument(
+        '--workers',
+        default=16,
+        type=int,
+        help='Threads linking or copying files (default: 16)')
+    argparser.add_argument(
+        '--clips',
+        nargs='+',
+        default=None,
+        help='Only these clips (default: all)')
+    argparser.add_argument(
+        '--from_index',
+        action='store_true',
+        help='Plan from the dataset index of sim_output_dir instead of listing every view directory')
+    args = argparser.parse_args()
+
+    sim_output_dir = os.path.abspath(args.sim_output_dir)
+    target_func = get_target_func(args.layout, os.path.abspath(args.output_dir))
+    start = time.time()
+    if args.from_index:
+        entries = plan_from_index(sim_output_dir, target_func, args.clips)
+    else:
+        entries = plan(sim_output_dir, target_func, args.clips)
+    created = make_dirs(entries)
+    print('Planned %d files and created %d directories in %.1fs' % (len(entries), created, time.time() - start))
+    stats = export(entries, mode=args.mode, workers=args.workers)
+    print(stats.report())
+    return 1 if stats.failed else 0
+
 
+if __name__ == '__main__':
+    sys.exit(main())
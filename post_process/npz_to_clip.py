@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.append(os.getcwd() + "/../")
+import re
+import argparse
+import numpy as np
+from carla_scripts.Dataset.clip_container import ClipWriter, CLIP_EXTENSION
+
+
+def convert_clip(clips_path, clip, per_view=False, remove_npz=False):
+    """Packs the <clip>/<view>/*.npz frames of a clip into clip files inside the clip directory."""
+    clip_path = os.path.join(clips_path, clip)
+    views = [v for v in sorted(os.listdir(clip_path)) if os.path.isdir(os.path.join(clip_path, v))]
+    clip_writer = None
+    converted = 0
+    for view in views:
+        frames_path = os.path.join(clip_path, view)
+        frames = sorted(f for f in os.listdir(frames_path) if f.endswith('.npz'))
+        if per_view:
+            clip_writer = ClipWriter(os.path.join(clip_path, view + CLIP_EXTENSION))
+        elif clip_writer is None:
+            clip_writer = ClipWriter(os.path.join(clip_path, clip + CLIP_EXTENSION))
+        for frame in frames:
+            grab_index = int(re.findall(".*_(.*).npz", frame)[0])
+            with np.load(os.path.join(frames_path, frame)) as data:
+                clip_writer.append(grab_index, view, dict(data))
+            converted += 1
+        if per_view:
+            clip_writer.close()
+    if clip_writer is not None:
+        clip_writer.close()
+    if remove_npz:
+        for view in views:
+            frames_path = os.path.join(clip_path, view)
+            for frame in os.listdir(frames_path):
+                if frame.endswith('.npz'):
+                    os.remove(os.path.join(frames_path, frame))
+            if not os.listdir(frames_path):
+                os.rmdir(frames_path)
+    return converted
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Convert npz clips into clip files')
+    argparser.add_argument(
+        '--base_output_path',
+        default='../carla_scripts/output',
+        help='Simulator output directory, laid out as <car>/<sector>/<clip>/<view>/*.npz')
+    argparser.add_argument(
+        '--per_view',
+        action='store_true',
+        help='Write one clip file per view instead of one per clip')
+    argparser.add_argument(
+        '--remove_npz',
+        action='store_true',
+        help='Delete the npz files once converted')
+    args = argparser.parse_args()
+
+    cars = os.listdir(args.base_output_path)
+    for car in cars:
+        sectors_path = os.path.join(args.base_output_path, car)
+        sectors = os.listdir(sectors_path)
+        for sector in sectors:
+            clips_path = os.path.join(sectors_path, sector)
+            clips = [c for c in os.listdir(clips_path) if os.path.isdir(os.path.join(clips_path, c))]
+            for clip in clips:
+                converted = convert_clip(clips_path, clip, per_view=args.per_view, remove_npz=args.remove_npz)
+                print('%s/%s/%s: converted %d frames' % (car, sector, clip, converted))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,55 +1,42 @@
+import sys
 import os
-import re
-import numpy as np
-
-
-def remove_bad_frames(base_path, clip, frames_nums):
-    clip_path = os.path.join(base_path, clip)
-    views = os.listdir(clip_path)
-    for view in views:
-        frames_path = os.path.join(clip_path, view)
-        frames = os.listdir(frames_path)
-        to_be_removed = [f for f in frames if re.findall(".*_(.*).npz", f)[0] in frames_nums]
-        for frame in to_be_removed:
-            frame_path = os.path.join(clip_path, view, frame)
-            os.remove(frame_path)#, '%s_bad/%s' % (base_path, frame))
-            # print(frame_path)
-
-def filter_frames(base_path, clip, remove_bad=False):
-    clip_path = os.path.join(base_path, clip)
-    views = os.listdir(clip_path)
-    filtered_frames = set()
-    bad_frames = set()
-    for i, view in enumerate(views):
-        frames_path = os.path.join(clip_path, view)
-        frames = os.listdir(frames_path)
-        frames_nums = set([re.findall(".*_(.*).npz", frame)[0] for frame in frames])
-        if i == 0:
-            filtered_frames = frames_nums
-        else:
-            bad_frames.update(filtered_frames.difference(frames_nums))
-            bad_frames.update(frames_nums.difference(filtered_frames))
-            filtered_frames = filtered_frames.intersection(frames_nums)
+sys.path.append(os.getcwd() + "/../")
+from carla_scripts.Dataset.clip_container import CLIP_EXTENSION
+from carla_scripts.Dataset.index import DatasetIndex
+
+
+def remove_bad_frames(index, clip_path, bad_frames):
+    """
+    Deletes the npz files of `bad_frames`, {grab_index: [(view, path)]} as returned by
+    DatasetIndex.incomplete_frames, and drops them from the index. Frames in clip files are kept.
+    """
+    removed = []
+    for grab_index, files in bad_frames.items():
+        npz_files = [path for _, path in files if not path.endswith(CLIP_EXTENSION)]
+        for path in npz_files:
+            if os.path.exists(path):
+                os.remove(path)
+        if npz_files:
+            removed.append(grab_index)
+    index.remove_frames(clip_path, removed)
+
+
+def filter_frames(index, clip_path, remove_bad=False):
+    """Grab indices of the clip at `clip_path` (relative to the index root) present in all of its views."""
     if remove_bad:
-        remove_bad_frames(base_path, clip, bad_frames)
-    return filtered_frames
+        remove_bad_frames(index, clip_path, index.incomplete_frames(clip_path))
+    return set(index.complete_frames(clip_path))
 
 
 def main():
     base_output_path = '../carla_scripts/output'
-    cars = os.listdir(base_output_path)
-    for car in cars:
-        # print("Car: " + car)
-        sectors_path = os.path.join(base_output_path, car)
-        sectors = os.listdir(sectors_path)
-        for sector in sectors:
-            # print("\tSector: " + sector)
-            clips_path = os.path.join(sectors_path, sector)
-            clips = os.listdir(clips_path)
-            for clip in clips:
-                # print("\t\tClip: " + clip)
-                filtered_frames = filter_frames(clips_path, clip, remove_bad=True)
+    index = DatasetIndex(base_output_path)
+    # Only directories and clip files changed since the last run are listed.
+    index.update()
+    for car, sector, clip_path in index.clips():
+        filtered_frames = filter_frames(index, clip_path, remove_bad=True)
+    index.close()
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
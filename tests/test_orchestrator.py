@@ -0,0 +1,72 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)) + "/../")
+import numpy as np
+from carla_scripts.Dataset.index import DatasetIndex
+from carla_scripts.Dataset.manifest import ClipManifest
+from carla_scripts.orchestrator import Job, JobError, Orchestrator, FAILED
+
+
+class ClipRunner(object):
+    """Writes one clip with a frame per job, then fails the jobs of `failing` sectors."""
+    def __init__(self, failing=()):
+        self.failing = failing
+
+    def run(self, job, endpoint, job_dir):
+        clip_name = 'Town%02d_%s' % (job.map_id, job.get_run_id())
+        view_dir = os.path.join(job_dir, clip_name, 'main_to_main')
+        os.makedirs(view_dir)
+        ClipManifest(clip_name, job.car_name, job.sector, 'test', [], {}).save(os.path.join(job_dir, clip_name))
+        np.savez(os.path.join(view_dir, '%s_main_to_main_%07d.npz' % (clip_name, 1)), image=np.zeros(4))
+        if job.sector in self.failing:
+            raise JobError('failed %s' % job.sector)
+
+
+def test_failed_job_clips_are_not_indexed(tmp_path):
+    output_dir = str(tmp_path)
+    jobs = [Job(1, 'main', 'Alfred', None, 1), Job(1, 'rear', 'Alfred', None, 1)]
+    failed = Orchestrator(jobs, [('127.0.0.1', 2000)], ClipRunner(failing=('rear',)), output_dir, retries=0).run()
+
+    assert [job.sector for job in failed] == ['rear']
+    assert os.listdir(os.path.join(output_dir, 'jobs', jobs[1].job_id))
+    index = DatasetIndex(output_dir)
+    index.update()
+    assert [clip_path for _, _, clip_path in index.clips()] == [
+        os.path.join('Alfred', 'main', 'Town01_%s_a1' % jobs[0].job_id)]
+    assert all(not clip_path.startswith('jobs') for clip_path, _ in index.split(0.5)[0] + index.split(0.5)[1])
+    index.close()
+
+
+def test_unmerged_job_clips_are_not_indexed(tmp_path):
+    output_dir = str(tmp_path)
+    job = Job(1, 'main', 'Alfred', None, 1)
+    # The target of the job's clip is already taken, so merge() leaves it in the job directory.
+    os.makedirs(os.path.join(output_dir, 'Alfred', 'main', 'Town01_%s_a1' % job.job_id))
+    failed = Orchestrator([job], [('127.0.0.1', 2000)], ClipRunner(), output_dir, retries=0).run()
+
+    assert failed == [job] and job.state == FAILED
+    index = DatasetIndex(output_dir)
+    index.update()
+    assert index.clips() == []
+    assert index.frames() == []
+    index.close()
+
+
+def test_excluded_directory_is_dropped_from_an_existing_index(tmp_path):
+    output_dir = str(tmp_path)
+    job = Job(1, 'main', 'Alfred', None, 1)
+    ClipRunner().run(job, None, os.path.join(output_dir, 'jobs', job.job_id))
+    index = DatasetIndex(output_dir)
+    index.update()
+    assert len(index.frames()) == 1
+    index.close()
+
+    index = DatasetIndex(output_dir, exclude=('jobs',))
+    index.update()
+    assert index.frames() == []
+    index.close()
+    # Later updates of the same index keep the exclusion.
+    index = DatasetIndex(output_dir)
+    index.update()
+    assert index.frames() == []
+    index.close()